@@ -0,0 +1,248 @@
+"""
+Офлайн-бенчмарк источников курсов на записанных фикстурах (без обращения к реальным сайтам).
+
+    python -m benchmarks.bench_scrapers --repeat 5 --output bench.json
+    python -m benchmarks.bench_scrapers --baseline bench.json --tolerance 0.2
+    python -m benchmarks.bench_scrapers --no-sleeps --case grinex --case usd_full
+
+Для каждого источника (и для полного прогона /usd) меряются задержка (median/p95/max),
+пропускная способность (вызовов в секунду) и RSS процессов Chromium после прогона.
+С --baseline результаты сравниваются с прошлым запуском; при регрессии код выхода 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.fixture_server import FixtureServer
+from handlers import currency_handlers
+from services.investing_updater import InvestingUpdater
+from services.parser_service import ParserService
+from services.quote import Quote
+from services.updater_instance import parser_service
+
+BenchCase = Callable[[ParserService], Awaitable[object]]
+
+MOEX_URL = "https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=USD_RUB"
+PROFINANCE_USD = ("https://www.profinance.ru/chart/usdrub/",
+                  "#app > v-app > div > div > div > table > tbody > tr:nth-child(1) > td:nth-child(2)")
+INVESTING_URL = "https://ru.investing.com/currencies/usd-rub"
+INVESTING_SELECTOR = 'span[data-test="instrument-price-last"]'
+
+
+async def _cbr(service: ParserService):
+    # Иначе все повторы, кроме первого, берут документ из индекса без запроса
+    service.cbr_index.clear()
+    service.update_cbr_rates_for("USD")
+    return service.get_cbr_today_rate("USD")
+
+
+async def _abcex(service: ParserService):
+    return service.get_abcex_rate(
+        "https://abcex.io/api/v1/exchange/public/market-data/order-book/depth?marketId=USDTRUB&lang=ru"
+    )
+
+
+async def _garantex(service: ParserService):
+    return service.get_garantex_rate("usdtrub")
+
+
+async def _moex(service: ParserService):
+    return await service.get_moex_rate(MOEX_URL, currency_handlers.MOEX_SELECTOR)
+
+
+async def _profinance(service: ParserService):
+    return await service.get_profinance_rate(*PROFINANCE_USD)
+
+
+async def _tradingview(service: ParserService):
+    return await service.get_tradingview_usd(
+        url="https://www.tradingview.com/symbols/XAUUSD/",
+        selector="//span[contains(@class, 'last-JWoJqCpY js-symbol-last')]"
+    )
+
+
+async def _xe(service: ParserService):
+    return await service.get_xe_rate_euro_dollar()
+
+
+async def _grinex(service: ParserService):
+    return await service.get_grinex_usd_rate()
+
+
+async def _investing(service: ParserService):
+    """
+    То же извлечение, что делает InvestingUpdater: текст курса + скриншот страницы.
+    """
+    context, page = await service._new_page(use_proxy=False)
+    try:
+        await service._goto(page, INVESTING_URL, wait_until="domcontentloaded")
+        updater = InvestingUpdater()
+        with tempfile.TemporaryDirectory() as tmp:
+            return await updater._update_currency(
+                page=page,
+                selector=INVESTING_SELECTOR,
+                screenshot_path=os.path.join(tmp, "investing.png"),
+                set_rate_callback=lambda val: None,
+                pair="USD/RUB"
+            )
+    finally:
+        await context.close()
+
+
+async def _usd_full(service: ParserService):
+    """
+    Все источники /usd подряд, как в collect_currency_rates (без Telegram).
+    """
+    values: Dict[str, Optional[Quote]] = {}
+    for _, fetcher in currency_handlers.CURRENCY_SOURCES["USD"]:
+        values.update(await fetcher())
+    return values if all(v is not None for k, v in values.items() if k != "cbr_tomorrow") else None
+
+
+CASES: Dict[str, BenchCase] = {
+    "cbr": _cbr,
+    "abcex": _abcex,
+    "garantex": _garantex,
+    "moex": _moex,
+    "profinance": _profinance,
+    "tradingview": _tradingview,
+    "xe": _xe,
+    "grinex": _grinex,
+    "investing": _investing,
+    "usd_full": _usd_full,
+}
+
+
+def browser_rss_bytes() -> Optional[int]:
+    """
+    Суммарный RSS дочерних процессов (Chromium и драйвер Playwright). Только Linux (/proc).
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # поле comm может содержать пробелы, поэтому режем после последней ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents[int(entry)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    descendants, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, ppid in parents.items() if ppid in frontier} - descendants
+        descendants |= frontier
+
+    total = 0
+    for pid in descendants:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+async def run_case(service: ParserService, case: BenchCase, repeat: int) -> Dict[str, object]:
+    await case(service)  # прогрев: запуск браузера, первые соединения
+    latencies: List[float] = []
+    successes = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await case(service)
+        latencies.append(time.perf_counter() - t0)
+        successes += result is not None
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "median_s": round(statistics.median(latencies), 4),
+        "p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+        "max_s": round(latencies[-1], 4),
+        "throughput_per_s": round(repeat / elapsed, 2) if elapsed else None,
+        "success_rate": round(successes / repeat, 3),
+        "browser_rss_mb": round(rss / 2 ** 20, 1) if (rss := browser_rss_bytes()) else None,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    Регрессия — медиана выросла больше чем на tolerance (с допуском 5 мс на шум) или упала доля успехов.
+    """
+    problems = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        limit = base["median_s"] * (1 + tolerance) + 0.005
+        if current["median_s"] > limit:
+            problems.append(f"{name}: median {current['median_s']}s > {base['median_s']}s (+{tolerance:.0%})")
+        if current["success_rate"] < base["success_rate"]:
+            problems.append(f"{name}: success_rate {current['success_rate']} < {base['success_rate']}")
+    return problems
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    service = parser_service
+    server = FixtureServer()
+    server.start()
+    service.url_rewriter = server.rewrite
+    service.proxies = [None]
+    if args.no_sleeps:
+        async def _no_pause(page, timeout_ms):
+            return None
+        service._pause = _no_pause
+
+    results: Dict[str, Dict] = {}
+    try:
+        for name in args.cases or list(CASES):
+            results[name] = await run_case(service, CASES[name], args.repeat)
+            print(f"{name:12} {json.dumps(results[name], ensure_ascii=False)}")
+    finally:
+        await service.close_browser()
+        server.stop()
+
+    report = {
+        "meta": {"repeat": args.repeat, "no_sleeps": args.no_sleeps, "python": sys.version.split()[0],
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f)["cases"], args.tolerance)
+        for problem in problems:
+            print(f"РЕГРЕССИЯ {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк ParserService")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", action="append", dest="cases", choices=sorted(CASES))
+    parser.add_argument("--no-sleeps", action="store_true", help="пропускать фиксированные паузы page.wait_for_timeout")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Локальный HTTP-сервер с записанными ответами источников курсов (benchmarks/fixtures/).
+ParserService направляется на него через url_rewriter: https://www.cbr.ru/scripts/XML_daily.asp
+превращается в http://127.0.0.1:<port>/www.cbr.ru/scripts/XML_daily.asp.
+"""
+import asyncio
+import datetime
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (хост, префикс пути) -> (файл фикстуры, Content-Type)
+FIXTURE_ROUTES: Dict[Tuple[str, str], Tuple[str, str]] = {
+    ("www.cbr.ru", "/scripts/XML_daily.asp"): ("cbr_daily.xml", "application/xml; charset=windows-1251"),
+    ("abcex.io", "/api/v1/exchange/public/market-data/order-book/depth"): ("abcex_depth.json", "application/json"),
+    ("garantex.org", "/api/v2/depth"): ("garantex_depth.json", "application/json"),
+    ("www.moex.com", "/ru/derivatives/currency-rate.aspx"): ("moex.html", "text/html; charset=utf-8"),
+    ("www.profinance.ru", "/chart/"): ("profinance.html", "text/html; charset=utf-8"),
+    ("www.tradingview.com", "/symbols/"): ("tradingview.html", "text/html; charset=utf-8"),
+    ("www.xe.com", "/currencyconverter/convert/"): ("xe.html", "text/html; charset=utf-8"),
+    ("grinex.io", "/trading/"): ("grinex.html", "text/html; charset=utf-8"),
+    ("ru.investing.com", "/currencies/"): ("investing.html", "text/html; charset=utf-8"),
+}
+
+
+def _find_route(host: str, path: str) -> Optional[Tuple[str, str]]:
+    for (route_host, prefix), fixture in FIXTURE_ROUTES.items():
+        if host == route_host and path.startswith(prefix):
+            return fixture
+    return None
+
+
+class FixtureServer:
+    """
+    Отдаёт фикстуры из памяти (файлы читаются один раз), чтобы замер не включал диск.
+    XML ЦБ подставляет дату из date_req, как настоящий сервис.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.hits: Dict[str, int] = {}
+        self._cache: Dict[str, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def rewrite(self, url: str) -> str:
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self.base_url}/{parts.netloc}{parts.path}{query}"
+
+    def _load(self, filename: str) -> bytes:
+        if filename not in self._cache:
+            with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+                self._cache[filename] = f.read()
+        return self._cache[filename]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        host = request.match_info["host"]
+        path = "/" + request.match_info["path"]
+        route = _find_route(host, path)
+        if route is None:
+            return web.Response(status=404, text=f"no fixture for {host}{path}")
+        filename, content_type = route
+        self.hits[filename] = self.hits.get(filename, 0) + 1
+        body = self._load(filename)
+
+        if filename == "cbr_daily.xml":
+            date_req = request.query.get("date_req")
+            day = datetime.datetime.strptime(date_req, "%d/%m/%Y").date() if date_req else datetime.date.today()
+            body = body.replace(b"{date}", day.strftime("%d.%m.%Y").encode())
+
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    async def _serve(self, started: threading.Event) -> None:
+        app = web.Application()
+        app.router.add_get("/{host}/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=self.host, port=self.port)
+        await site.start()
+        # порт 0 — берём тот, что выдала ОС
+        self.port = site._server.sockets[0].getsockname()[1]
+        started.set()
+
+    def start(self) -> None:
+        """
+        Сервер работает в отдельном потоке со своим event loop: часть источников
+        (CBR, ABCEX, Garantex) ходит синхронным requests и заблокировала бы общий loop.
+        """
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._serve(started))
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fixture-server", daemon=True)
+        self._thread.start()
+        started.wait(10)
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+            self._runner = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> "FixtureServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
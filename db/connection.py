@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Any, Callable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Настройки, применяемые к каждому новому соединению
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # читатели не блокируют писателя и наоборот
+    "PRAGMA synchronous=NORMAL",    # в режиме WAL безопасно и без fsync на каждый коммит
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",     # ~16 МБ страничного кеша на соединение
+    "PRAGMA mmap_size=134217728",   # 128 МБ memory-mapped I/O
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class SQLiteDatabase:
+    """
+    Долгоживущие соединения к одному файлу SQLite вместо sqlite3.connect на каждый запрос.
+      - запись идёт через один поток (одно соединение), поэтому писатели не конкурируют за блокировку;
+      - чтение — через небольшой пул потоков, у каждого своё соединение (WAL позволяет читать параллельно);
+      - все запросы выполняются вне event loop (run_in_executor), бот не ждёт диск.
+    Подготовленные выражения кешируются самим sqlite3 (cached_statements).
+    """
+
+    def __init__(self, path: str, readers: int = 2, cached_statements: int = 256) -> None:
+        self.path = path
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-writer-{path}")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix=f"sqlite-reader-{path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Соединение текущего потока (создаётся один раз на поток).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=self.cached_statements)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call_write(self, fn: Callable[..., T], args: tuple) -> T:
+        conn = self._connection()
+        with conn:  # commit при успехе, rollback при исключении
+            return fn(conn, *args)
+
+    def _call_read(self, fn: Callable[..., T], args: tuple) -> T:
+        return fn(self._connection(), *args)
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Выполняет fn(conn, *args) в потоке-писателе и коммитит транзакцию.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call_write, fn, args)
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Выполняет fn(conn, *args) в одном из потоков-читателей.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call_read, fn, args)
+
+    def write_sync(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Синхронный вариант write() — для инициализации схемы при старте, до запуска event loop.
+        """
+        return self._writer.submit(self._call_write, fn, args).result()
+
+    def close(self) -> None:
+        """
+        Дожидается выполнения поставленных запросов и закрывает все соединения.
+        """
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+
+
+class BatchWriter:
+    """
+    Буферизованная запись строк: put() только кладёт строку в очередь,
+    а фоновая задача пишет накопленное одной транзакцией через insert(conn, rows) —
+    когда набралось batch_size строк или прошло flush_interval секунд.
+    Если очередь переполнена, put() ждёт (backpressure), а put_nowait() отбрасывает строку.
+    """
+
+    def __init__(self, db: SQLiteDatabase, insert: Callable[[sqlite3.Connection, List[Any]], None],
+                 batch_size: int = 200, flush_interval: float = 1.0, max_queue: int = 10000) -> None:
+        self.db = db
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, row: Any) -> None:
+        if not self.running:
+            # Запись не запущена (например, в скриптах) — пишем сразу
+            await self.db.write(self.insert, [row])
+            return
+        await self._queue.put(row)
+
+    def put_nowait(self, row: Any) -> bool:
+        """
+        Для синхронного кода: строка теряется, если запись не запущена или очередь полна.
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _run(self) -> None:
+        # None в очереди — сигнал остановки: дописываем накопленное и выходим
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    await self._write(batch)
+                    return
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Any]) -> None:
+        try:
+            await self.db.write(self.insert, batch)
+        except Exception as e:
+            logger.error(f"[{type(self).__name__}] Не удалось записать {len(batch)} строк: {e}")
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую задачу и дописывает всё, что осталось в очереди.
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
@@ -1,16 +1,84 @@
 import sqlite3
 import json
-from typing import Optional, Any
+from collections import OrderedDict
+from typing import Optional, Any, NamedTuple
+
+from db.connection import SQLiteDatabase
 
 DB_PATH = "db/users.db"
 
-def init_db() -> None:
+users_db = SQLiteDatabase(DB_PATH)
+
+class CachedVariables(NamedTuple):
+    values: dict[str, Any]
+    total: float
+
+class UserVariablesCache:
     """
-    Создаёт таблицу user_variables, если её нет.
+    LRU-кеш переменных пользователей (write-through: обновляется вместе с записью в БД).
+    Вместе со словарём хранит заранее посчитанную сумму переменных для /calculate.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[int, CachedVariables] = OrderedDict()
+        # Номер последней записи по пользователю: чтение из БД, начатое до записи, не перетрёт кеш.
+        # Номера берутся из общего счётчика и хранятся не больше чем для maxsize пользователей;
+        # забытый номер поднимает _min_version — версию всех, у кого своего номера нет
+        self._versions: OrderedDict[int, int] = OrderedDict()
+        self._last_version = 0
+        self._min_version = 0
+
+    def get(self, user_id: int) -> Optional[CachedVariables]:
+        item = self._items.get(user_id)
+        if item is not None:
+            self._items.move_to_end(user_id)
+        return item
+
+    def put(self, user_id: int, values: dict[str, Any]) -> CachedVariables:
+        item = CachedVariables(dict(values), sum(values.values()))
+        self._items[user_id] = item
+        self._items.move_to_end(user_id)
+        if len(self._items) > self.maxsize:
+            evicted_id, _ = self._items.popitem(last=False)
+            self._forget_version(evicted_id)
+        return item
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, self._min_version)
+
+    def _forget_version(self, user_id: int) -> None:
+        version = self._versions.pop(user_id, None)
+        if version is not None:
+            self._min_version = max(self._min_version, version)
+
+    def put_if_unchanged(self, user_id: int, values: dict[str, Any], version: int) -> CachedVariables:
+        if self.version(user_id) != version:
+            return CachedVariables(dict(values), sum(values.values()))
+        return self.put(user_id, values)
+
+    def invalidate(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
+        self._last_version += 1
+        self._versions[user_id] = self._last_version
+        self._versions.move_to_end(user_id)
+        if len(self._versions) > self.maxsize:
+            self._forget_version(next(iter(self._versions)))
+
+variables_cache = UserVariablesCache()
+
+DEFAULT_VARIABLES = {
+    "royalty": 0.1,
+    "delivery": 0.15,
+    "payment": 0.12,
+    "operational": 0.2,
+    "cashless": 0.4,
+    "discount": 0.2,
+    "aedusdt": 0.3
+}
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS user_variables (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER,
@@ -18,95 +86,78 @@ def init_db() -> None:
             in_process BOOLEAN
         )
     ''')
-    conn.commit()
-    conn.close()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_variables_user_id ON user_variables (user_id)")
 
-def add_user(user_id: int) -> None:
+def init_db() -> None:
     """
-    Добавляет запись о пользователе, если его ещё нет, с дефолтными переменными.
+    Создаёт таблицу user_variables, если её нет.
+    Вызывается при старте, синхронно.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM user_variables WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
+    users_db.write_sync(_init_db)
+
+def _add_user(conn: sqlite3.Connection, user_id: int) -> None:
+    row = conn.execute("SELECT 1 FROM user_variables WHERE user_id=?", (user_id,)).fetchone()
     if not row:
-        default_vars = {
-            "royalty": 0.1,
-            "delivery": 0.15,
-            "payment": 0.12,
-            "operational": 0.2,
-            "cashless": 0.4,
-            "discount": 0.2,
-            "aedusdt": 0.3
-        }
-        cur.execute('''
+        conn.execute('''
             INSERT INTO user_variables (user_id, variables, in_process)
             VALUES (?, ?, ?)
-        ''', (user_id, json.dumps(default_vars), False))
-        conn.commit()
-    conn.close()
+        ''', (user_id, json.dumps(DEFAULT_VARIABLES), False))
 
-def get_user_variables(user_id: int) -> Optional[dict[str, Any]]:
+async def add_user(user_id: int) -> None:
     """
-    Возвращает переменные пользователя в виде словаря.
+    Добавляет запись о пользователе, если его ещё нет, с дефолтными переменными.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT variables FROM user_variables WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    if row and row[0]:
-        return json.loads(row[0])
+    await users_db.write(_add_user, user_id)
+
+def _get_user_variables(conn: sqlite3.Connection, user_id: int) -> Optional[str]:
+    row = conn.execute("SELECT variables FROM user_variables WHERE user_id=?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+async def _get_cached_variables(user_id: int) -> Optional[CachedVariables]:
+    cached = variables_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = variables_cache.version(user_id)
+    raw = await users_db.read(_get_user_variables, user_id)
+    if raw:
+        return variables_cache.put_if_unchanged(user_id, json.loads(raw), version)
     return None
 
-def update_user_variables(user_id: int, variables: dict[str, Any]) -> None:
+async def get_user_variables(user_id: int) -> Optional[dict[str, Any]]:
     """
-    Сохраняет (перезаписывает) переменные пользователя в базе.
+    Возвращает переменные пользователя в виде словаря (копию — кеш не меняется снаружи).
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        UPDATE user_variables
-        SET variables = ?
-        WHERE user_id = ?
-    ''', (json.dumps(variables), user_id))
-    conn.commit()
-    conn.close()
+    cached = await _get_cached_variables(user_id)
+    if cached is not None:
+        return dict(cached.values)
+    return None
 
-def get_process_state(user_id: int) -> bool:
-    """
-    Возвращает текущее значение in_process (True/False) для пользователя.
-    """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT in_process FROM user_variables WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    if row:
-        return bool(row[0])
-    return False
-
-def set_process_state(user_id: int, state: bool) -> None:
+async def get_user_variables_total(user_id: int) -> float:
     """
-    Устанавливает флаг in_process для пользователя.
+    Сумма переменных пользователя (посчитана заранее при загрузке/сохранении).
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
+    cached = await _get_cached_variables(user_id)
+    return cached.total if cached is not None else 0.0
+
+def _update_user_variables(conn: sqlite3.Connection, user_id: int, variables_json: str) -> int:
+    return conn.execute('''
         UPDATE user_variables
-        SET in_process = ?
+        SET variables = ?
         WHERE user_id = ?
-    ''', (state, user_id))
-    conn.commit()
-    conn.close()
-
+    ''', (variables_json, user_id)).rowcount
 
-def reset_all_process_states():
+async def update_user_variables(user_id: int, variables: dict[str, Any]) -> None:
     """
-    Сбросить состояние процесса у всех пользователей в False.
-    Вызывается при старте бота, чтобы не оставалось "залипших" состояний.
+    Сохраняет (перезаписывает) переменные пользователя в базе и сразу обновляет кеш.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE user_variables SET in_process = 0")
-        conn.commit()
\ No newline at end of file
+    variables_cache.invalidate(user_id)
+    try:
+        updated = await users_db.write(_update_user_variables, user_id, json.dumps(variables))
+    except Exception:
+        variables_cache.invalidate(user_id)
+        raise
+    if updated:
+        variables_cache.put(user_id, variables)
+    else:
+        # Пользователя нет в таблице (не было /start) — кешировать нечего
+        variables_cache.invalidate(user_id)
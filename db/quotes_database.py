@@ -0,0 +1,72 @@
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from db.connection import BatchWriter, SQLiteDatabase
+from services.quote import Quote
+
+QUOTES_DB_PATH = "db/quotes.db"
+
+quotes_db = SQLiteDatabase(QUOTES_DB_PATH)
+
+def _init_quotes_db(conn: sqlite3.Connection) -> None:
+    # Одна строка — одно числовое поле источника (profinance, garantex, cbr_today, ...) в момент получения
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quotes (
+            ts REAL NOT NULL,
+            currency TEXT NOT NULL,
+            source TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_field_ts ON quotes (currency, field, ts)")
+
+def init_quotes_db() -> None:
+    quotes_db.write_sync(_init_quotes_db)
+
+QuoteRow = Tuple[float, str, str, str, float]
+
+def _insert_quotes(conn: sqlite3.Connection, rows: List[QuoteRow]) -> None:
+    conn.executemany("INSERT INTO quotes (ts, currency, source, field, value) VALUES (?, ?, ?, ?, ?)", rows)
+
+class QuoteRecorder(BatchWriter):
+    """
+    История котировок: каждое новое значение из общего снимка курсов (RatesSnapshot)
+    буферизуется и пишется пачками в quotes.db.
+    """
+
+    def __init__(self, db: SQLiteDatabase, batch_size: int = 500,
+                 flush_interval: float = 5.0, max_queue: int = 10000) -> None:
+        super().__init__(db, _insert_quotes, batch_size, flush_interval, max_queue)
+
+    def on_quote(self, currency: str, source: str, values: Dict[str, Optional[Quote]]) -> None:
+        """
+        Подписчик RatesSnapshot (синхронный): котировки кладутся в очередь без ожидания.
+        """
+        for field, quote in values.items():
+            if quote is not None:
+                self.put_nowait((quote.fetched_at, currency.upper(), source, field, float(quote.value)))
+
+quote_recorder = QuoteRecorder(quotes_db)
+
+def _get_quote_windows(
+    conn: sqlite3.Connection, currency: str, field: str, since: float, until: float, window: float
+) -> List[Tuple[int, float]]:
+    # Последнее значение в каждом окне: у SQLite «голая» колонка при MAX() берётся из строки с максимумом
+    return conn.execute("""
+        SELECT CAST(ts / ? AS INTEGER) AS bucket, value, MAX(ts)
+        FROM quotes
+        WHERE currency = ? AND field = ? AND ts >= ? AND ts < ?
+        GROUP BY bucket
+        ORDER BY bucket
+    """, (window, currency.upper(), field, since, until)).fetchall()
+
+async def get_quote_windows(
+    currency: str, field: str, since: float, until: float, window: float
+) -> List[Tuple[int, float]]:
+    """
+    Котировка поля, сведённая к окнам длиной window секунд: [(номер окна, последнее значение в окне)].
+    Номер окна * window — начало окна (unix time).
+    """
+    rows = await quotes_db.read(_get_quote_windows, currency, field, since, until, window)
+    return [(bucket, value) for bucket, value, _ in rows]
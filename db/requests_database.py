@@ -1,14 +1,16 @@
 import sqlite3
+import time
 from datetime import datetime, date
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+from db.connection import BatchWriter, SQLiteDatabase
 
 REQUESTS_DB_PATH = "db/requests.db"
 
-# Создаём таблицу requests, если не существует
-def init_requests_db() -> None:
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
+requests_db = SQLiteDatabase(REQUESTS_DB_PATH)
+
+def _init_requests_db(conn: sqlite3.Connection) -> None:
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS requests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id TEXT,
@@ -16,66 +18,280 @@ def init_requests_db() -> None:
             date TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+    # Колонки, добавленные позже: точное время (unix) и имя команды
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(requests)")}
+    if "created_at" not in columns:
+        conn.execute("ALTER TABLE requests ADD COLUMN created_at REAL")
+    if "command" not in columns:
+        conn.execute("ALTER TABLE requests ADD COLUMN command TEXT")
+        conn.create_function("parse_command", 1, parse_command)
+        conn.execute("UPDATE requests SET command = parse_command(text) WHERE text LIKE '/%'")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_date ON requests (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_user_id ON requests (user_id)")
 
-def log_request(user_id: str, text: str) -> None:
+    _init_rollups(conn)
+
+def _init_rollups(conn: sqlite3.Connection) -> None:
     """
-    Добавляет запись (user_id, text, date=сегодня) в таблицу requests.
+    Агрегаты для /stats, поддерживаемые триггерами при каждой вставке в requests:
+      - requests_daily: запросов и уникальных пользователей за день
+      - requests_daily_commands: запросов по командам за день
+      - requests_daily_users / request_users: кто уже встречался (за день / за всё время)
+      - stats_totals: одна строка с общим числом запросов и пользователей
+    Все запросы статистики читают одну строку или диапазон по первичному ключу.
     """
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO requests (user_id, text, date)
-        VALUES (?, ?, ?)
-    """, (user_id, text, today_str))
-    conn.commit()
-    conn.close()
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS requests_daily (
+            date TEXT PRIMARY KEY,
+            requests INTEGER NOT NULL DEFAULT 0,
+            users INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS requests_daily_commands (
+            date TEXT NOT NULL,
+            command TEXT NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, command)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS requests_daily_users (
+            date TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (date, user_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS request_users (
+            user_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            requests INTEGER NOT NULL DEFAULT 0,
+            users INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO stats_totals (id, requests, users) VALUES (1, 0, 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup AFTER INSERT ON requests
+        BEGIN
+            INSERT INTO requests_daily (date, requests) VALUES (NEW.date, 1)
+                ON CONFLICT (date) DO UPDATE SET requests = requests + 1;
+            INSERT INTO requests_daily_commands (date, command, requests)
+                VALUES (NEW.date, COALESCE(NEW.command, ''), 1)
+                ON CONFLICT (date, command) DO UPDATE SET requests = requests + 1;
+            INSERT OR IGNORE INTO requests_daily_users (date, user_id) VALUES (NEW.date, NEW.user_id);
+            INSERT OR IGNORE INTO request_users (user_id) VALUES (NEW.user_id);
+            UPDATE stats_totals SET requests = requests + 1 WHERE id = 1;
+        END;
+
+        -- INSERT OR IGNORE не вызывает AFTER INSERT, поэтому счётчики растут только для новых пользователей
+        CREATE TRIGGER IF NOT EXISTS trg_daily_users_rollup AFTER INSERT ON requests_daily_users
+        BEGIN
+            UPDATE requests_daily SET users = users + 1 WHERE date = NEW.date;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_request_users_rollup AFTER INSERT ON request_users
+        BEGIN
+            UPDATE stats_totals SET users = users + 1 WHERE id = 1;
+        END;
+    """)
+
+    # Первый запуск на существующей базе: строим агрегаты по уже накопленным строкам
+    total = conn.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+    if conn.execute("SELECT requests FROM stats_totals WHERE id = 1").fetchone()[0] != total:
+        _rebuild_rollups(conn)
+
+def _rebuild_rollups(conn: sqlite3.Connection) -> None:
+    conn.executescript("""
+        DELETE FROM requests_daily;
+        DELETE FROM requests_daily_commands;
+        DELETE FROM requests_daily_users;
+        DELETE FROM request_users;
+
+        INSERT INTO requests_daily (date, requests, users)
+            SELECT date, COUNT(*), COUNT(DISTINCT user_id) FROM requests GROUP BY date;
+        INSERT INTO requests_daily_commands (date, command, requests)
+            SELECT date, COALESCE(command, ''), COUNT(*) FROM requests GROUP BY date, COALESCE(command, '');
+        INSERT INTO requests_daily_users (date, user_id)
+            SELECT DISTINCT date, user_id FROM requests;
+        INSERT INTO request_users (user_id)
+            SELECT DISTINCT user_id FROM requests;
+        -- триггеры выше уже посчитали users; выставляем точные значения
+        UPDATE requests_daily SET users = (
+            SELECT COUNT(*) FROM requests_daily_users d WHERE d.date = requests_daily.date
+        );
+        UPDATE stats_totals SET
+            requests = (SELECT COUNT(*) FROM requests),
+            users = (SELECT COUNT(*) FROM request_users)
+        WHERE id = 1;
+    """)
+
+# Создаём таблицу requests, если не существует
+def init_requests_db() -> None:
+    requests_db.write_sync(_init_requests_db)
+
+RequestRow = Tuple[str, str, str, float, Optional[str]]
 
-def get_requests_count_today() -> int:
+def _insert_requests(conn: sqlite3.Connection, rows: List[RequestRow]) -> None:
+    conn.executemany("""
+        INSERT INTO requests (user_id, text, date, created_at, command)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+def parse_command(text: Optional[str]) -> Optional[str]:
+    """
+    "/usd@my_bot 123" -> "usd"; для обычного текста — None.
+    """
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower() or None
+
+class RequestLogger(BatchWriter):
+    """
+    Буферизованная запись лога запросов (см. BatchWriter): команда не ждёт диск.
+    """
+
+    def __init__(self, db: SQLiteDatabase, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10000) -> None:
+        super().__init__(db, _insert_requests, batch_size, flush_interval, max_queue)
+
+    async def log(self, user_id: str, text: str) -> None:
+        now = time.time()
+        row = (user_id, text, datetime.fromtimestamp(now).strftime("%Y-%m-%d"), now, parse_command(text))
+        await self.put(row)
+
+request_logger = RequestLogger(requests_db)
+
+async def log_request(user_id: str, text: str) -> None:
+    """
+    Добавляет запись (user_id, text, дата, время, команда) в таблицу requests через буферизованный логгер.
+    """
+    await request_logger.log(user_id, text)
+
+def _count_for_date(conn: sqlite3.Connection, date_str: str) -> int:
+    row = conn.execute("SELECT requests FROM requests_daily WHERE date = ?", (date_str,)).fetchone()
+    return row[0] if row else 0
+
+async def get_requests_count_today() -> int:
     """
     Возвращает кол-во запросов за сегодняшний день.
     """
-    today_str = date.today().isoformat()
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*) FROM requests WHERE date = ?
-    """, (today_str,))
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    return await requests_db.read(_count_for_date, date.today().isoformat())
 
-def get_all_requests() -> List[Tuple[str, str, str]]:
+def _users_for_date(conn: sqlite3.Connection, date_str: str) -> int:
+    row = conn.execute("SELECT users FROM requests_daily WHERE date = ?", (date_str,)).fetchone()
+    return row[0] if row else 0
+
+async def get_unique_users_count_today() -> int:
+    """
+    Кол-во уникальных пользователей за сегодня.
+    """
+    return await requests_db.read(_users_for_date, date.today().isoformat())
+
+def _command_counts_for_date(conn: sqlite3.Connection, date_str: str) -> List[Tuple[str, int]]:
+    return conn.execute("""
+        SELECT command, requests FROM requests_daily_commands
+        WHERE date = ? ORDER BY requests DESC
+    """, (date_str,)).fetchall()
+
+async def get_command_counts_today() -> List[Tuple[str, int]]:
+    """
+    [(команда, кол-во)] за сегодня; пустая строка — сообщения без команды.
+    """
+    return await requests_db.read(_command_counts_for_date, date.today().isoformat())
+
+def _get_requests_for_date(conn: sqlite3.Connection, date_str: str) -> List[Tuple[str, str, str]]:
+    return conn.execute("SELECT user_id, text, date FROM requests WHERE date = ?", (date_str,)).fetchall()
+
+async def get_requests_today() -> List[Tuple[str, str, str]]:
+    """
+    Список (user_id, text, date) за сегодня (по индексу idx_requests_date).
+    """
+    return await requests_db.read(_get_requests_for_date, date.today().isoformat())
+
+def _get_latest_requests_for_date(conn: sqlite3.Connection, date_str: str, limit: int) -> List[Tuple[str, str, str]]:
+    # Индекс по date содержит rowid (= id), поэтому ORDER BY id DESC LIMIT читает только limit строк
+    return conn.execute(
+        "SELECT user_id, text, date FROM requests WHERE date = ? ORDER BY id DESC LIMIT ?", (date_str, limit)
+    ).fetchall()
+
+async def get_latest_requests_today(limit: int) -> List[Tuple[str, str, str]]:
+    """
+    Последние limit запросов (user_id, text, date) за сегодня, от новых к старым.
+    """
+    return await requests_db.read(_get_latest_requests_for_date, date.today().isoformat(), limit)
+
+def _get_all_requests(conn: sqlite3.Connection) -> List[Tuple[str, str, str]]:
+    return conn.execute("SELECT user_id, text, date FROM requests").fetchall()
+
+async def get_all_requests() -> List[Tuple[str, str, str]]:
     """
     Возвращает список всех (user_id, text, date) из таблицы requests.
     """
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT user_id, text, date FROM requests")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    return await requests_db.read(_get_all_requests)
+
+def _count_total(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT requests FROM stats_totals WHERE id = 1").fetchone()[0]
 
-def get_total_requests_count() -> int:
+async def get_total_requests_count() -> int:
     """
     Кол-во всех запросов (за всё время).
     """
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM requests")
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    return await requests_db.read(_count_total)
 
-def get_unique_users_count() -> int:
+def _count_unique_users(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT users FROM stats_totals WHERE id = 1").fetchone()[0]
+
+async def get_unique_users_count() -> int:
     """
     Кол-во уникальных user_id за всё время.
     """
-    conn = sqlite3.connect(REQUESTS_DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(DISTINCT user_id) FROM requests")
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    return await requests_db.read(_count_unique_users)
+
+def _get_last_request_id(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM requests").fetchone()[0]
+
+async def get_last_request_id() -> int:
+    """
+    id последней записанной строки (0, если лог пуст). Меняется при каждой новой записи.
+    """
+    return await requests_db.read(_get_last_request_id)
+
+def _get_daily_stats(conn: sqlite3.Connection) -> List[Tuple[str, int, int]]:
+    return conn.execute("SELECT date, requests, users FROM requests_daily ORDER BY date DESC").fetchall()
+
+async def get_daily_stats() -> List[Tuple[str, int, int]]:
+    """
+    [(дата, запросов, уникальных пользователей)] по дням, от новых к старым.
+    """
+    return await requests_db.read(_get_daily_stats)
+
+def _get_command_totals(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+    return conn.execute("""
+        SELECT command, SUM(requests) AS total FROM requests_daily_commands
+        GROUP BY command ORDER BY total DESC
+    """).fetchall()
+
+async def get_command_totals() -> List[Tuple[str, int]]:
+    """
+    [(команда, запросов)] за всё время.
+    """
+    return await requests_db.read(_get_command_totals)
+
+def iter_requests_desc(
+    conn: sqlite3.Connection,
+    before_id: int,
+    limit: int,
+    page_size: int = 500
+) -> Iterator[List[Tuple[int, str, str, str]]]:
+    """
+    Постранично отдаёт (id, user_id, text, date) от новых к старым, начиная с before_id включительно.
+    Пагинация по ключу (id < последнего), поэтому каждая страница — поиск по индексу, а в памяти только одна страница.
+    Синхронная: вызывать в рабочем потоке со своим соединением.
+    """
+    remaining = limit
+    while remaining > 0:
+        page = conn.execute("""
+            SELECT id, user_id, text, date FROM requests
+            WHERE id <= ? ORDER BY id DESC LIMIT ?
+        """, (before_id, min(page_size, remaining))).fetchall()
+        if not page:
+            return
+        yield page
+        remaining -= len(page)
+        before_id = page[-1][0] - 1
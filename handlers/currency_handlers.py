@@ -1,29 +1,36 @@
 import datetime
+import logging
 import pytz
 from aiogram import Router
-from aiogram.types import Message, FSInputFile
+from aiogram import F
+from aiogram.types import Message, FSInputFile, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import Command
 
 import asyncio
 
-from db.database import get_process_state, set_process_state
-from services.parser_service import ParserService
-from services.updater_instance import investing_updater
-from typing import Optional
+from keyboards.currency_keyboards import RATES_CALLBACK_PREFIX, rates_keyboard
+from middlewares.rate_limit import charge_rate_limit
+from services.browser_admission import BrowserBusy, background_jobs
+from services.updater_instance import investing_updater, parser_service, rates_snapshot, user_leases, user_rate_limiter
+from services.quote import Quote
+from services.rate_limit import retry_after_text
+from services.tracing import span, trace
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 router = Router()
-parser_service = ParserService()
 
 def build_currency_table(
     title: str,
-    investing: Optional[str],
-    cbr_today: Optional[str],
-    cbr_tomorrow: Optional[str],
-    profinance: Optional[str],
-    moex: Optional[str],
-    abcex: Optional[str] = None,
-    grinex: Optional[str] = None,
-    tranding_view: Optional[str] = None,
+    investing: Optional[Quote],
+    cbr_today: Optional[Quote],
+    cbr_tomorrow: Optional[Quote],
+    profinance: Optional[Quote],
+    moex: Optional[Quote],
+    abcex: Optional[Quote] = None,
+    grinex: Optional[Quote] = None,
+    tranding_view: Optional[Quote] = None,
 ) -> str:
     """
     Формируем текстовую "таблицу" по курсам.
@@ -68,423 +75,302 @@ def build_currency_table(
     text += f"</pre>"
     return text
 
-async def edit_message_if_changed(message: Message, new_text: str, old_text: str) -> str:
+async def edit_message_if_changed(
+    message: Message,
+    new_text: str,
+    old_text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+) -> str:
     """
     Редактируем сообщение только при изменении текста, чтобы избежать ошибки "message is not modified".
     Возвращаем установленный текст.
     """
-    if new_text != old_text:
-        await message.edit_text(new_text, parse_mode="HTML")
+    if new_text != old_text or reply_markup is not None:
+        with span("telegram.edit"):
+            await message.edit_text(new_text, parse_mode="HTML", reply_markup=reply_markup)
         return new_text
     return old_text
 
-@router.message(Command("usd"))
-async def cmd_usd(message: Message):
-    """
-    Команда /usd — собираем данные по USD/RUB последовательно,
-    чтобы не загружать все сайты разом.
-    """
-    if get_process_state(message.from_user.id):
-        await message.reply("У вас уже обрабатывается запрос.")
-        return
+# ------------------------------------------------------
+# Источники курсов по валютам.
+# Каждый источник — корутина, возвращающая словарь {поле build_currency_table: значение}.
+# ------------------------------------------------------
+MOEX_SELECTOR = "#app > div:nth-child(2) > div.ui-container.-default > div > div.ui-table > div.ui-table__container > table > tbody > tr:nth-child(1) > td:nth-child(2)"
 
-    set_process_state(message.from_user.id, True)
-    wait_msg = await message.answer("Начинаем сбор данных по USD/RUB...")
-
-    old_table_text = ""
-    # Изначальное пустое состояние
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=None,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None,
-        abcex=None,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 1. Курс с Investing (берём из нашего investing_updater)
-    invest_rate = investing_updater.cached_usd_rate
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None,
-        abcex=None,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+SourceFetcher = Callable[[], Awaitable[Dict[str, Optional[Quote]]]]
 
-    if invest_rate:
-        try:
-            file_photo = FSInputFile(investing_updater.cached_usd_screenshot)
-            await message.answer_photo(file_photo, caption="Скриншот Investing (USD/RUB)")
-        except Exception as e:
-            print(f"Не удалось отправить скриншот (USD): {e}")
+CURRENCY_TITLES = {
+    "USD": "Курсы USD/RUB",
+    "EUR": "Курсы EUR/RUB",
+    "CNY": "Курсы CNY/RUB",
+}
 
-    # 2. CBR (requests)
-    try:
-        parser_service.update_usd_cbr_rates()
-        cbr_today = parser_service.get_cbr_today_rate("USD")
-        cbr_tomorrow = parser_service.get_cbr_tomorrow_rate("USD")
-    except Exception as e:
-        print(f"Ошибка CBR USD: {e}")
-        cbr_today = None
-        cbr_tomorrow = None
-
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=None,
-        moex=None,
-        abcex=None,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
-    # 3. ProFinance
-    profinance_rate = await parser_service.get_profinance_rate(
-        url="https://www.profinance.ru/chart/usdrub/",
-        selector="#app > v-app > div > div > div > table > tbody > tr:nth-child(1) > td:nth-child(2)"
-    )
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=None,
-        abcex=None,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+def _cbr_source(char_code: str) -> SourceFetcher:
+    async def fetch() -> Dict[str, Optional[Quote]]:
+        # Запросы к ЦБ синхронные (requests) — выполняем в потоке, чтобы не блокировать event loop
+        await asyncio.to_thread(parser_service.update_cbr_rates_for, char_code)
+        return {
+            "cbr_today": parser_service.get_cbr_today_rate(char_code),
+            "cbr_tomorrow": parser_service.get_cbr_tomorrow_rate(char_code),
+        }
+    return fetch
 
-    # 4. MOEX
-    moex_rate = await parser_service.get_moex_rate(
-        url="https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=USD_RUB",
-        selector="#app > div:nth-child(2) > div.ui-container.-default > div > div.ui-table > div.ui-table__container > table > tbody > tr:nth-child(1) > td:nth-child(2)"
-    )
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=None,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
-    # 5. ABCEX (синхронный)
-    abcex = None
-    try:
-        abcex = parser_service.get_abcex_rate(
-            "https://abcex.io/api/v1/exchange/public/market-data/order-book/depth?marketId=USDTRUB&lang=ru"
-        )
-    except Exception as e:
-        print(f"Ошибка ABCEX USD: {e}")
-
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=abcex,
-        grinex=None,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 6. Grinex
-    grinex_rate = await parser_service.get_grinex_usd_rate()
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=abcex,
-        grinex=grinex_rate,
-        tranding_view=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+def _profinance_source(url: str, selector: str, pair: str) -> SourceFetcher:
+    async def fetch() -> Dict[str, Optional[Quote]]:
+        return {"profinance": await parser_service.get_profinance_rate(url=url, selector=selector, pair=pair)}
+    return fetch
 
-    # 7. TradingView
-    tranding_view = await parser_service.get_tradingview_usd(
-        url="https://www.tradingview.com/symbols/XAUUSD/",
-        selector="//span[contains(@class, 'last-JWoJqCpY js-symbol-last')]"
-    )
-    table_text = build_currency_table(
-        title="Курсы USD/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=abcex,
-        grinex=grinex_rate,
-        tranding_view=tranding_view
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
+def _moex_source(url: str, pair: str) -> SourceFetcher:
+    async def fetch() -> Dict[str, Optional[Quote]]:
+        return {"moex": await parser_service.get_moex_rate(url=url, selector=MOEX_SELECTOR, pair=pair)}
+    return fetch
 
-    set_process_state(message.from_user.id, False)
 
-    await message.answer("Можете дальше отправлять команды.")
+def _field_source(field: str, getter: Callable[[], Awaitable[Optional[Quote]]]) -> SourceFetcher:
+    async def fetch() -> Dict[str, Optional[Quote]]:
+        return {field: await getter()}
+    return fetch
 
-@router.message(Command("euro"))
-async def cmd_euro(message: Message):
-    """
-    Команда /euro — сбор данных по EUR/RUB последовательно.
-    """
-    if get_process_state(message.from_user.id):
-        await message.reply("У вас уже обрабатывается запрос.")
-        return
 
-    set_process_state(message.from_user.id, True)
-    wait_msg = await message.answer("Начинаем сбор данных по EUR/RUB...")
-
-    old_table_text = ""
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=None,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None
+async def _get_abcex_usd() -> Optional[Quote]:
+    # ABCEX синхронный (requests) — выполняем в потоке, как Garantex в /calculate
+    return await asyncio.to_thread(
+        parser_service.get_abcex_rate,
+        "https://abcex.io/api/v1/exchange/public/market-data/order-book/depth?marketId=USDTRUB&lang=ru"
     )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 1. Investing
-    invest_rate = investing_updater.cached_eur_rate
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None
+
+
+async def _get_tradingview_gold() -> Optional[Quote]:
+    return await parser_service.get_tradingview_usd(
+        url="https://www.tradingview.com/symbols/XAUUSD/",
+        selector="//span[contains(@class, 'last-JWoJqCpY js-symbol-last')]"
     )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
-    if invest_rate:
-        try:
-            file_photo = FSInputFile(investing_updater.cached_eur_screenshot)
-            await message.answer_photo(file_photo, caption="Скриншот Investing (EUR/RUB)")
-        except Exception as e:
-            print(f"Не удалось отправить скриншот (EUR): {e}")
 
-    # 2. CBR
+# Порядок важен: источники опрашиваются последовательно, чтобы не загружать все сайты разом.
+# Для EUR/CNY поля abcex/grinex в таблице заняты курсами XE.
+CURRENCY_SOURCES: Dict[str, List[Tuple[str, SourceFetcher]]] = {
+    "USD": [
+        ("cbr", _cbr_source("USD")),
+        ("profinance", _profinance_source(
+            url="https://www.profinance.ru/chart/usdrub/",
+            selector="#app > v-app > div > div > div > table > tbody > tr:nth-child(1) > td:nth-child(2)",
+            pair="USD/RUB"
+        )),
+        ("moex", _moex_source("https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=USD_RUB", "USD/RUB")),
+        ("abcex", _field_source("abcex", _get_abcex_usd)),
+        ("grinex", _field_source("grinex", parser_service.get_grinex_usd_rate)),
+        ("tradingview", _field_source("tranding_view", _get_tradingview_gold)),
+    ],
+    "EUR": [
+        ("cbr", _cbr_source("EUR")),
+        ("profinance", _profinance_source(url="https://www.profinance.ru/chart/eurrub/", selector="#b_30", pair="EUR/RUB")),
+        ("moex", _moex_source("https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=EUR_RUB", "EUR/RUB")),
+        ("xe_direct", _field_source("abcex", parser_service.get_xe_rate_euro_dollar)),  # "1 EUR = X USD"
+        ("xe_inverse", _field_source("grinex", parser_service.get_xe_rate_dollar_euro)),  # "1 USD = X EUR"
+    ],
+    "CNY": [
+        ("cbr", _cbr_source("CNY")),
+        ("profinance", _profinance_source(url="https://www.profinance.ru/chart/cnyrub/", selector="#b_CNY_RUB", pair="CNY/RUB")),
+        ("moex", _moex_source("https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=CNY_RUB", "CNY/RUB")),
+        ("xe_direct", _field_source("abcex", parser_service.get_xe_rate_usd_yuan)),  # "1 USD = X CNY"
+        ("xe_inverse", _field_source("grinex", parser_service.get_xe_rate_yuan_usd)),  # "1 CNY = X USD"
+    ],
+}
+
+
+def _get_investing_rate(currency: str) -> Optional[Quote]:
+    return getattr(investing_updater, f"cached_{currency.lower()}_rate")
+
+
+def _get_investing_screenshot(currency: str) -> str:
+    return getattr(investing_updater, f"cached_{currency.lower()}_screenshot")
+
+
+async def _fetch_source(currency: str, source: str, fetcher: SourceFetcher) -> Dict[str, Optional[Quote]]:
+    """
+    Опрашивает один источник и сохраняет результат в общий снимок курсов.
+    """
     try:
-        parser_service.update_eur_cbr_rates()
-        cbr_today = parser_service.get_cbr_today_rate("EUR")
-        cbr_tomorrow = parser_service.get_cbr_tomorrow_rate("EUR")
+        values = await fetcher()
+    except BrowserBusy as e:
+        # Браузер перегружен — отдаём последнее сохранённое значение источника
+        logger.info(f"{source} {currency} из кеша: {e}", extra={"source": source, "currency": currency})
+        entry = rates_snapshot.get(currency, source)
+        return dict(entry[1]) if entry else {}
     except Exception as e:
-        print(f"Ошибка CBR EUR: {e}")
-        cbr_today, cbr_tomorrow = None, None
-
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=None,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+        logger.warning(f"Ошибка {source} {currency}: {e}", extra={"source": source, "currency": currency})
+        return {}
+    rates_snapshot.update(currency, source, values)
+    return values
 
-    # 3. Profinance
-    profinance_rate = await parser_service.get_profinance_rate(
-        url="https://www.profinance.ru/chart/eurrub/",
-        selector="#b_30"
-    )
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
-    # 4. MOEX
-    moex_rate = await parser_service.get_moex_rate(
-        url="https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=EUR_RUB",
-        selector="#app > div:nth-child(2) > div.ui-container.-default > div > div.ui-table > div.ui-table__container > table > tbody > tr:nth-child(1) > td:nth-child(2)"
-    )
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 5. XE (две async-функции последовательно)
-    xe_euro_usd = await parser_service.get_xe_rate_euro_dollar()  # "1 EUR = X USD"
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=xe_euro_usd,
-        grinex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    xe_usd_euro = await parser_service.get_xe_rate_dollar_euro()  # "1 USD = X EUR"
-    table_text = build_currency_table(
-        title="Курсы EUR/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=xe_euro_usd,
-        grinex=xe_usd_euro
+def _render_table(currency: str, values: Dict[str, Optional[Quote]]) -> str:
+    """
+    Таблица по валюте из словаря полей; отсутствующие поля выводятся как «нет».
+    """
+    fields: Dict[str, Optional[Quote]] = dict.fromkeys(
+        ("investing", "cbr_today", "cbr_tomorrow", "profinance", "moex")
     )
-    await edit_message_if_changed(wait_msg, table_text, old_table_text)
+    fields.update(values)
+    return build_currency_table(title=CURRENCY_TITLES[currency], **fields)
 
-    set_process_state(message.from_user.id, False)
-    await message.answer("Можете дальше отправлять команды.")
 
-@router.message(Command("cny"))
-async def cmd_cny(message: Message):
+def build_snapshot_table(currency: str) -> str:
     """
-    Команда /cny — сбор данных по CNY/RUB последовательно.
+    Таблица по валюте целиком из общего снимка курсов (без сетевых запросов).
     """
-    if get_process_state(message.from_user.id):
+    return _render_table(currency, {"investing": _get_investing_rate(currency), **rates_snapshot.values(currency)})
+
+
+async def collect_currency_rates(message: Message, currency: str, rate_limited: bool = False) -> None:
+    """
+    Полный сбор данных по валюте последовательно, с обновлением таблицы после каждого источника.
+    В конце под таблицей появляются кнопки «Обновить» и переключения валюты.
+    Если пользователь превысил лимит или браузер перегружен, а в снимке уже есть курсы, —
+    сразу отвечаем таблицей из снимка, без нового сбора.
+    """
+    with trace(f"rates.{currency}", user_id=message.from_user.id):
+        if (rate_limited or parser_service.admission.saturated) and rates_snapshot.values(currency):
+            await _answer_from_snapshot(message, currency, rate_limited)
+        elif rate_limited:
+            wait = user_rate_limiter.retry_after(message.from_user.id)
+            await message.answer(f"Слишком частые запросы. {retry_after_text(wait)}")
+        else:
+            await _collect_currency_rates(message, currency)
+
+
+async def _answer_from_snapshot(message: Message, currency: str, rate_limited: bool) -> None:
+    if rate_limited:
+        wait = user_rate_limiter.retry_after(message.from_user.id)
+        note = f"Слишком частые запросы — показаны сохранённые курсы. {retry_after_text(wait)}"
+    else:
+        note = "Сервис сейчас перегружен — показаны сохранённые курсы."
+    with span("telegram.send"):
+        await message.answer(f"{build_snapshot_table(currency)}\n{note}", parse_mode="HTML",
+                             reply_markup=rates_keyboard(currency))
+
+
+async def _collect_currency_rates(message: Message, currency: str) -> None:
+    with span("lease"):
+        lease = user_leases.try_acquire(message.from_user.id)
+    if lease is None:
         await message.reply("У вас уже обрабатывается запрос.")
         return
 
-    set_process_state(message.from_user.id, True)
-    wait_msg = await message.answer("Начинаем сбор данных по CNY/RUB...")
-
-    old_table_text = ""
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=None,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 1. Investing
-    invest_rate = investing_updater.cached_cny_rate
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=None,
-        cbr_tomorrow=None,
-        profinance=None,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+    pair = CURRENCY_TITLES[currency].split()[-1]
+    with span("telegram.send"):
+        wait_msg = await message.answer(f"Начинаем сбор данных по {pair}...")
 
-    if invest_rate:
-        try:
-            file_photo = FSInputFile(investing_updater.cached_cny_screenshot)
-            await message.answer_photo(file_photo, caption="Скриншот Investing (CNY/RUB)")
-        except Exception as e:
-            print(f"Не удалось отправить скриншот (CNY): {e}")
+    try:
+        old_table_text = ""
+        # Изначальное пустое состояние
+        current: Dict[str, Optional[Quote]] = {}
+        table_text = _render_table(currency, current)
+        old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+
+        # 1. Курс с Investing (берём из нашего investing_updater)
+        invest_rate = _get_investing_rate(currency)
+        current["investing"] = invest_rate
+        table_text = _render_table(currency, current)
+        old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+
+        if invest_rate:
+            try:
+                file_photo = FSInputFile(_get_investing_screenshot(currency))
+                with span("telegram.photo"):
+                    await message.answer_photo(file_photo, caption=f"Скриншот Investing ({pair})")
+            except Exception as e:
+                logger.warning(f"Не удалось отправить скриншот ({currency}): {e}", extra={"currency": currency})
+
+        # 2. Остальные источники по очереди
+        sources = CURRENCY_SOURCES[currency]
+        for i, (source, fetcher) in enumerate(sources):
+            current.update(await _fetch_source(currency, source, fetcher))
+            table_text = _render_table(currency, current)
+            is_last = i == len(sources) - 1
+            old_table_text = await edit_message_if_changed(
+                wait_msg, table_text, old_table_text,
+                reply_markup=rates_keyboard(currency) if is_last else None
+            )
+    finally:
+        user_leases.release(message.from_user.id, lease)
+
+    await message.answer("Можете дальше отправлять команды.")
 
-    # 2. CBR
+
+async def _refresh_stale_sources(currency: str, stale: List[str], message: Message) -> None:
+    """
+    Фоновое обновление устаревших источников; по завершении перерисовываем таблицу.
+    """
+    fetchers = dict(CURRENCY_SOURCES[currency])
+    with background_jobs():
+        for source in stale:
+            await _fetch_source(currency, source, fetchers[source])
     try:
-        parser_service.update_cny_cbr_rates()
-        cbr_today = parser_service.get_cbr_today_rate("CNY")
-        cbr_tomorrow = parser_service.get_cbr_tomorrow_rate("CNY")
+        await message.edit_text(build_snapshot_table(currency), parse_mode="HTML",
+                                reply_markup=rates_keyboard(currency))
     except Exception as e:
-        print(f"Ошибка CBR CNY: {e}")
-        cbr_today, cbr_tomorrow = None, None
-
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=None,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
+        # Например, "message is not modified" или сообщение уже удалено
+        logger.info(f"Не удалось обновить таблицу ({currency}): {e}", extra={"currency": currency})
 
-    # 3. ProFinance
-    profinance_rate = await parser_service.get_profinance_rate(
-        url="https://www.profinance.ru/chart/cnyrub/",
-        selector="#b_CNY_RUB"
-    )
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
 
-    # 4. MOEX
-    moex_rate = await parser_service.get_moex_rate(
-        url="https://www.moex.com/ru/derivatives/currency-rate.aspx?currency=CNY_RUB",
-        selector="#app > div:nth-child(2) > div.ui-container.-default > div > div.ui-table > div.ui-table__container > table > tbody > tr:nth-child(1) > td:nth-child(2)"
-    )
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    # 5. XE (две async-функции) – последовательно
-    xe_usd_cny = await parser_service.get_xe_rate_usd_yuan()  # "1 USD = X CNY"
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=xe_usd_cny,
-        grinex=None
-    )
-    old_table_text = await edit_message_if_changed(wait_msg, table_text, old_table_text)
-
-    xe_cny_usd = await parser_service.get_xe_rate_yuan_usd()  # "1 CNY = X USD"
-    table_text = build_currency_table(
-        title="Курсы CNY/RUB",
-        investing=invest_rate,
-        cbr_today=cbr_today,
-        cbr_tomorrow=cbr_tomorrow,
-        profinance=profinance_rate,
-        moex=moex_rate,
-        abcex=xe_cny_usd,
-        grinex=xe_usd_cny
-    )
-    await edit_message_if_changed(wait_msg, table_text, old_table_text)
+@router.callback_query(F.data.startswith(RATES_CALLBACK_PREFIX))
+async def callback_rates(callback: CallbackQuery):
+    """
+    Кнопки «Обновить» / USD / EUR / CNY под таблицей курсов.
+    Таблица сразу перерисовывается из общего снимка, а устаревшие источники обновляются в фоне.
+    Токен лимита списывается, только когда действительно запускается сбор: перерисовка из снимка
+    бесплатна, сверх лимита — только перерисовка.
+    """
+    currency = callback.data[len(RATES_CALLBACK_PREFIX):].upper()
+    if currency not in CURRENCY_SOURCES:
+        await callback.answer()
+        return
 
-    set_process_state(message.from_user.id, False)
-    await message.answer("Можете дальше отправлять команды.")
+    try:
+        await callback.message.edit_text(build_snapshot_table(currency), parse_mode="HTML",
+                                         reply_markup=rates_keyboard(currency))
+    except Exception:
+        # Текст не изменился — это нормально
+        pass
+
+    stale = rates_snapshot.stale_sources(currency, [source for source, _ in CURRENCY_SOURCES[currency]])
+    if not stale:
+        await callback.answer("Данные актуальны.")
+    elif rates_snapshot.is_refreshing(currency):
+        await callback.answer("Обновление уже выполняется.")
+    elif not charge_rate_limit(user_rate_limiter, callback.from_user.id, 1.0, "callback_rates"):
+        wait = user_rate_limiter.retry_after(callback.from_user.id)
+        await callback.answer(f"Слишком часто — показаны сохранённые курсы. {retry_after_text(wait)}")
+    else:
+        rates_snapshot.start_refresh(currency, lambda: _refresh_stale_sources(currency, stale, callback.message))
+        await callback.answer("Обновляем: " + ", ".join(stale))
+
+
+@router.message(Command("usd"), flags={"rate_limit": 1})
+async def cmd_usd(message: Message, rate_limited: bool = False):
+    """
+    Команда /usd — собираем данные по USD/RUB последовательно,
+    чтобы не загружать все сайты разом.
+    """
+    await collect_currency_rates(message, "USD", rate_limited)
+
+
+@router.message(Command("euro"), flags={"rate_limit": 1})
+async def cmd_euro(message: Message, rate_limited: bool = False):
+    """
+    Команда /euro — сбор данных по EUR/RUB последовательно.
+    """
+    await collect_currency_rates(message, "EUR", rate_limited)
+
+
+@router.message(Command("cny"), flags={"rate_limit": 1})
+async def cmd_cny(message: Message, rate_limited: bool = False):
+    """
+    Команда /cny — сбор данных по CNY/RUB последовательно.
+    """
+    await collect_currency_rates(message, "CNY", rate_limited)
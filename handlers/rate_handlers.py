@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import re
+from typing import List, Optional, Tuple
+
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from db.requests_database import log_request
+from services.cbr_index import CbrDocument
+from services.tracing import span, trace
+from services.updater_instance import parser_service
+
+router = Router()
+
+RATE_USAGE = (
+    "Использование: /rate КОД [дата] или /rate КОД1 КОД2 ... [дата]\n"
+    "Например: /rate HKD, /rate USD EUR GBP 01.03.2024, /rate all"
+)
+ALL_CODES = ("all", "все")
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y")
+_CODE_RE = re.compile(r"^[A-Za-z]{3}$")
+
+
+def parse_rate_args(args: Optional[str]) -> Tuple[List[str], Optional[datetime.date]]:
+    """
+    "usd, eur 01.03.2024" -> (["USD", "EUR"], date(2024, 3, 1)); пустой список кодов — все валюты.
+    """
+    tokens = [token for token in re.split(r"[\s,;]+", args or "") if token]
+    if not tokens:
+        raise ValueError("Укажите код валюты.")
+
+    codes: List[str] = []
+    date: Optional[datetime.date] = None
+    for token in tokens:
+        if token.lower() in ALL_CODES:
+            codes = []
+            continue
+        if _CODE_RE.match(token):
+            if token.upper() not in codes:
+                codes.append(token.upper())
+            continue
+        for fmt in DATE_FORMATS:
+            try:
+                date = datetime.datetime.strptime(token, fmt).date()
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(f"Не понял «{token}»: ожидается код валюты (USD) или дата (01.03.2024).")
+    if not codes and not any(token.lower() in ALL_CODES for token in tokens):
+        raise ValueError("Укажите код валюты.")
+    return codes, date
+
+
+def format_rates(document: CbrDocument, codes: List[str], requested: Optional[datetime.date]) -> str:
+    """
+    Курсы выбранных валют (или всех, если codes пуст) из одного документа ЦБ.
+    """
+    date_str = document.date.strftime("%d.%m.%Y") if document.date else "?"
+    text = f"<b>Курсы ЦБ РФ на {date_str}</b>\n"
+    if requested and document.date and requested != document.date:
+        text += f"(на {requested.strftime('%d.%m.%Y')} курсов нет — показаны последние опубликованные)\n"
+
+    selected = codes or sorted(document.rates)
+    found = [document.rates[code] for code in selected if code in document.rates]
+    missing = [code for code in selected if code not in document.rates]
+
+    if len(found) == 1:
+        rate = found[0]
+        text += f"{rate.name}: {rate.nominal} {rate.code} = {rate.value} ₽"
+        if rate.nominal != 1:
+            text += f" ({rate.unit_value:.4f} ₽ за 1 {rate.code})"
+        text += "\n"
+    elif found:
+        lines = [f"{rate.code} {rate.nominal:>5} | {str(rate.value):>10}" for rate in found]
+        text += "<pre>" + "\n".join(lines) + "</pre>\n"
+    if missing:
+        text += f"Нет в данных ЦБ: {', '.join(missing)}. Доступны: {', '.join(sorted(document.rates))}\n"
+    return text
+
+
+@router.message(Command("rate", "rates"))
+async def cmd_rate(message: Message, command: CommandObject):
+    """
+    /rate КОД [дата] — курс ЦБ любой валюты; /rate КОД1 КОД2 ... [дата] или /rate all — несколько в одном ответе.
+    Все валюты за дату берутся из одного документа ЦБ: повторные запросы той же даты — без сети.
+    """
+    await log_request(str(message.from_user.id), message.text)
+    with trace("rate", user_id=message.from_user.id):
+        await _rate(message, command.args)
+
+async def _rate(message: Message, args: Optional[str]):
+    try:
+        codes, date = parse_rate_args(args)
+    except ValueError as e:
+        await message.answer(f"{e}\n{RATE_USAGE}")
+        return
+
+    document = parser_service.cbr_index.cached(date)
+    if document is None:
+        # requests синхронный — загружаем в потоке, чтобы не блокировать event loop
+        with span("cbr.document"):
+            document = await asyncio.to_thread(parser_service.cbr_index.document, date)
+    if document is None:
+        await message.answer("ЦБ не ответил, попробуйте позже.")
+        return
+    await message.answer(format_rates(document, codes, date), parse_mode="HTML")
@@ -1,18 +1,104 @@
+import asyncio
 import json
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
 from aiogram import Router
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
-from db.database import get_user_variables, update_user_variables
+from db.database import DEFAULT_VARIABLES, get_user_variables, get_user_variables_total, update_user_variables
 from keyboards.user_keyboards import buttons
 from db.requests_database import log_request
-from services.parser_service import ParserService
+from db.quotes_database import get_quote_windows
+from services.backtest import pick_window, render_backtest_png, run_backtest, summarize
+from services.deal_scenarios import (
+    MAX_TABLE_ROWS, build_grid, build_variable_profiles, deal_result, format_grid_table, render_heatmap_png, t_range
+)
+from services.quote import Quote
+from services.browser_admission import background_jobs
+from services.updater_instance import parser_service, rates_snapshot
+from services.tracing import span, trace
+from utils.config import config
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
-parser_service = ParserService()
+# Котировки для расчёта сделки (USD/RUB) — общие со снимком курсов /usd
+CALC_CURRENCY = "USD"
+
+
+async def _fetch_garantex() -> Dict[str, Optional[Quote]]:
+    # requests синхронный — выполняем в потоке, чтобы не блокировать event loop
+    return {"garantex": await asyncio.to_thread(parser_service.get_garantex_rate, "usdtrub")}
+
+
+async def _fetch_profinance() -> Dict[str, Optional[Quote]]:
+    # Другой элемент страницы, чем в таблице /usd (#b_29), — поэтому свой ключ в снимке, а не "profinance"
+    return {"profinance_calc": await parser_service.get_profinance_rate(
+        url="https://www.profinance.ru/chart/usdrub/",
+        selector="#b_29"
+    )}
+
+
+CALC_QUOTE_SOURCES = {
+    "garantex": _fetch_garantex,
+    "profinance_calc": _fetch_profinance,
+}
+CALC_QUOTE_NAMES = {"garantex": "Garantex", "profinance_calc": "ProFinance"}
+
+
+async def get_calc_quotes(max_age: float, refresh: bool = True) -> Dict[str, Tuple[Optional[Quote], Optional[float]]]:
+    """
+    Котировки Garantex и ProFinance из общего снимка курсов.
+    Отсутствующие или старше max_age секунд запрашиваются заново — параллельно
+    (refresh=False — только из снимка, например сверх лимита пользователя или при перегрузке браузера).
+    Возвращает {источник: (котировка, возраст в секундах)}; если источник не ответил,
+    остаётся прежнее значение (с его возрастом) или (None, None).
+    """
+    def is_fresh(source: str) -> bool:
+        entry = rates_snapshot.get(CALC_CURRENCY, source)
+        return entry is not None and entry[0] <= max_age and entry[1].get(source) is not None
+
+    stale = [source for source in CALC_QUOTE_SOURCES if not is_fresh(source)] if refresh else []
+    if stale:
+        with span("quotes.refresh"):
+            await asyncio.gather(
+                *(rates_snapshot.fetch_shared(CALC_CURRENCY, source, CALC_QUOTE_SOURCES[source]) for source in stale),
+                return_exceptions=True
+            )
+
+    quotes: Dict[str, Tuple[Optional[Quote], Optional[float]]] = {}
+    for source in CALC_QUOTE_SOURCES:
+        entry = rates_snapshot.get(CALC_CURRENCY, source)
+        quotes[source] = (entry[1].get(source), entry[0]) if entry else (None, None)
+    return quotes
+
+
+async def run_quote_sampler(interval: float) -> None:
+    """
+    Фоновое обновление котировок /calculate раз в interval секунд — чтобы история котировок
+    (для /backtest) копилась и без запросов пользователей. Свежие значения повторно не запрашиваются.
+    """
+    while True:
+        try:
+            with background_jobs():
+                await get_calc_quotes(max_age=interval)
+        except Exception as e:
+            logger.warning(f"[run_quote_sampler] Error: {e}")
+        await asyncio.sleep(interval)
+
+
+def _format_quote(value: float, age: float, max_age: float) -> str:
+    suffix = ", устарело" if age > max_age else ""
+    return f"{value} ({age:.0f} с назад{suffix})"
+
 
 class SolveStates(StatesGroup):
     waiting_for_variable = State()
@@ -21,8 +107,8 @@ class SolveStates(StatesGroup):
 
 @router.message(Command("view_variables"))
 async def cmd_view_vars(message: Message):
-    log_request(str(message.from_user.id), message.text)
-    user_vars = get_user_variables(message.from_user.id)
+    await log_request(str(message.from_user.id), message.text)
+    user_vars = await get_user_variables(message.from_user.id)
     if not user_vars:
         await message.answer("У вас нет сохранённых переменных.")
         return
@@ -31,7 +117,7 @@ async def cmd_view_vars(message: Message):
 
 @router.message(Command("set_variable"))
 async def cmd_set_variable(message: Message, state: FSMContext):
-    log_request(str(message.from_user.id), message.text)
+    await log_request(str(message.from_user.id), message.text)
     await state.set_state(SolveStates.waiting_for_variable)
     await message.answer("Выберите имя переменной:", reply_markup=buttons)
 
@@ -53,9 +139,9 @@ async def msg_var_value(message: Message, state: FSMContext):
         await message.answer("Некорректное число. Повторите ввод.")
         return
 
-    user_vars = get_user_variables(message.from_user.id) or {}
+    user_vars = await get_user_variables(message.from_user.id) or {}
     user_vars[var_name] = var_value
-    update_user_variables(message.from_user.id, user_vars)
+    await update_user_variables(message.from_user.id, user_vars)
 
     await message.answer(f"Переменная '{var_name}' обновлена на {var_value}.")
     await state.set_state(SolveStates.waiting_for_variable)
@@ -63,12 +149,26 @@ async def msg_var_value(message: Message, state: FSMContext):
 
 @router.message(Command("calculate"))
 async def cmd_calculate(message: Message, state: FSMContext):
-    log_request(str(message.from_user.id), message.text)
+    await log_request(str(message.from_user.id), message.text)
     await state.set_state(SolveStates.waiting_for_calc_value)
     await message.answer("Введите значение для сделки (t).")
 
-@router.message(SolveStates.waiting_for_calc_value)
-async def msg_calc_deal(message: Message, state: FSMContext):
+@router.message(SolveStates.waiting_for_calc_value, flags={"rate_limit": 1})
+async def msg_calc_deal(message: Message, state: FSMContext, rate_limited: bool = False):
+    with trace("calculate", user_id=message.from_user.id):
+        await _calc_deal(message, state, rate_limited)
+
+def _cached_quotes_note(rate_limited: bool) -> str:
+    """
+    Пояснение к ответу, если котировки не обновлялись: пусто — обновлялись как обычно.
+    """
+    if rate_limited:
+        return "\nСлишком частые запросы — котировки взяты из кеша."
+    if parser_service.admission.saturated:
+        return "\nСервис перегружен — котировки взяты из кеша."
+    return ""
+
+async def _calc_deal(message: Message, state: FSMContext, rate_limited: bool = False):
     try:
         t = float(message.text.replace(",", "."))
     except ValueError:
@@ -79,36 +179,36 @@ async def msg_calc_deal(message: Message, state: FSMContext):
     wait_msg = await message.answer("Выполняем расчёт...")
 
     try:
-        # Получаем данные и преобразуем их в числа
-        garantex = float(parser_service.get_garantex_rate("usdtrub"))
-        profinance = float(await parser_service.get_profinance_rate(
-            url="https://www.profinance.ru/chart/usdrub/",
-            selector="#b_29"
-        ))
+        # Котировки из общего снимка (устаревшие запрашиваются параллельно) и преобразование в числа
+        max_age = config.CALC_MAX_QUOTE_AGE
+        cached_note = _cached_quotes_note(rate_limited)
+        quotes = await get_calc_quotes(max_age, refresh=not cached_note)
+        (garantex_quote, garantex_age), (profinance_quote, profinance_age) = quotes["garantex"], quotes["profinance_calc"]
+        if garantex_quote is None or profinance_quote is None:
+            missing = [CALC_QUOTE_NAMES[source] for source, (value, _) in quotes.items() if value is None]
+            await wait_msg.edit_text(f"Не удалось получить котировки: {', '.join(missing)}. Попробуйте позже.")
+            return
 
-        if not isinstance(garantex, (int, float)):
-            garantex = float(garantex)
-
-        if not isinstance(profinance, (int, float)):
-            profinance = float(profinance)
+        garantex = float(garantex_quote)
+        profinance = float(profinance_quote)
 
         # Выполняем расчёты
         y = profinance + (profinance / 100 * t)
 
-        user_vars = get_user_variables(message.from_user.id) or {}
-        total_vars = sum(user_vars.values())
+        total_vars = await get_user_variables_total(message.from_user.id)
 
-        result = (((garantex - 0.1) - y) * (100 / profinance)) - total_vars
-        result = round(result, 4)
+        result = round(deal_result(garantex, profinance, t, total_vars), 4)
 
         # Формируем результат
         text = (
             f"Сумма переменных: {total_vars.__round__(3)}\n"
-            f"Garantex: {garantex}\n"
-            f"Profinance: {profinance}\n"
+            f"Garantex: {_format_quote(garantex, garantex_age, max_age)}\n"
+            f"Profinance: {_format_quote(profinance, profinance_age, max_age)}\n"
             f"t: {t}\n"
             f"y: {y}\n"
-            f"Сделка: {result}%"
+            f"Сделка: {result}%\n"
+            f"Допустимый возраст котировок: {max_age:.0f} с"
+            f"{cached_note}"
         )
         await wait_msg.edit_text(text)
 
@@ -116,3 +216,148 @@ async def msg_calc_deal(message: Message, state: FSMContext):
         await wait_msg.edit_text(f"Ошибка при преобразовании данных: {e}")
     except Exception as e:
         await wait_msg.edit_text(f"Ошибка при расчёте: {e}")
+
+SCENARIO_DEFAULT_T = (0.0, 5.0, 0.5)
+SCENARIO_USAGE = (
+    "Использование: /scenario [t_от t_до шаг] [table|heatmap]\n"
+    "Например: /scenario 0 3 0.25 или /scenario -2 10 0.01 heatmap\n"
+    "Столбцы: current — ваши переменные, default — по умолчанию, none — без переменных, "
+    "-имя — ваши переменные без указанной."
+)
+
+
+def _parse_scenario_args(args: str) -> tuple:
+    numbers, mode = [], None
+    for arg in args.split():
+        if arg.lower() in ("table", "heatmap"):
+            mode = arg.lower()
+        else:
+            number = float(arg.replace(",", "."))
+            if not math.isfinite(number):
+                raise ValueError(f"«{arg}» — не конечное число")
+            numbers.append(number)
+    if len(numbers) not in (0, 3):
+        raise ValueError("нужно три числа: начало, конец и шаг t")
+    return (tuple(numbers) if numbers else SCENARIO_DEFAULT_T), mode
+
+
+@router.message(Command("scenario"), flags={"rate_limit": 1})
+async def cmd_scenario(message: Message, command: CommandObject, rate_limited: bool = False):
+    """
+    Команда /scenario — результат сделки для диапазона t и нескольких профилей переменных сразу.
+    """
+    await log_request(str(message.from_user.id), message.text)
+    with trace("scenario", user_id=message.from_user.id):
+        await _scenario(message, command.args or "", rate_limited)
+
+async def _scenario(message: Message, args: str, rate_limited: bool = False):
+    try:
+        (t_from, t_to, step), mode = _parse_scenario_args(args)
+        t_values = t_range(t_from, t_to, step)
+    except (ValueError, OverflowError) as e:
+        await message.answer(f"Некорректные параметры: {e}\n{SCENARIO_USAGE}")
+        return
+
+    max_age = config.CALC_MAX_QUOTE_AGE
+    cached_note = _cached_quotes_note(rate_limited)
+    quotes = await get_calc_quotes(max_age, refresh=not cached_note)
+    (garantex_quote, garantex_age), (profinance_quote, profinance_age) = quotes["garantex"], quotes["profinance_calc"]
+    if garantex_quote is None or profinance_quote is None:
+        missing = [CALC_QUOTE_NAMES[source] for source, (value, _) in quotes.items() if value is None]
+        await message.answer(f"Не удалось получить котировки: {', '.join(missing)}. Попробуйте позже.")
+        return
+    garantex = float(garantex_quote)
+    profinance = float(profinance_quote)
+
+    user_vars = await get_user_variables(message.from_user.id) or {}
+    profiles = build_variable_profiles(user_vars, DEFAULT_VARIABLES)
+    with span("scenario.grid"):
+        grid = build_grid(garantex, profinance, t_values, profiles)
+
+    caption = (
+        f"Сделка, % — {len(t_values)}×{len(profiles)} сценариев\n"
+        f"Garantex: {_format_quote(garantex, garantex_age, max_age)}\n"
+        f"Profinance: {_format_quote(profinance, profinance_age, max_age)}"
+        f"{cached_note}"
+    )
+    if mode is None:
+        mode = "table" if len(t_values) <= MAX_TABLE_ROWS else "heatmap"
+
+    if mode == "table" and len(t_values) <= MAX_TABLE_ROWS:
+        await message.answer(f"{caption}\n<pre>{format_grid_table(grid)}</pre>", parse_mode="HTML")
+        return
+
+    title = f"garantex {garantex}  profinance {profinance}  t {t_from:g}..{t_to:g} step {step:g}"
+    with span("scenario.heatmap"):
+        png = await asyncio.to_thread(render_heatmap_png, grid, title)
+    await message.answer_photo(BufferedInputFile(png, filename="scenarios.png"), caption=caption)
+
+
+BACKTEST_USAGE = (
+    "Использование: /backtest [дней] [t] [окно_мин]\n"
+    "Например: /backtest 30 1.5 — результат сделки за 30 дней при t=1.5 на ваших переменных."
+)
+BACKTEST_MAX_DAYS = 366
+
+
+@router.message(Command("backtest"))
+async def cmd_backtest(message: Message, command: CommandObject):
+    """
+    Команда /backtest — как менялся бы результат /calculate по сохранённой истории котировок.
+    """
+    await log_request(str(message.from_user.id), message.text)
+    with trace("backtest", user_id=message.from_user.id):
+        await _backtest(message, command.args or "")
+
+async def _backtest(message: Message, args: str):
+    try:
+        numbers = [float(arg.replace(",", ".")) for arg in args.split()]
+        if len(numbers) > 3:
+            raise ValueError("слишком много параметров")
+        if not all(math.isfinite(number) for number in numbers):
+            raise ValueError("параметры должны быть конечными числами")
+        days = numbers[0] if numbers else 7.0
+        t = numbers[1] if len(numbers) > 1 else 0.0
+        if not 0 < days <= BACKTEST_MAX_DAYS:
+            raise ValueError(f"период от 0 до {BACKTEST_MAX_DAYS} дней")
+        window = int(numbers[2] * 60) if len(numbers) > 2 else pick_window(days * 86400)
+        if window < 60:
+            raise ValueError("окно не меньше минуты")
+        if window > days * 86400:
+            raise ValueError("окно не больше периода")
+    except ValueError as e:
+        await message.answer(f"Некорректные параметры: {e}\n{BACKTEST_USAGE}")
+        return
+
+    until = time.time()
+    since = until - days * 86400
+    with span("backtest.load"):
+        garantex_windows, profinance_windows = await asyncio.gather(
+            get_quote_windows(CALC_CURRENCY, "garantex", since, until, window),
+            get_quote_windows(CALC_CURRENCY, "profinance_calc", since, until, window),
+        )
+    total_vars = await get_user_variables_total(message.from_user.id)
+    with span("backtest.run"):
+        series = run_backtest(garantex_windows, profinance_windows, window, t, total_vars)
+        stats = summarize(series)
+
+    if not stats["windows"]:
+        await message.answer(f"Нет сохранённых котировок Garantex и ProFinance за {days:g} дн.")
+        return
+
+    def when(ts: float) -> str:
+        return datetime.fromtimestamp(ts).strftime("%d.%m %H:%M")
+
+    caption = (
+        f"Сделка за {days:g} дн. (t={t:g}, переменные {total_vars:.3f}, окно {window // 60} мин)\n"
+        f"Окон: {stats['windows']} ({when(stats['from'])} — {when(stats['to'])})\n"
+        f"Последнее: {stats['last']:.4f}%\n"
+        f"Среднее: {stats['mean']:.4f}%, медиана: {stats['median']:.4f}%, σ: {stats['stdev']:.4f}\n"
+        f"Минимум: {stats['min'][0]:.4f}% ({when(stats['min'][1])})\n"
+        f"Максимум: {stats['max'][0]:.4f}% ({when(stats['max'][1])})\n"
+        f"Доля окон с плюсом: {stats['positive_share']:.0%}"
+    )
+    title = f"deal %  t={t:g}  vars={total_vars:.3f}  window={window // 60} min"
+    with span("backtest.chart"):
+        png = await asyncio.to_thread(render_backtest_png, series, title)
+    await message.answer_photo(BufferedInputFile(png, filename="backtest.png"), caption=caption)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from db.requests_database import log_request
+from services.spread_monitor import FIELD_LABELS, SpreadAlert, SpreadHook, format_spread_alert
+from services.updater_instance import spread_monitor
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+# Чаты, подписанные на уведомления о спредах выше порога (до перезапуска бота)
+alert_subscribers: set[int] = set()
+
+SHORT_LABELS = {
+    "investing": "INV",
+    "cbr_today": "CBR",
+    "profinance": "PF",
+    "moex": "MOEX",
+    "abcex": "ABCX",
+    "grinex": "GRNX",
+    "garantex": "GRTX",
+}
+SPREAD_CURRENCIES = ("USD", "EUR", "CNY")
+RATES_COMMANDS = {"USD": "/usd", "EUR": "/euro", "CNY": "/cny"}
+
+def build_spreads_text(currency: str) -> str:
+    """
+    Матрица спредов (строка к столбцу, %) + актуальные котировки + наибольшие спреды.
+    """
+    quotes = spread_monitor.fresh_quotes(currency)
+    if len(quotes) < 2:
+        return f"По {currency} пока меньше двух свежих котировок — сначала запросите {RATES_COMMANDS[currency]}."
+
+    fields, matrix = spread_monitor.matrix(currency)
+    header = "      " + "".join(f"{SHORT_LABELS.get(f, f[:4]):>7}" for f in fields)
+    lines = [header]
+    for field, row in zip(fields, matrix):
+        cells = "".join(f"{'—':>7}" if value is None else f"{value:>+7.2f}" for value in row)
+        lines.append(f"{SHORT_LABELS.get(field, field[:4]):<6}{cells}")
+
+    quote_lines = [
+        f"{FIELD_LABELS.get(field, field)}: {value:g} ({age:.0f} с назад)"
+        for field, (value, age) in quotes.items()
+    ]
+    top = [format_spread_alert(alert) for alert in spread_monitor.top_spreads(currency, 3)]
+    return (
+        f"<b>Спреды {currency}/RUB</b> (строка к столбцу, %)\n"
+        f"<pre>" + "\n".join(lines) + "</pre>\n"
+        + "\n".join(quote_lines)
+        + "\n\nНаибольшие:\n" + "\n".join(top)
+    )
+
+@router.message(Command("spreads"))
+async def cmd_spreads(message: Message, command: CommandObject):
+    """
+    /spreads [usd|eur|cny] — живая матрица спредов между источниками.
+    /spreads alerts — включить/выключить уведомления о спредах выше порога.
+    """
+    await log_request(str(message.from_user.id), message.text)
+    arg = (command.args or "usd").strip().lower()
+
+    if arg == "alerts":
+        chat_id = message.chat.id
+        if chat_id in alert_subscribers:
+            alert_subscribers.discard(chat_id)
+            await message.answer("Уведомления о спредах выключены.")
+        else:
+            alert_subscribers.add(chat_id)
+            await message.answer("Уведомления о спредах включены.")
+        return
+
+    currency = {"euro": "EUR"}.get(arg, arg.upper())
+    if currency not in SPREAD_CURRENCIES:
+        await message.answer("Использование: /spreads [usd|eur|cny] или /spreads alerts")
+        return
+    await message.answer(build_spreads_text(currency), parse_mode="HTML")
+
+async def _notify_subscribers(bot: Bot, alert: SpreadAlert) -> None:
+    text = "⚠️ Спред выше порога\n" + format_spread_alert(alert)
+    for chat_id in list(alert_subscribers):
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as e:
+            logger.warning(f"Не удалось отправить уведомление о спреде ({chat_id}): {e}", extra={"user_id": chat_id})
+
+def make_spread_alert_hook(bot: Bot) -> SpreadHook:
+    """
+    Хук порога для SpreadMonitor: пишет в лог и рассылает уведомление подписчикам /spreads alerts.
+    """
+    def hook(alert: SpreadAlert) -> None:
+        logger.warning(format_spread_alert(alert))
+        if alert_subscribers:
+            asyncio.get_running_loop().create_task(_notify_subscribers(bot, alert))
+    return hook
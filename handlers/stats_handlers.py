@@ -1,27 +1,50 @@
+import asyncio
+import datetime
+import html
+import logging
+import os
+
 from aiogram import Router
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
-from db.requests_database import log_request, get_requests_count_today, get_total_requests_count, get_unique_users_count
-from services.requests_service import generate_stats_table_today, generate_full_stats_pdf
+from db.requests_database import (
+    log_request,
+    get_requests_count_today,
+    get_total_requests_count,
+    get_unique_users_count,
+    get_unique_users_count_today,
+    get_command_counts_today
+)
+from services.requests_service import STATS_TODAY_ROWS, generate_stats_table_today, generate_full_stats_pdf
+from services.export_service import EXPORT_FORMATS, EXPORT_TABLES, export_to_temp_file
+from services.tracing import tracer, format_trace
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
 STATS_PASSWORD = "Incube116"
 ALLOWED_USERS = [123456789, 987654321]  # подставьте нужные ID
 
+# Пользователи, которые ввели пароль (до перезапуска бота)
+authorized_users: set[int] = set()
+
 class StatsStates(StatesGroup):
     waiting_for_password = State()
 
+def is_stats_admin(user_id: int) -> bool:
+    return user_id in ALLOWED_USERS or user_id in authorized_users
+
 @router.message(Command("stats"))
 async def cmd_stats(message: Message, state: FSMContext):
     """
     Если пользователь в списке ALLOWED_USERS — сразу показываем статистику.
     Иначе — просим пароль.
     """
-    log_request(str(message.from_user.id), message.text)
+    await log_request(str(message.from_user.id), message.text)
 
     if message.from_user.id in ALLOWED_USERS:
         await message.answer("Вы имеете доступ к статистике. Наберите /stats_menu для выбора.")
@@ -35,7 +58,10 @@ async def msg_stats_password(message: Message, state: FSMContext):
         menu_text = (
         "/stats_counts — показать число запросов сегодня/всего и кол-во уникальных пользователей\n"
         "/stats_pdf — скачать PDF со всей статистикой\n"
+        "/export [requests|quotes] [csv|jsonl] [с YYYY-MM-DD] [по YYYY-MM-DD] — выгрузка лога запросов или истории котировок в .gz\n"
+        "/traces [N] — разбивка по этапам N последних медленных запросов\n"
         )
+        authorized_users.add(message.from_user.id)
         await message.answer(menu_text)
         await state.clear()
     else:
@@ -44,22 +70,112 @@ async def msg_stats_password(message: Message, state: FSMContext):
 
 @router.message(Command("stats_today"))
 async def cmd_stats_today(message: Message):
-    table_str = generate_stats_table_today()
-    await message.answer(f"Запросы за сегодня:\n<pre>{table_str}</pre>", parse_mode="HTML")
+    total, table_str = await generate_stats_table_today()
+    shown = f" (последние {STATS_TODAY_ROWS})" if total > STATS_TODAY_ROWS else ""
+    await message.answer(f"Запросы за сегодня: {total}{shown}\n<pre>{html.escape(table_str)}</pre>", parse_mode="HTML")
 
 @router.message(Command("stats_counts"))
 async def cmd_stats_counts(message: Message):
-    today_count = get_requests_count_today()
-    total_count = get_total_requests_count()
-    unique_users = get_unique_users_count()
+    today_count = await get_requests_count_today()
+    total_count = await get_total_requests_count()
+    unique_users = await get_unique_users_count()
+    unique_users_today = await get_unique_users_count_today()
+    command_counts = await get_command_counts_today()
     text = (
         f"Запросов за сегодня: {today_count}\n"
         f"Запросов всего: {total_count}\n"
         f"Уникальных пользователей: {unique_users}\n"
+        f"Уникальных пользователей сегодня: {unique_users_today}\n"
     )
+    if command_counts:
+        text += "\nКоманды за сегодня:\n" + "\n".join(
+            f"/{command}: {count}" if command else f"(текст): {count}"
+            for command, count in command_counts
+        )
     await message.answer(text)
 
 @router.message(Command("stats_pdf"))
 async def cmd_stats_pdf(message: Message):
-    pdf_file = generate_full_stats_pdf()
+    pdf_file = await generate_full_stats_pdf()
     await message.answer_document(pdf_file, caption="Полная статистика (PDF)")
+
+def _parse_export_args(args: str) -> tuple:
+    """
+    Аргументы /export в любом порядке: имя таблицы, формат и до двух дат (с, по).
+    """
+    table, fmt, dates = "requests", "csv", []
+    for arg in args.split():
+        arg = arg.lower()
+        if arg in EXPORT_TABLES:
+            table = arg
+        elif arg in EXPORT_FORMATS:
+            fmt = arg
+        else:
+            dates.append(datetime.date.fromisoformat(arg).isoformat())
+    if len(dates) > 2:
+        raise ValueError("Слишком много дат")
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+    return table, fmt, date_from, date_to
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    if not is_stats_admin(message.from_user.id):
+        await message.answer("Нет доступа. Сначала введите пароль через /stats.")
+        return
+
+    try:
+        table, fmt, date_from, date_to = _parse_export_args(command.args or "")
+    except ValueError:
+        await message.answer(
+            "Формат: /export [requests|quotes] [csv|jsonl] [с YYYY-MM-DD] [по YYYY-MM-DD]"
+        )
+        return
+
+    wait_msg = await message.answer("Готовим выгрузку...")
+    path = None
+    try:
+        # Пишем во временный файл в отдельном потоке — память и event loop не страдают
+        path, count = await asyncio.to_thread(export_to_temp_file, table, fmt, date_from, date_to)
+        period = f"{date_from or '…'} — {date_to or '…'}"
+        await message.answer_document(
+            FSInputFile(path, filename=f"{table}.{fmt}.gz"),
+            caption=f"{table}: {count} строк ({period})"
+        )
+        await wait_msg.delete()
+    except Exception as e:
+        # База недоступна, диск заполнен, Telegram не принял файл — не оставляем «Готовим выгрузку...» висеть
+        logger.error(f"[cmd_export] Не удалось выгрузить {table}: {e}")
+        await wait_msg.edit_text(f"Не удалось выгрузить {table}: {html.escape(str(e))}")
+    finally:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+@router.message(Command("traces"))
+async def cmd_traces(message: Message, command: CommandObject):
+    if not is_stats_admin(message.from_user.id):
+        await message.answer("Нет доступа. Сначала введите пароль через /stats.")
+        return
+
+    try:
+        count = int(command.args) if command.args else 3
+    except ValueError:
+        await message.answer("Формат: /traces [N]")
+        return
+
+    traces = tracer.last_slow(max(1, min(count, 20)))
+    if not traces:
+        await message.answer(
+            f"Медленных запросов (≥ {tracer.slow_threshold:g} с) пока нет. "
+            f"Доля трассируемых: {tracer.sample_rate:g}."
+        )
+        return
+
+    # Ограничение Telegram — 4096 символов на сообщение
+    text = ""
+    for trace_obj in traces:
+        block = f"<pre>{html.escape(format_trace(trace_obj))}</pre>\n"
+        if len(text) + len(block) > 4000:
+            break
+        text += block
+    await message.answer(text, parse_mode="HTML")
@@ -0,0 +1,21 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+RATES_CALLBACK_PREFIX = "rates:"
+
+
+def rates_keyboard(currency: str) -> InlineKeyboardMarkup:
+    """
+    Кнопки под итоговой таблицей курсов: обновить текущую валюту или переключиться на другую.
+    """
+    currency = currency.upper()
+    switch_buttons = [
+        InlineKeyboardButton(text=code, callback_data=f"{RATES_CALLBACK_PREFIX}{code}")
+        for code in ("USD", "EUR", "CNY")
+        if code != currency
+    ]
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"{RATES_CALLBACK_PREFIX}{currency}")],
+            switch_buttons,
+        ]
+    )
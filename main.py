@@ -1,59 +1,149 @@
 # main.py
+import time
+STARTED_AT = time.perf_counter()
+
 import asyncio
-from services.parser_service import ParserService
+import resource
+from typing import Tuple
 from aiogram import Bot, Dispatcher
 from aiogram.client.bot import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from utils.config import config
 from utils.logging_config import setup_logging
 from logs.log_info import log_start
-from db.database import init_db, reset_all_process_states
-from db.requests_database import init_requests_db
+from db.database import init_db, users_db
+from db.requests_database import init_requests_db, requests_db, request_logger
+from db.quotes_database import init_quotes_db, quotes_db, quote_recorder
 from handlers.user_handlers import router as user_router
 from handlers.currency_handlers import router as currency_router
-from handlers.solve_handlers import router as solve_router
+from handlers.solve_handlers import router as solve_router, run_quote_sampler
 from handlers.stats_handlers import router as stats_router
+from handlers.spread_handlers import router as spread_router, make_spread_alert_hook
+from handlers.rate_handlers import router as rate_router
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.rate_limit import RateLimitMiddleware
+from services.metrics import (
+    ASSET_CACHE_BYTES, BROWSER_JOBS_ACTIVE, BROWSER_JOBS_WAITING, UPDATES_IN_FLIGHT, UPDATES_WAITING, start_metrics_server
+)
+from services.quote_board import QuoteBoardWriter
+from services.webhook_server import run_webhook
 
 # Вместо from main import investing_updater -> импортируем из updater_instance
-from services.updater_instance import investing_updater
+from services.updater_instance import (
+    investing_updater, parser_service, rates_snapshot, spread_monitor, user_rate_limiter
+)
 
+IMPORTS_DONE_AT = time.perf_counter()
 logger = setup_logging()
 
+def build_dispatcher(workers: int = config.UPDATE_WORKERS) -> Tuple[Dispatcher, ConcurrencyLimitMiddleware]:
+    """
+    Dispatcher со всеми middleware и роутерами бота (используется также нагрузочным тестом tools/load_test.py).
+    """
+    dp = Dispatcher()
+
+    # Метрики (первыми — чтобы учитывать и ожидание воркера)
+    dp.update.outer_middleware(MetricsMiddleware())
+
+    # Ограничиваем число одновременно обрабатываемых апдейтов
+    concurrency_limiter = ConcurrencyLimitMiddleware(workers)
+    dp.update.outer_middleware(concurrency_limiter)
+    UPDATES_IN_FLIGHT.set_function(lambda: concurrency_limiter.in_flight)
+    UPDATES_WAITING.set_function(lambda: concurrency_limiter.waiting)
+
+    # Лимит дорогих команд на пользователя (обработчики с флагом rate_limit)
+    rate_limit = RateLimitMiddleware(user_rate_limiter)
+    dp.message.middleware(rate_limit)
+    dp.callback_query.middleware(rate_limit)
+    BROWSER_JOBS_ACTIVE.set_function(lambda: parser_service.admission.active)
+    BROWSER_JOBS_WAITING.set_function(lambda: parser_service.admission.waiting)
+    ASSET_CACHE_BYTES.set_function(lambda: parser_service.asset_cache.total_bytes)
+
+    # Регистрируем все роутеры
+    dp.include_router(user_router)
+    dp.include_router(currency_router)
+    dp.include_router(solve_router)
+    dp.include_router(stats_router)
+    dp.include_router(spread_router)
+    dp.include_router(rate_router)
+    return dp, concurrency_limiter
+
 async def main():
     logger.info("Инициализация БД...")
     init_db()
-    reset_all_process_states()
     init_requests_db()
+    init_quotes_db()
+
+    # Буферизованная запись лога запросов
+    request_logger.start()
+
+    # История котировок: всё, что попадает в общий снимок курсов
+    quote_recorder.start()
+    rates_snapshot.add_listener(quote_recorder.on_quote)
 
-    parser_service = ParserService()
+    # Последние котировки для других локальных процессов (python -m tools.quotes)
+    quote_board = None
+    if config.QUOTE_BOARD_PATH:
+        quote_board = QuoteBoardWriter(config.QUOTE_BOARD_PATH, slots=config.QUOTE_BOARD_SLOTS)
+        rates_snapshot.add_listener(quote_board.on_quote)
 
     if config.DEBUG_MODE:
         await log_start()
 
-    bot = Bot(token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-    dp = Dispatcher()
+    # TELEGRAM_API_URL позволяет подключиться к локальному фейковому Bot API (tools/fake_bot_api.py)
+    session = None
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
 
-    # Регистрируем все роутеры
-    dp.include_router(user_router)
-    dp.include_router(currency_router)
-    dp.include_router(solve_router)
-    dp.include_router(stats_router)
+    bot = Bot(token=config.BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    dp, concurrency_limiter = build_dispatcher()
+
+    if config.SPREAD_ALERT_PCT > 0:
+        spread_monitor.add_hook(config.SPREAD_ALERT_PCT, make_spread_alert_hook(bot))
+
+    metrics_runner = None
+    if config.METRICS_PORT:
+        metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
 
     # Запускаем фоновую задачу
     logger.info("Запуск обновления Investing...")
     asyncio.create_task(investing_updater.start_updating(interval_seconds=30))
+    if config.QUOTES_SAMPLE_INTERVAL > 0:
+        asyncio.create_task(run_quote_sampler(config.QUOTES_SAMPLE_INTERVAL))
 
-    # Очищаем старый webhook, если был
-    await bot.delete_webhook(drop_pending_updates=True)
+    logger.info(
+        f"Готов к работе за {time.perf_counter() - STARTED_AT:.2f} с "
+        f"(импорт модулей {IMPORTS_DONE_AT - STARTED_AT:.2f} с), "
+        f"пик RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ"
+    )
 
     try:
-        logger.info("Бот запущен. Стартуем long polling...")
-        await dp.start_polling(bot)
+        if config.BOT_MODE == "webhook":
+            logger.info("Бот запущен. Стартуем webhook-сервер...")
+            await run_webhook(bot, dp, concurrency_limiter)
+        else:
+            # Очищаем старый webhook, если был
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Бот запущен. Стартуем long polling...")
+            await dp.start_polling(bot)
     except Exception as ex:
         logger.error(f"Ошибка при работе бота: {ex}", exc_info=True)
     finally:
         logger.info("Остановка бота. Закрываем сессию...")
         await bot.session.close()
         await investing_updater.stop()
+        await parser_service.close_browser()
+        await request_logger.stop()
+        await quote_recorder.stop()
+        if quote_board is not None:
+            quote_board.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        users_db.close()
+        requests_db.close()
+        quotes_db.close()
 
 if __name__ == "__main__":
     try:
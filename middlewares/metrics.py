@@ -0,0 +1,31 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import UPDATE_DURATION, UPDATES_TOTAL
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки апдейта целиком и число апдейтов по типу/результату.
+    Регистрируется первым, чтобы учитывать и ожидание свободного воркера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "success"
+            return result
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, event=event_type)
+            UPDATES_TOTAL.inc(event=event_type, outcome=outcome)
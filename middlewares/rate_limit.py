@@ -0,0 +1,46 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+
+from services.metrics import RATE_LIMITED_TOTAL
+from services.rate_limit import UserRateLimiter
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """
+    Лимит дорогих команд на пользователя. Внутренний middleware: срабатывает только для
+    обработчиков с флагом rate_limit (стоимость в токенах), например
+    @router.message(Command("usd"), flags={"rate_limit": 1}).
+    Сверх лимита обработчик всё равно вызывается, но с rate_limited=True — и отвечает из кеша
+    вместо нового сбора курсов. Обработчики, которые не всегда запускают сбор (кнопки под таблицей),
+    флаг не ставят и списывают токен сами через charge_rate_limit.
+    """
+
+    def __init__(self, limiter: UserRateLimiter) -> None:
+        self.limiter = limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        cost = get_flag(data, "rate_limit")
+        user = data.get("event_from_user")
+        if cost and user is not None:
+            handler_object = data.get("handler")
+            command = handler_object.callback.__name__ if handler_object else "-"
+            data["rate_limited"] = not charge_rate_limit(self.limiter, user.id, float(cost), command)
+        return await handler(event, data)
+
+
+def charge_rate_limit(limiter: UserRateLimiter, user_id: int, cost: float, command: str) -> bool:
+    """
+    Списывает cost токенов пользователя; False — лимит превышен (учитывается в метрике).
+    """
+    allowed = limiter.try_acquire(user_id, cost)
+    if not allowed:
+        RATE_LIMITED_TOTAL.inc(command=command)
+    return allowed
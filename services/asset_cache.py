@@ -0,0 +1,315 @@
+import asyncio
+import collections
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Route
+
+from db.connection import SQLiteDatabase
+from services.metrics import ASSET_CACHE_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Что считаем статикой (по расширению пути): перехватываются только такие запросы
+STATIC_EXTENSIONS = (".js", ".mjs", ".css", ".woff", ".woff2", ".ttf", ".otf", ".png", ".svg", ".gif", ".jpg",
+                     ".jpeg", ".webp", ".ico")
+
+# Заголовки, которые не сохраняем: тело хранится уже распакованным, длину Playwright посчитает сам
+_SKIP_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "set-cookie", "date", "age"}
+
+# Помечает ответы из кеша, чтобы track_page_bytes не считал их сетевым трафиком
+CACHE_HIT_HEADER = "x-asset-cache"
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*(\d+)")
+
+
+def is_static_url(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(STATIC_EXTENSIONS)
+
+
+def fresh_until(headers: Dict[str, str], now: float, default_ttl: float) -> Optional[float]:
+    """
+    До какого момента ответ можно отдавать без проверки: Cache-Control max-age, затем Expires,
+    иначе default_ttl. None — ответ хранить нельзя (no-store / private).
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return now
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return now + int(match.group(1))
+    expires = headers.get("expires")
+    if expires:
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return now
+    return now + default_ttl
+
+
+class AssetEntry:
+    __slots__ = ("url", "digest", "size", "headers", "etag", "last_modified", "expires")
+
+    def __init__(self, url: str, digest: str, size: int, headers: Dict[str, str],
+                 etag: Optional[str], last_modified: Optional[str], expires: float) -> None:
+        self.url = url
+        self.digest = digest
+        self.size = size
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def row(self, accessed: float) -> Tuple:
+        return (self.url, self.digest, self.size, json.dumps(self.headers), self.etag, self.last_modified,
+                self.expires, accessed)
+
+
+def _init_index(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS assets (
+            url TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            headers TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+    """)
+
+
+def _load_index(conn: sqlite3.Connection) -> List[Tuple]:
+    _init_index(conn)
+    return conn.execute(
+        "SELECT url, digest, size, headers, etag, last_modified, expires FROM assets ORDER BY accessed"
+    ).fetchall()
+
+
+def _upsert(conn: sqlite3.Connection, row: Tuple) -> None:
+    conn.execute("INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+
+def _delete(conn: sqlite3.Connection, urls: List[str]) -> None:
+    conn.executemany("DELETE FROM assets WHERE url = ?", [(url,) for url in urls])
+
+
+class AssetCache:
+    """
+    Локальный кеш статики сайтов (JS, CSS, шрифты, картинки) для контекстов Playwright.
+      - тела лежат в directory/blobs по SHA-256 содержимого: одинаковый бандл под разными URL хранится один раз;
+      - индекс URL -> (хеш, заголовки, ETag/Last-Modified, срок свежести) — в SQLite (directory/index.db)
+        и в памяти в порядке последнего обращения;
+      - свежий ответ отдаётся без сети, устаревший проверяется условным запросом (If-None-Match /
+        If-Modified-Since): на 304 отдаём сохранённое тело;
+      - суммарный размер тел не больше max_bytes: вытесняются давно не запрашивавшиеся URL.
+    Порядок обращений в индексе обновляется только при записи — после перезапуска он приблизительный.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, default_ttl: float = 3600) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.db: Optional[SQLiteDatabase] = None
+        self._entries: "collections.OrderedDict[str, AssetEntry]" = collections.OrderedDict()
+        # хеш -> (размер, сколько URL на него ссылаются)
+        self._blobs: Dict[str, List[int]] = {}
+        self.total_bytes = 0
+        self._loaded: Optional[asyncio.Future] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load_or_disable())
+        await asyncio.shield(self._loaded)
+
+    async def _load_or_disable(self) -> None:
+        """
+        Кеш не должен ломать парсинг: если каталог недоступен или индекс повреждён,
+        один раз пишем в лог и работаем без кеша.
+        """
+        try:
+            await self._load()
+        except Exception as e:
+            logger.error(f"Кеш статики выключен: не удалось открыть {self.directory}: {e}")
+            self.max_bytes = 0
+            self.close()
+            self.db = None
+            self._entries.clear()
+            self._blobs.clear()
+            self.total_bytes = 0
+
+    async def _load(self) -> None:
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        self.db = SQLiteDatabase(os.path.join(self.directory, "index.db"), readers=1)
+        rows = await self.db.write(_load_index)
+        missing = []
+        for url, digest, size, headers, etag, last_modified, expires in rows:
+            if not os.path.exists(self._blob_path(digest)):
+                missing.append(url)
+                continue
+            self._add(AssetEntry(url, digest, size, json.loads(headers), etag, last_modified, expires))
+        if missing:
+            await self.db.write(_delete, missing)
+        logger.info(f"Кеш статики: {len(self._entries)} URL, {self.total_bytes / 1e6:.1f} МБ")
+
+    async def attach(self, context: BrowserContext) -> None:
+        """
+        Подключает кеш к контексту: запросы статики идут через _handle.
+        """
+        if not self.enabled:
+            return
+        await self._ensure_loaded()
+        if self.enabled:
+            await context.route(is_static_url, self._handle)
+
+    # ------------------------------------------------------
+    # Индекс в памяти
+    # ------------------------------------------------------
+    def _add(self, entry: AssetEntry) -> None:
+        blob = self._blobs.get(entry.digest)
+        if blob is None:
+            self._blobs[entry.digest] = [entry.size, 1]
+            self.total_bytes += entry.size
+        else:
+            blob[1] += 1
+        self._entries[entry.url] = entry
+
+    def _remove(self, url: str) -> Optional[str]:
+        """
+        Убирает URL из индекса; возвращает хеш, если на тело больше никто не ссылается.
+        """
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return None
+        blob = self._blobs[entry.digest]
+        blob[1] -= 1
+        if blob[1] > 0:
+            return None
+        del self._blobs[entry.digest]
+        self.total_bytes -= blob[0]
+        return entry.digest
+
+    async def _store(self, entry: AssetEntry, body: bytes) -> None:
+        if entry.digest not in self._blobs:
+            await asyncio.to_thread(self._write_blob, entry.digest, body)
+        orphan = self._remove(entry.url)
+        self._add(entry)
+        evicted = []
+        # Прежнее тело URL удаляем, только если содержимое действительно сменилось
+        orphans = [orphan] if orphan and orphan != entry.digest else []
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            url = next(iter(self._entries))
+            evicted.append(url)
+            digest = self._remove(url)
+            if digest:
+                orphans.append(digest)
+        if orphans:
+            await asyncio.to_thread(self._delete_blobs, orphans)
+        await self.db.write(_upsert, entry.row(time.time()))
+        if evicted:
+            await self.db.write(_delete, evicted)
+            ASSET_CACHE_TOTAL.inc(len(evicted), outcome="evicted")
+
+    def _write_blob(self, digest: str, body: bytes) -> None:
+        path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{id(body)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _delete_blobs(self, digests: List[str]) -> None:
+        for digest in digests:
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def _read_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as f:
+            return f.read()
+
+    # ------------------------------------------------------
+    # Обработчик маршрута Playwright
+    # ------------------------------------------------------
+    async def _handle(self, route: Route) -> None:
+        request = route.request
+        if request.method != "GET":
+            await route.continue_()
+            return
+        try:
+            await self._serve(route)
+        except Exception as e:
+            logger.debug(f"Кеш статики: {request.url}: {e}")
+            ASSET_CACHE_TOTAL.inc(outcome="error")
+            try:
+                await route.continue_()
+            except Exception:
+                pass  # маршрут уже обработан или страница закрыта
+
+    async def _serve(self, route: Route) -> None:
+        url = route.request.url
+        now = time.time()
+        entry = self._entries.get(url)
+
+        if entry is not None and now < entry.expires:
+            self._entries.move_to_end(url)
+            await self._fulfill(route, entry)
+            ASSET_CACHE_TOTAL.inc(outcome="hit")
+            return
+
+        headers = dict(route.request.headers)
+        if entry is not None:
+            if entry.etag:
+                headers["if-none-match"] = entry.etag
+            if entry.last_modified:
+                headers["if-modified-since"] = entry.last_modified
+        response = await route.fetch(headers=headers)
+
+        if entry is not None and response.status == 304:
+            # Не изменилось: продлеваем срок свежести по заголовкам 304 и отдаём сохранённое тело
+            entry.expires = fresh_until(response.headers, now, self.default_ttl) or now
+            self._entries.move_to_end(url)
+            await self._fulfill(route, entry)
+            await self.db.write(_upsert, entry.row(now))
+            ASSET_CACHE_TOTAL.inc(outcome="revalidated")
+            return
+
+        body = await response.body()
+        await route.fulfill(response=response, body=body)
+        expires = fresh_until(response.headers, now, self.default_ttl) if response.status == 200 else None
+        if expires is None or len(body) > self.max_bytes:
+            ASSET_CACHE_TOTAL.inc(outcome="bypass")
+            return
+        ASSET_CACHE_TOTAL.inc(outcome="miss")
+        stored_headers = {name: value for name, value in response.headers.items() if name not in _SKIP_HEADERS}
+        await self._store(AssetEntry(
+            url, hashlib.sha256(body).hexdigest(), len(body), stored_headers,
+            response.headers.get("etag"), response.headers.get("last-modified"), expires
+        ), body)
+
+    async def _fulfill(self, route: Route, entry: AssetEntry) -> None:
+        body = await asyncio.to_thread(self._read_blob, entry.digest)
+        await route.fulfill(status=200, headers={**entry.headers, CACHE_HIT_HEADER: "hit"}, body=body)
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.db.close()
@@ -0,0 +1,148 @@
+import io
+import math
+import statistics
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from services.deal_scenarios import deal_result
+
+# Сколько точек максимум показывать на графике/в расчёте: окно подбирается под период
+BACKTEST_TARGET_POINTS = 1500
+# Котировка, полученная раньше этого (секунд) до окна, в окне уже не используется
+BACKTEST_MAX_QUOTE_GAP = 15 * 60
+
+
+class BacktestSeries(NamedTuple):
+    timestamps: List[float]  # начало окна (unix time)
+    garantex: List[float]
+    profinance: List[float]
+    results: List[float]
+
+
+def pick_window(period_seconds: float) -> int:
+    """
+    Длина окна (кратна минуте) так, чтобы за период получилось не больше BACKTEST_TARGET_POINTS окон.
+    """
+    return max(60, math.ceil(period_seconds / BACKTEST_TARGET_POINTS / 60) * 60)
+
+
+def align_quotes(
+    left: Sequence[Tuple[int, float]],
+    right: Sequence[Tuple[int, float]],
+    max_gap: int
+) -> Tuple[List[int], List[float], List[float]]:
+    """
+    Сводит две серии (номер окна, значение) по окнам: в каждом окне, где есть хотя бы одна котировка,
+    берётся последнее известное значение обеих серий, если оно не старше max_gap окон.
+    Обе серии отсортированы по окну, поэтому достаточно одного прохода слиянием.
+    """
+    buckets: List[int] = []
+    left_values: List[float] = []
+    right_values: List[float] = []
+    i = j = 0
+    last_left = last_right = None  # (окно, значение)
+    while i < len(left) or j < len(right):
+        if j >= len(right) or (i < len(left) and left[i][0] <= right[j][0]):
+            bucket = left[i][0]
+        else:
+            bucket = right[j][0]
+        if i < len(left) and left[i][0] == bucket:
+            last_left = left[i]
+            i += 1
+        if j < len(right) and right[j][0] == bucket:
+            last_right = right[j]
+            j += 1
+        if (last_left is not None and last_right is not None
+                and bucket - last_left[0] <= max_gap and bucket - last_right[0] <= max_gap):
+            buckets.append(bucket)
+            left_values.append(last_left[1])
+            right_values.append(last_right[1])
+    return buckets, left_values, right_values
+
+
+def run_backtest(
+    garantex_windows: Sequence[Tuple[int, float]],
+    profinance_windows: Sequence[Tuple[int, float]],
+    window: int,
+    t: float,
+    total_vars: float
+) -> BacktestSeries:
+    """
+    Формула сделки из /calculate по всей истории котировок за один проход по сведённым окнам.
+    """
+    max_gap = max(1, math.ceil(BACKTEST_MAX_QUOTE_GAP / window))
+    buckets, garantex, profinance = align_quotes(garantex_windows, profinance_windows, max_gap)
+    results = [deal_result(g, p, t, total_vars) for g, p in zip(garantex, profinance)]
+    return BacktestSeries([bucket * window for bucket in buckets], garantex, profinance, results)
+
+
+def summarize(series: BacktestSeries) -> Dict[str, Any]:
+    results = series.results
+    if not results:
+        return {"windows": 0}
+    low = min(range(len(results)), key=results.__getitem__)
+    high = max(range(len(results)), key=results.__getitem__)
+    return {
+        "windows": len(results),
+        "from": series.timestamps[0],
+        "to": series.timestamps[-1],
+        "last": results[-1],
+        "mean": statistics.fmean(results),
+        "median": statistics.median(results),
+        "stdev": statistics.pstdev(results),
+        "min": (results[low], series.timestamps[low]),
+        "max": (results[high], series.timestamps[high]),
+        "positive_share": sum(1 for value in results if value > 0) / len(results),
+    }
+
+
+def render_backtest_png(series: BacktestSeries, title: str = "") -> bytes:
+    """
+    График результата сделки во времени (Pillow), линия нуля — пунктиром. Выполнять вне event loop.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = 960, 440
+    left, right, top, bottom = 70, 20, 30, 40
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    if title:
+        draw.text((left, 8), title, fill="black", font=font)
+
+    xs, ys = series.timestamps, series.results
+    if not ys:
+        draw.text((left, height // 2), "no data", fill="black", font=font)
+    else:
+        x_min, x_max = xs[0], max(xs[-1], xs[0] + 1)
+        y_min, y_max = min(min(ys), 0.0), max(max(ys), 0.0)
+        if y_max - y_min < 1e-9:
+            y_min, y_max = y_min - 1, y_max + 1
+
+        def px(x: float) -> float:
+            return left + (x - x_min) / (x_max - x_min) * (width - left - right)
+
+        def py(y: float) -> float:
+            return top + (y_max - y) / (y_max - y_min) * (height - top - bottom)
+
+        draw.rectangle([left, top, width - right, height - bottom], outline="grey")
+        zero = py(0.0)
+        for x in range(left, width - right, 8):
+            draw.line([(x, zero), (x + 4, zero)], fill="grey")
+        for value in (y_max, 0.0, y_min):
+            draw.text((4, py(value) - 6), f"{value:.2f}%", fill="black", font=font)
+        for k in range(5):
+            x = x_min + (x_max - x_min) * k / 4
+            label = datetime.fromtimestamp(x).strftime("%d.%m %H:%M")
+            draw.text((min(px(x) - 30, width - 80), height - bottom + 6), label, fill="black", font=font)
+
+        points = [(px(x), py(y)) for x, y in zip(xs, ys)]
+        if len(points) == 1:
+            x, y = points[0]
+            draw.ellipse([x - 2, y - 2, x + 2, y + 2], fill="navy")
+        else:
+            draw.line(points, fill="navy", width=2)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+from services.metrics import BROWSER_JOBS_REJECTED
+
+# Приоритеты задач браузера: меньше — важнее
+INTERACTIVE = 0  # пользователь ждёт ответа
+BACKGROUND = 1  # фоновые обновления снимка курсов и истории котировок
+
+_job_priority: contextvars.ContextVar[int] = contextvars.ContextVar("browser_job_priority", default=INTERACTIVE)
+
+
+class BrowserBusy(Exception):
+    """
+    Очередь браузера переполнена или ожидание слота истекло — вызывающий отдаёт кешированный ответ.
+    """
+
+
+@contextlib.contextmanager
+def background_jobs() -> Iterator[None]:
+    """
+    Задачи браузера внутри блока (и в задачах, созданных из него) идут с фоновым приоритетом.
+    """
+    token = _job_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _job_priority.reset(token)
+
+
+class BrowserAdmission:
+    """
+    Общая очередь допуска к браузеру: не больше limit одновременных задач (контекстов Chromium),
+    остальные ждут слота в порядке приоритета, внутри приоритета — по очереди.
+    Если ждущих уже max_waiting или слот не освободился за timeout секунд — BrowserBusy:
+    лишняя нагрузка превращается в ответ из кеша, а не в очередь из браузеров.
+    """
+
+    def __init__(self, limit: int, max_waiting: int = 20, timeout: Optional[float] = 20.0) -> None:
+        self.limit = max(1, limit)
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        # (приоритет, порядковый номер, future ожидающего)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @property
+    def saturated(self) -> bool:
+        """
+        Новая задача не начнётся сразу: все слоты заняты и очередь уже есть.
+        """
+        return self.active >= self.limit and self.waiting > 0
+
+    async def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        priority = _job_priority.get() if priority is None else priority
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        if self.waiting >= self.max_waiting:
+            BROWSER_JOBS_REJECTED.inc(reason="queue_full")
+            raise BrowserBusy(f"Очередь браузера переполнена ({self.waiting} ожидают)")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout if timeout is not None else self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Слот успели выдать одновременно с отменой — возвращаем его следующему
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                BROWSER_JOBS_REJECTED.inc(reason="timeout")
+                raise BrowserBusy("Не дождались свободного браузера") from None
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+                return
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Optional[int] = None) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def browser_job(method: Callable) -> Callable:
+    """
+    Декоратор методов ParserService, открывающих контекст браузера:
+    метод выполняется только в слоте self.admission.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with self.admission.slot():
+            return await method(self, *args, **kwargs)
+    return wrapper
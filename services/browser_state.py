@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from playwright.async_api import BrowserContext, Page
+
+from services.metrics import CONSENT_DISMISSED_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Кнопки согласия (cookie-баннеры и модальные окна) по сайтам: CSS, через запятую — варианты.
+# Каждый вариант ограничен контейнером баннера, чтобы не нажать одноимённую кнопку на самой странице
+CONSENT_SELECTORS: Dict[str, str] = {
+    "investing": "#onetrust-banner-sdk #onetrust-accept-btn-handler",
+    "grinex": "#privacy-agree-modal button[data-action='click->dialog#closeOutside']",
+    "xe": (
+        "#onetrust-banner-sdk #onetrust-accept-btn-handler, "
+        "[id*='consent'] button:has-text('Accept'), [class*='consent'] button:has-text('Accept')"
+    ),
+}
+
+# Сколько ждать появления баннера, если сохранённого состояния нет (баннер часто дорисовывается скриптом)
+CONSENT_WAIT_MS = 2000
+
+
+async def dismiss_consent(page: Page, site: str, wait_ms: int = 0) -> bool:
+    """
+    Нажимает кнопку согласия сайта, если она видна (wait_ms — сколько ждать её появления).
+    Возвращает True, если баннер был и его закрыли.
+    """
+    selector = CONSENT_SELECTORS.get(site)
+    if selector is None:
+        return False
+    button = page.locator(selector).first
+    try:
+        if wait_ms:
+            await button.wait_for(state="visible", timeout=wait_ms)
+        elif not await button.is_visible():
+            return False
+        await button.click(timeout=5000)
+    except Exception:
+        return False
+    CONSENT_DISMISSED_TOTAL.inc(site=site)
+    return True
+
+
+class BrowserStateStore:
+    """
+    Сохранённое состояние браузера (cookies и localStorage) по сайтам: db/browser_state/<site>.json.
+    Новый контекст сайта создаётся с этим состоянием, и баннеры согласия уже приняты.
+    Состояние старше ttl секунд не выдаётся — контекст пройдёт баннер заново и сохранит свежее;
+    cookies с истёкшим сроком отбрасываются при загрузке.
+    Пустой directory — хранилище выключено.
+    """
+
+    def __init__(self, directory: str, ttl: float) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        # site -> (время сохранения, состояние)
+        self._states: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def _path(self, site: str) -> str:
+        return os.path.join(self.directory, f"{site}.json")
+
+    def _load(self, site: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._path(site)
+        try:
+            saved_at = os.path.getmtime(path)
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать состояние браузера {path}: {e}", extra={"source": site})
+            return None
+        self._states[site] = (saved_at, state)
+        return saved_at, state
+
+    def get(self, site: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние для browser.new_context(storage_state=...) или None, если его нет или оно устарело.
+        """
+        if not self.directory:
+            return None
+        entry = self._states.get(site) or self._load(site)
+        if entry is None:
+            return None
+        saved_at, state = entry
+        if time.time() - saved_at > self.ttl:
+            logger.info(f"Состояние браузера {site} устарело, обновим", extra={"source": site})
+            self.invalidate(site)
+            return None
+        now = time.time()
+        cookies = [cookie for cookie in state.get("cookies", []) if not 0 < cookie.get("expires", -1) < now]
+        return {**state, "cookies": cookies}
+
+    async def save(self, site: str, context: BrowserContext) -> None:
+        """
+        Снимает состояние контекста и атомарно записывает его на диск.
+        """
+        if not self.directory:
+            return
+        try:
+            state = await context.storage_state()
+            await asyncio.to_thread(self._write, site, state)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить состояние браузера: {e}", extra={"source": site})
+            return
+        self._states[site] = (time.time(), state)
+
+    def _write(self, site: str, state: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(site)
+        tmp_path = f"{path}.{os.getpid()}.{id(state)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, site: str) -> None:
+        """
+        Забывает состояние сайта: следующий контекст пройдёт баннеры заново.
+        """
+        self._states.pop(site, None)
+        try:
+            os.remove(self._path(site))
+        except OSError:
+            pass
@@ -0,0 +1,139 @@
+import datetime
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from services.quote import Quote
+
+logger = logging.getLogger(__name__)
+
+# Загрузка XML ЦБ за дату: содержимое ответа или None при ошибке
+CbrFetcher = Callable[[datetime.date], Optional[bytes]]
+
+
+class CbrRate(NamedTuple):
+    code: str  # CharCode: USD, HKD, ...
+    name: str
+    nominal: int  # курс указан за nominal единиц валюты (HKD — за 10, JPY — за 100)
+    value: Quote  # рублей за nominal единиц
+
+    @property
+    def unit_value(self) -> Decimal:
+        return self.value.value / self.nominal
+
+
+class CbrDocument(NamedTuple):
+    date: Optional[datetime.date]  # дата курсов из XML (в выходные — последний рабочий день)
+    rates: Dict[str, CbrRate]
+
+
+def parse_cbr_xml(content: bytes, latency: Optional[float] = None) -> CbrDocument:
+    """
+    Разбирает XML_daily.asp целиком — все валюты за один проход.
+    """
+    root = ET.fromstring(content)
+    xml_date = None
+    try:
+        xml_date = datetime.datetime.strptime(root.attrib.get("Date", ""), "%d.%m.%Y").date()
+    except ValueError:
+        pass
+
+    rates: Dict[str, CbrRate] = {}
+    for valute in root.iter("Valute"):
+        code = (valute.findtext("CharCode") or "").strip().upper()
+        quote = Quote.parse(valute.findtext("Value"), f"{code}/RUB", "cbr", latency=latency)
+        if not code or quote is None:
+            continue
+        try:
+            nominal = int(valute.findtext("Nominal") or 1)
+        except ValueError:
+            nominal = 1
+        rates[code] = CbrRate(code, (valute.findtext("Name") or "").strip(), nominal, quote)
+    return CbrDocument(xml_date, rates)
+
+
+class CbrIndex:
+    """
+    Разобранные документы ЦБ в памяти: дата запроса -> {CharCode: CbrRate}.
+    Один документ содержит все валюты, поэтому курс любой валюты за уже загруженную дату —
+    поиск в словаре без сетевого запроса. Прошедшие даты не меняются и хранятся, пока не
+    вытеснены (LRU); сегодняшний и будущие документы живут ttl секунд — ЦБ публикует курсы на завтра днём.
+    Одну дату одновременно загружает только один поток, остальные ждут его результат.
+    """
+
+    def __init__(self, fetch: CbrFetcher, ttl: float = 600, max_documents: int = 256) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_documents = max_documents
+        # дата запроса -> (time.monotonic() загрузки, документ)
+        self._documents: "OrderedDict[datetime.date, Tuple[float, CbrDocument]]" = OrderedDict()
+        self._fetch_locks: Dict[datetime.date, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, date: Optional[datetime.date] = None) -> Optional[CbrDocument]:
+        """
+        Документ за дату, если он уже загружен и не устарел (без сети).
+        """
+        date = date or datetime.date.today()
+        with self._lock:
+            entry = self._documents.get(date)
+            if entry is None:
+                return None
+            loaded_at, document = entry
+            if date >= datetime.date.today() and time.monotonic() - loaded_at > self.ttl:
+                return None
+            self._documents.move_to_end(date)
+            return document
+
+    def document(self, date: Optional[datetime.date] = None) -> Optional[CbrDocument]:
+        """
+        Документ за дату (None — сегодня): из памяти или одним запросом к ЦБ. Блокирующий вызов.
+        """
+        date = date or datetime.date.today()
+        document = self.cached(date)
+        if document is not None:
+            return document
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(date, threading.Lock())
+        with fetch_lock:
+            try:
+                # Пока ждали, дату мог загрузить другой поток
+                document = self.cached(date)
+                if document is not None:
+                    return document
+                started = time.perf_counter()
+                content = self._fetch(date)
+                if content is None:
+                    return None
+                try:
+                    document = parse_cbr_xml(content, latency=time.perf_counter() - started)
+                except ET.ParseError as e:
+                    logger.error(f"Некорректный XML ЦБ за {date}: {e}", extra={"source": "cbr"})
+                    return None
+                with self._lock:
+                    self._documents[date] = (time.monotonic(), document)
+                    self._documents.move_to_end(date)
+                    while len(self._documents) > self.max_documents:
+                        self._documents.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._fetch_locks.pop(date, None)
+        return document
+
+    def rate(self, char_code: str, date: Optional[datetime.date] = None) -> Tuple[Optional[datetime.date], Optional[CbrRate]]:
+        """
+        (дата курсов из XML, курс валюты) или (None, None), если ЦБ не ответил.
+        """
+        document = self.document(date)
+        if document is None:
+            return None, None
+        return document.date, document.rates.get(char_code.upper())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
@@ -0,0 +1,129 @@
+import io
+import math
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+# Ограничения сетки сценариев (строки — значения t, столбцы — профили переменных)
+MAX_SCENARIO_ROWS = 2000
+MAX_TABLE_ROWS = 40  # больше строк в сообщение Telegram не помещается — отдаём тепловую карту
+GARANTEX_SPREAD = 0.1
+
+
+def deal_result(garantex: float, profinance: float, t: float, total_vars: float) -> float:
+    """
+    Формула сделки из /calculate: (((garantex - 0.1) - y) * (100 / profinance)) - total_vars,
+    где y = profinance + profinance / 100 * t.
+    """
+    y = profinance + (profinance / 100 * t)
+    return (((garantex - GARANTEX_SPREAD) - y) * (100 / profinance)) - total_vars
+
+
+class ScenarioGrid(NamedTuple):
+    t_values: List[float]
+    profiles: List[str]
+    totals: List[float]
+    results: List[List[float]]  # results[i][j] — для t_values[i] и profiles[j]
+
+
+def t_range(start: float, stop: float, step: float) -> List[float]:
+    """
+    Значения t от start до stop включительно с шагом step (без накопления ошибки сложения).
+    """
+    if not all(math.isfinite(x) for x in (start, stop, step)):
+        raise ValueError("Значения t должны быть конечными числами")
+    if step <= 0:
+        raise ValueError("Шаг должен быть больше нуля")
+    if stop < start:
+        raise ValueError("Начало диапазона больше конца")
+    # Отношение может переполниться (огромный диапазон при крошечном шаге) — проверяем до int()
+    steps = round((stop - start) / step, 9)
+    if not math.isfinite(steps) or steps + 1 > MAX_SCENARIO_ROWS:
+        raise ValueError(f"Слишком много значений t, максимум {MAX_SCENARIO_ROWS}")
+    count = int(steps) + 1
+    return [round(start + i * step, 10) for i in range(count)]
+
+
+def build_variable_profiles(user_vars: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Профили переменных для сравнения (имя -> сумма переменных):
+    текущие переменные пользователя, значения по умолчанию, без переменных
+    и текущие без каждой из переменных по отдельности.
+    """
+    current_total = sum(float(v) for v in user_vars.values())
+    profiles = {
+        "current": current_total,
+        "default": sum(float(v) for v in defaults.values()),
+        "none": 0.0,
+    }
+    for name, value in user_vars.items():
+        profiles[f"-{name}"] = current_total - float(value)
+    return profiles
+
+
+def build_grid(garantex: float, profinance: float, t_values: Sequence[float], profiles: Dict[str, float]) -> ScenarioGrid:
+    """
+    Вся сетка результатов за один проход.
+    Формула раскладывается в base - t - total_vars (base = ((garantex - 0.1) - profinance) * 100 / profinance),
+    поэтому каждая ячейка — одно вычитание, а base считается один раз на всю сетку.
+    """
+    base = deal_result(garantex, profinance, 0.0, 0.0)
+    totals = list(profiles.values())
+    results = [[base - t - total for total in totals] for t in t_values]
+    return ScenarioGrid(list(t_values), list(profiles), totals, results)
+
+
+def format_grid_table(grid: ScenarioGrid) -> str:
+    """
+    Текстовая таблица (tabulate): строки — t, столбцы — профили, значения в процентах.
+    """
+    from tabulate import tabulate
+
+    rows = [[t] + [round(value, 3) for value in row] for t, row in zip(grid.t_values, grid.results)]
+    return tabulate(rows, headers=["t"] + grid.profiles, tablefmt="simple", floatfmt="g")
+
+
+def _cell_color(value: float, limit: float) -> tuple:
+    """
+    Красный для отрицательных результатов, зелёный для положительных, белый около нуля.
+    """
+    share = min(1.0, abs(value) / limit) if limit else 0.0
+    fade = int(255 * (1 - share))
+    return (255, fade, fade) if value < 0 else (fade, 255, fade)
+
+
+def render_heatmap_png(grid: ScenarioGrid, title: str = "") -> bytes:
+    """
+    Тепловая карта сетки в PNG (Pillow — зависимость ReportLab). Выполнять вне event loop.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    rows, cols = len(grid.t_values), len(grid.profiles)
+    cell_w = 72
+    cell_h = 18 if rows <= 60 else max(2, 1080 // rows)
+    show_values = cell_h >= 14
+    left, top = 64, 48
+    width, height = left + cols * cell_w + 8, top + rows * cell_h + 8
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    limit = max((abs(value) for row in grid.results for value in row), default=0.0)
+    if title:
+        draw.text((4, 4), title, fill="black", font=font)
+    for j, name in enumerate(grid.profiles):
+        draw.text((left + j * cell_w + 4, top - 18), name[:11], fill="black", font=font)
+
+    label_every = max(1, 14 // cell_h) if not show_values else 1
+    for i, (t, row) in enumerate(zip(grid.t_values, grid.results)):
+        y = top + i * cell_h
+        if i % label_every == 0:
+            draw.text((4, y + 2), f"t={t:g}", fill="black", font=font)
+        for j, value in enumerate(row):
+            x = left + j * cell_w
+            draw.rectangle([x, y, x + cell_w - 1, y + cell_h - 1], fill=_cell_color(value, limit))
+            if show_values:
+                draw.text((x + 4, y + 2), f"{value:.3f}", fill="black", font=font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
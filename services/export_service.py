@@ -0,0 +1,144 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+from typing import IO, Dict, List, NamedTuple, Optional, Tuple
+
+from db.quotes_database import QUOTES_DB_PATH
+from db.requests_database import REQUESTS_DB_PATH
+
+EXPORT_FORMATS = ("csv", "jsonl")
+# Сколько строк забирать из курсора за раз
+EXPORT_FETCH_SIZE = 1000
+
+
+class ExportTable(NamedTuple):
+    db_path: str
+    table: str
+    columns: List[str]
+    date_column: str  # колонка для фильтра по диапазону дат: YYYY-MM-DD или unix-время (date_is_timestamp)
+    date_is_timestamp: bool = False
+    order_by: str = "id"
+
+
+# Что можно выгрузить через /export и tools/export.py
+EXPORT_TABLES: Dict[str, ExportTable] = {
+    "requests": ExportTable(
+        db_path=REQUESTS_DB_PATH,
+        table="requests",
+        columns=["id", "user_id", "text", "date", "created_at", "command"],
+        date_column="date",
+    ),
+    # История котировок (db/quotes.db): ts — unix-время получения значения
+    "quotes": ExportTable(
+        db_path=QUOTES_DB_PATH,
+        table="quotes",
+        columns=["ts", "currency", "source", "field", "value"],
+        date_column="ts",
+        date_is_timestamp=True,
+        order_by="ts",
+    ),
+}
+
+
+def _day_start(date: str) -> float:
+    # Начало дня YYYY-MM-DD по локальному времени, как у дат в логе запросов
+    return datetime.datetime.strptime(date, "%Y-%m-%d").timestamp()
+
+
+def _build_query(spec: ExportTable, date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, tuple]:
+    conditions, params = [], []
+    if date_from:
+        conditions.append(f"{spec.date_column} >= ?")
+        params.append(_day_start(date_from) if spec.date_is_timestamp else date_from)
+    if date_to:
+        if spec.date_is_timestamp:
+            # «по» включительно — до начала следующего дня
+            conditions.append(f"{spec.date_column} < ?")
+            params.append(_day_start(date_to) + 86400)
+        else:
+            conditions.append(f"{spec.date_column} <= ?")
+            params.append(date_to)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {', '.join(spec.columns)} FROM {spec.table}{where} ORDER BY {spec.order_by}"
+    return query, tuple(params)
+
+
+def export_table(
+    name: str,
+    out: IO[str],
+    fmt: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> int:
+    """
+    Потоково пишет таблицу name в текстовый поток out (CSV с заголовком или JSONL).
+    Строки читаются из курсора порциями по EXPORT_FETCH_SIZE, поэтому память не зависит от размера таблицы.
+    Возвращает число выгруженных строк.
+    """
+    if name not in EXPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица: {name}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    spec = EXPORT_TABLES[name]
+    query, params = _build_query(spec, date_from, date_to)
+
+    conn = sqlite3.connect(f"file:{spec.db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(query, params)
+        writer = csv.writer(out) if fmt == "csv" else None
+        if writer:
+            writer.writerow(spec.columns)
+
+        count = 0
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if writer:
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(dict(zip(spec.columns, row)), ensure_ascii=False))
+                    out.write("\n")
+            count += len(rows)
+        return count
+    finally:
+        conn.close()
+
+
+def export_to_gzip_file(
+    name: str,
+    path: str,
+    fmt: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> int:
+    """
+    То же, что export_table, но сразу в файл .gz.
+    """
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as out:
+        return export_table(name, out, fmt, date_from, date_to)
+
+
+def export_to_temp_file(
+    name: str,
+    fmt: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> Tuple[str, int]:
+    """
+    Выгружает во временный .gz-файл (для отправки документом). Удалять файл — забота вызывающего.
+    Возвращает (путь, число строк).
+    """
+    fd, path = tempfile.mkstemp(prefix=f"{name}_", suffix=f".{fmt}.gz")
+    os.close(fd)
+    try:
+        return path, export_to_gzip_file(name, path, fmt, date_from, date_to)
+    except Exception:
+        os.remove(path)
+        raise
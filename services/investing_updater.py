@@ -1,8 +1,15 @@
 import asyncio
 import datetime
-import traceback
+import logging
+import time
 from playwright.async_api import async_playwright, Page
-from typing import Optional
+from typing import Callable, Optional
+
+from services.browser_state import CONSENT_WAIT_MS, BrowserStateStore, dismiss_consent
+from services.metrics import instrument_source
+from services.quote import Quote
+
+logger = logging.getLogger(__name__)
 
 class InvestingUpdater:
     """
@@ -12,8 +19,10 @@ class InvestingUpdater:
     В случае ошибки инициализации или обновления происходит повторный запуск.
     """
 
-    def __init__(self):
+    def __init__(self, browser_state: Optional[BrowserStateStore] = None):
         self.count_restart = 0
+        # Сохранённые cookies Investing: баннер OneTrust принимается один раз, а не при каждом перезапуске
+        self.browser_state = browser_state
         self.running = False
         self.browser = None
         self.context = None
@@ -24,14 +33,17 @@ class InvestingUpdater:
         self.page_cny: Optional[Page] = None
 
         # Сохранённые данные (в тексте) и скриншоты (пути к файлам)
-        self.cached_usd_rate: Optional[str] = None
-        self.cached_eur_rate: Optional[str] = None
-        self.cached_cny_rate: Optional[str] = None
+        self.cached_usd_rate: Optional[Quote] = None
+        self.cached_eur_rate: Optional[Quote] = None
+        self.cached_cny_rate: Optional[Quote] = None
 
         self.cached_usd_screenshot: str = "logs/screenshots/screenshot_investing_usd.png"
         self.cached_eur_screenshot: str = "logs/screenshots/screenshot_investing_eur.png"
         self.cached_cny_screenshot: str = "logs/screenshots/screenshot_investing_cny.png"
 
+        # Вызывается с (валюта, курс) при каждом новом значении — например, для общего снимка курсов
+        self.on_rate: Optional[Callable[[str, Quote], None]] = None
+
     async def start_updating(self, interval_seconds: int = 30):
         """
         Запускает вечный цикл, в котором каждые 60 минут происходит перезапуск браузера.
@@ -48,7 +60,8 @@ class InvestingUpdater:
                         headless=False,
                         args=["--disable-blink-features=AutomationControlled"]
                     )
-                    self.context = await self.browser.new_context()
+                    storage_state = self.browser_state.get("investing") if self.browser_state else None
+                    self.context = await self.browser.new_context(storage_state=storage_state)
 
                     # Создаем страницы для каждой валюты
                     self.page_usd = await self.context.new_page()
@@ -60,18 +73,22 @@ class InvestingUpdater:
                     await self.page_eur.goto("https://ru.investing.com/currencies/eur-rub", wait_until="domcontentloaded")
                     await self.page_cny.goto("https://ru.investing.com/currencies/cny-rub", wait_until="domcontentloaded")
 
-                    # Закрываем cookie-баннер на каждой странице
-                    await self._close_cookie_banner(self.page_usd)
-                    await self._close_cookie_banner(self.page_eur)
-                    await self._close_cookie_banner(self.page_cny)
+                    # Закрываем cookie-баннер на каждой странице (с сохранённым состоянием его обычно нет)
+                    wait_ms = 0 if storage_state else CONSENT_WAIT_MS
+                    dismissed = [
+                        await self._close_cookie_banner(page, wait_ms)
+                        for page in (self.page_usd, self.page_eur, self.page_cny)
+                    ]
+                    if self.browser_state and (any(dismissed) or storage_state is None):
+                        await self.browser_state.save("investing", self.context)
 
                     # Скроллим страницы для корректного отображения данных
                     await self.page_usd.evaluate("window.scrollTo(0, 300)")
                     await self.page_eur.evaluate("window.scrollTo(0, 300)")
                     await self.page_cny.evaluate("window.scrollTo(0, 300)")
                 except Exception as init_error:
-                    print("Ошибка при инициализации браузера или страниц:", init_error)
-                    traceback.print_exc()
+                    logger.exception(f"Ошибка при инициализации браузера или страниц: {init_error}",
+                                     extra={"source": "investing"})
                     await self._close_all()
                     # Подождать немного перед повторным запуском
                     await asyncio.sleep(5)
@@ -90,57 +107,74 @@ class InvestingUpdater:
                             page=self.page_usd,
                             selector='span[data-test="instrument-price-last"]',
                             screenshot_path=self.cached_usd_screenshot,
-                            set_rate_callback=lambda val: setattr(self, "cached_usd_rate", val)
+                            set_rate_callback=lambda val: self._set_rate("usd", val),
+                            pair="USD/RUB"
                         )
                         # Обновляем EUR
                         await self._update_currency(
                             page=self.page_eur,
                             selector='span[data-test="instrument-price-last"]',
                             screenshot_path=self.cached_eur_screenshot,
-                            set_rate_callback=lambda val: setattr(self, "cached_eur_rate", val)
+                            set_rate_callback=lambda val: self._set_rate("eur", val),
+                            pair="EUR/RUB"
                         )
                         # Обновляем CNY
                         await self._update_currency(
                             page=self.page_cny,
                             selector='span[data-test="instrument-price-last"]',
                             screenshot_path=self.cached_cny_screenshot,
-                            set_rate_callback=lambda val: setattr(self, "cached_cny_rate", val)
+                            set_rate_callback=lambda val: self._set_rate("cny", val),
+                            pair="CNY/RUB"
                         )
                     except Exception as update_error:
-                        print("Ошибка при обновлении курса:", update_error)
-                        traceback.print_exc()
+                        logger.exception(f"Ошибка при обновлении курса: {update_error}", extra={"source": "investing"})
                         # При ошибке обновления прерываем внутренний цикл и перезапускаем браузер
                         break
 
                 # Закрываем текущие страницы, контекст и браузер перед перезапуском
                 await self._close_all()
 
-    async def _update_currency(self, page: Page, selector: str, screenshot_path: str, set_rate_callback):
+    async def stop(self):
+        """
+        Останавливает фоновый цикл (текущий браузер закроется при выходе из внутреннего цикла).
+        """
+        self.running = False
+
+    def _set_rate(self, currency: str, value: Quote) -> None:
+        setattr(self, f"cached_{currency}_rate", value)
+        if self.on_rate is not None:
+            self.on_rate(currency.upper(), value)
+
+    @instrument_source("investing")
+    async def _update_currency(
+        self, page: Page, selector: str, screenshot_path: str, set_rate_callback, pair: str
+    ) -> Optional[Quote]:
         """
         Обновляет курс для конкретной вкладки:
         - получает текст по селектору,
         - делает скриншот,
         - сохраняет данные через колбэк.
+        Возвращает котировку или None, если текст не разобран (в метриках — неудача).
         """
         # Получаем текст селектора
+        started = time.perf_counter()
         rate_text: str = await page.locator(selector).text_content()
+        latency = time.perf_counter() - started
 
         # Делаем скриншот всей страницы
         await page.screenshot(path=screenshot_path)
 
-        # Сохраняем курс, если он получен
-        if rate_text:
-            set_rate_callback(rate_text.strip())
+        # Сохраняем курс, если он получен и разобран
+        quote = Quote.parse(rate_text, pair, "investing", latency=latency)
+        if quote is not None:
+            set_rate_callback(quote)
+        return quote
 
-    async def _close_cookie_banner(self, page: Page):
+    async def _close_cookie_banner(self, page: Page, wait_ms: int = CONSENT_WAIT_MS) -> bool:
         """
-        Закрывает cookie-баннер на странице Investing, если он видим.
+        Закрывает cookie-баннер на странице Investing, если он видим. True — баннер был.
         """
-        try:
-            if await page.is_visible("#onetrust-accept-btn-handler", timeout=2000):
-                await page.click("#onetrust-accept-btn-handler")
-        except Exception:
-            pass
+        return await dismiss_consent(page, "investing", wait_ms)
 
     async def _close_all(self):
         """
@@ -165,4 +199,4 @@ class InvestingUpdater:
 
         finally:
             self.count_restart += 1
-            print("Count of restarting: " + str(self.count_restart))
+            logger.info(f"Count of restarting: {self.count_restart}", extra={"source": "investing"})
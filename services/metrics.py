@@ -0,0 +1,360 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from services.quote import Quote
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Обновления приходят и из рабочих потоков (синхронные источники через asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn: Callable[[], float], **labels: Any) -> None:
+        """
+        Значение вычисляется в момент запроса /metrics (например, длина очереди).
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> ([счётчики по корзинам], сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Минимальный реестр метрик с выводом в текстовом формате Prometheus (без внешних зависимостей).
+    Метрики обновляются и из event loop, и из рабочих потоков (синхронные источники вроде Garantex
+    выполняются через asyncio.to_thread), поэтому изменения и чтение каждой метрики идут под её блокировкой.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        if buckets is None:
+            return self._register(Histogram(name, documentation, labelnames))
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ------------------------------------------------------
+# Метрики источников курсов
+# ------------------------------------------------------
+SCRAPE_DURATION = registry.histogram(
+    "scrape_duration_seconds", "Время получения курса из источника", ["source"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 7.5, 10, 15, 20, 30, 60),
+)
+SCRAPE_TOTAL = registry.counter(
+    "scrape_requests_total", "Запросы к источникам по результату и прокси", ["source", "outcome", "proxy"]
+)
+SCRAPE_BYTES = registry.counter(
+    "scrape_bytes_total", "Получено байт от источника (по Content-Length / размеру ответа)", ["source"]
+)
+
+# ------------------------------------------------------
+# Метрики бота
+# ------------------------------------------------------
+UPDATE_DURATION = registry.histogram(
+    "bot_update_duration_seconds", "Полное время обработки апдейта (включая ожидание воркера)", ["event"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+UPDATES_TOTAL = registry.counter("bot_updates_total", "Обработанные апдейты", ["event", "outcome"])
+UPDATES_IN_FLIGHT = registry.gauge("bot_updates_in_flight", "Апдейты в обработке")
+UPDATES_WAITING = registry.gauge("bot_updates_waiting", "Апдейты в очереди на свободного воркера")
+RATE_LIMITED_TOTAL = registry.counter("bot_rate_limited_total", "Команды сверх лимита пользователя (ответ из кеша)", ["command"])
+BROWSER_JOBS_ACTIVE = registry.gauge("bot_browser_jobs_active", "Задачи браузера в работе")
+BROWSER_JOBS_WAITING = registry.gauge("bot_browser_jobs_waiting", "Задачи браузера в очереди допуска")
+BROWSER_JOBS_REJECTED = registry.counter(
+    "bot_browser_jobs_rejected_total", "Задачи браузера, отклонённые очередью допуска", ["reason"]
+)
+ASSET_CACHE_TOTAL = registry.counter(
+    "bot_asset_cache_total", "Запросы статики через локальный кеш (hit, revalidated, miss, bypass, evicted, error)",
+    ["outcome"]
+)
+ASSET_CACHE_BYTES = registry.gauge("bot_asset_cache_bytes", "Размер тел в локальном кеше статики")
+CONSENT_DISMISSED_TOTAL = registry.counter(
+    "bot_consent_dismissed_total", "Закрытые баннеры согласия (растёт — сохранённое состояние не помогает)", ["site"]
+)
+
+
+class _ScrapeObservation:
+    __slots__ = ("proxy", "bytes")
+
+    def __init__(self) -> None:
+        self.proxy = "none"
+        self.bytes = 0
+
+
+_current_scrape: contextvars.ContextVar[Optional[_ScrapeObservation]] = contextvars.ContextVar(
+    "current_scrape", default=None
+)
+
+
+def note_proxy(proxy: Optional[Dict[str, str]]) -> None:
+    """
+    Запоминает прокси текущего замера (вызывается внутри инструментированного метода).
+    """
+    observation = _current_scrape.get()
+    if observation is not None and proxy:
+        observation.proxy = proxy.get("server", "none")
+
+
+def note_bytes(amount: int) -> None:
+    observation = _current_scrape.get()
+    if observation is not None and amount:
+        observation.bytes += amount
+
+
+def _is_none(result: Any) -> bool:
+    return result is None
+
+
+def instrument_source(source: str, is_failure: Callable[[Any], bool] = _is_none) -> Callable:
+    """
+    Декоратор для методов получения курсов (sync и async):
+    время выполнения, успех/неудача (по умолчанию неудача — вернулся None), исключение,
+    прокси и полученные байты. Вызов также становится этапом "source.<name>" в трассировке.
+    """
+    def record(observation: _ScrapeObservation, started: float, outcome: str) -> None:
+        elapsed = time.perf_counter() - started
+        SCRAPE_DURATION.observe(elapsed, source=source)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Источник {source}: {outcome}", extra={
+                "source": source, "outcome": outcome, "latency_ms": round(elapsed * 1000, 1)
+            })
+        SCRAPE_TOTAL.inc(source=source, outcome=outcome, proxy=observation.proxy)
+        if observation.bytes:
+            SCRAPE_BYTES.inc(observation.bytes, source=source)
+
+    def outcome_of(result: Any) -> str:
+        return "failure" if is_failure(result) else "success"
+
+    def stamp_latency(result: Any, started: float) -> None:
+        # Котировке (или котировкам в кортеже, как у ЦБ: (дата, Quote)) — длительность запроса
+        for item in result if isinstance(result, tuple) else (result,):
+            if isinstance(item, Quote) and item.latency is None:
+                item.latency = time.perf_counter() - started
+
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                observation = _ScrapeObservation()
+                token = _current_scrape.set(observation)
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    with span(f"source.{source}"):
+                        result = await fn(*args, **kwargs)
+                    outcome = outcome_of(result)
+                    stamp_latency(result, started)
+                    return result
+                finally:
+                    _current_scrape.reset(token)
+                    record(observation, started, outcome)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def sync_wrapper(*args, **kwargs):
+            observation = _ScrapeObservation()
+            token = _current_scrape.set(observation)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                with span(f"source.{source}"):
+                    result = fn(*args, **kwargs)
+                outcome = outcome_of(result)
+                stamp_latency(result, started)
+                return result
+            finally:
+                _current_scrape.reset(token)
+                record(observation, started, outcome)
+        return sync_wrapper
+
+    return decorator
+
+
+def track_page_bytes(page) -> None:
+    """
+    Считает байты ответов страницы Playwright (по заголовку Content-Length) в текущий замер.
+    Контекст замера захватывается сейчас, т.к. события приходят вне исходной корутины.
+    """
+    observation = _current_scrape.get()
+    if observation is None:
+        return
+
+    def on_response(response) -> None:
+        if "x-asset-cache" in response.headers:
+            return  # отдано из локального кеша статики, не из сети
+        try:
+            observation.bytes += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
+
+    page.on("response", on_response)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Отдельный локальный HTTP-сервер с GET /metrics.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
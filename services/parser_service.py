@@ -1,15 +1,22 @@
+import logging
 import random
 import datetime
 import requests
-import re
-import xml.etree.ElementTree as ET
 import asyncio
-import traceback
 
-from typing import Optional, Dict, Tuple
+from typing import Callable, Optional, Dict, Tuple
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 
 from utils.config import config
+from services.metrics import instrument_source, note_bytes, note_proxy, track_page_bytes
+from services.tracing import span
+from services.quote import Quote
+from services.cbr_index import CbrIndex
+from services.browser_admission import BrowserAdmission, browser_job
+from services.asset_cache import AssetCache
+from services.browser_state import CONSENT_WAIT_MS, BrowserStateStore, dismiss_consent
+
+logger = logging.getLogger(__name__)
 
 class ParserService:
     """
@@ -24,16 +31,29 @@ class ParserService:
       и т.д.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, browser_state: Optional[BrowserStateStore] = None) -> None:
         """
-        Для каждой валюты храним:
+        Для каждой валюты (CharCode ЦБ) храним:
           - today_rate: курс на сегодня (если дата в XML совпадает с текущей)
           - tomorrow_rate: курс на завтра (если уже опубликован)
           - last_cbr_rate: последний доступный курс (на случай, если «сегодня» нет в XML)
         """
-        self.usd_cbr_data = {"today_rate": None, "tomorrow_rate": None, "last_cbr_rate": None}
-        self.eur_cbr_data = {"today_rate": None, "tomorrow_rate": None, "last_cbr_rate": None}
-        self.cny_cbr_data = {"today_rate": None, "tomorrow_rate": None, "last_cbr_rate": None}
+        self.cbr_data: Dict[str, Dict[str, Optional[Quote]]] = {}
+
+        # Допуск к браузеру: не больше BROWSER_MAX_JOBS контекстов одновременно, пользователи — раньше фоновых задач
+        self.admission = BrowserAdmission(config.BROWSER_MAX_JOBS, max_waiting=config.BROWSER_MAX_WAITING,
+                                          timeout=config.BROWSER_QUEUE_TIMEOUT)
+
+        # Сохранённые cookies/localStorage сайтов: баннеры согласия принимаются один раз, а не в каждом контексте
+        self.browser_state = browser_state or BrowserStateStore(config.BROWSER_STATE_DIR, ttl=config.BROWSER_STATE_TTL)
+
+        # Статика сайтов (JS/CSS/шрифты) из локального кеша вместо повторной загрузки через прокси
+        self.asset_cache = AssetCache(config.ASSET_CACHE_DIR, max_bytes=config.ASSET_CACHE_MAX_MB * 1024 * 1024,
+                                      default_ttl=config.ASSET_CACHE_DEFAULT_TTL)
+
+        # Разобранные XML ЦБ по датам: все валюты документа доступны без повторных запросов
+        self.cbr_index = CbrIndex(self._fetch_cbr_xml, ttl=config.CBR_INDEX_TTL,
+                                  max_documents=config.CBR_INDEX_MAX_DOCUMENTS)
 
         # Список прокси, если нужны
         self.proxies = [
@@ -59,6 +79,10 @@ class ParserService:
         self.playwright = None
         self.browser: Optional[Browser] = None
 
+        # Подмена адресов источников (например, на локальный сервер фикстур в benchmarks/).
+        # None — ходим на реальные сайты.
+        self.url_rewriter: Optional[Callable[[str], str]] = None
+
     # --------------------------------------------------------------------
     # 1. Методы для инициализации / завершения работы с общим браузером
     # --------------------------------------------------------------------
@@ -83,13 +107,80 @@ class ParserService:
         if self.playwright is not None:
             await self.playwright.stop()
             self.playwright = None
+        self.asset_cache.close()
+
+    async def _new_page(
+        self, use_proxy: bool = True, storage_state: Optional[Dict] = None
+    ) -> Tuple[BrowserContext, Page]:
+        """
+        Новый контекст (со случайным прокси, если use_proxy) и страница в общем браузере.
+        storage_state — сохранённые cookies/localStorage сайта (см. _new_site_page),
+        статика страниц идёт через локальный кеш (services/asset_cache.py).
+        Прокси и трафик страницы попадают в метрики текущего источника.
+        """
+        with span("browser.new_page"):
+            await self.init_browser()
+            if use_proxy:
+                chosen_proxy = random.choice(self.proxies)
+                note_proxy(chosen_proxy)
+                context = await self.browser.new_context(proxy=chosen_proxy, storage_state=storage_state)
+            else:
+                context = await self.browser.new_context(storage_state=storage_state)
+            try:
+                await self.asset_cache.attach(context)
+                page = await context.new_page()
+            except Exception:
+                await context.close()
+                raise
+        track_page_bytes(page)
+        return context, page
+
+    async def _new_site_page(self, site: str, use_proxy: bool = True) -> Tuple[BrowserContext, Page, bool]:
+        """
+        Как _new_page, но с сохранённым состоянием сайта site.
+        Третье значение — было ли состояние (передаётся в _accept_consent).
+        """
+        storage_state = self.browser_state.get(site)
+        context, page = await self._new_page(use_proxy=use_proxy, storage_state=storage_state)
+        return context, page, storage_state is not None
+
+    async def _accept_consent(self, site: str, context: BrowserContext, page: Page, restored: bool) -> None:
+        """
+        После перехода на страницу: с сохранённым состоянием (restored) баннера обычно нет — только быстрая
+        проверка; без него ждём баннер и закрываем. Если баннер был (или состояния не было), сохраняем состояние
+        контекста — следующие контексты сайта откроются уже без баннера.
+        """
+        with span("page.consent"):
+            dismissed = await dismiss_consent(page, site, wait_ms=0 if restored else CONSENT_WAIT_MS)
+        if dismissed or not restored:
+            await self.browser_state.save(site, context)
+
+    # Обёртки над шагами Playwright/HTTP — каждый шаг попадает в трассировку команды отдельным этапом
+    def _resolve_url(self, url: str) -> str:
+        return self.url_rewriter(url) if self.url_rewriter else url
+
+    async def _goto(self, page: Page, url: str, **kwargs):
+        with span("page.goto"):
+            return await page.goto(self._resolve_url(url), **kwargs)
+
+    async def _wait_for_selector(self, page: Page, selector: str, **kwargs):
+        with span("page.wait_for_selector"):
+            return await page.wait_for_selector(selector, **kwargs)
+
+    async def _pause(self, page: Page, timeout_ms: int) -> None:
+        with span("page.sleep"):
+            await page.wait_for_timeout(timeout_ms)
+
+    def _http_get(self, url: str) -> requests.Response:
+        with span("http.get"):
+            return requests.get(self._resolve_url(url), timeout=config.HTTP_TIMEOUT)
 
     # ------------------------------------------------------
     # 2. Логика CBR (сегодня / завтра, fallback)
     # ------------------------------------------------------
     def update_cbr_rates_for(self, char_code: str) -> None:
         """
-        Обновляет для выбранной валюты (USD/EUR/CNY) today_rate, tomorrow_rate и last_cbr_rate.
+        Обновляет для выбранной валюты (любой CharCode ЦБ) today_rate, tomorrow_rate и last_cbr_rate.
         Принцип:
           - Если в XML есть курс на сегодня, пишем в today_rate + last_cbr_rate
           - Если не совпадает — today_rate=None, last_cbr_rate = (что бы ни пришло)
@@ -118,7 +209,7 @@ class ParserService:
         else:
             currency_data["tomorrow_rate"] = None
 
-    def get_cbr_today_rate(self, char_code: str) -> Optional[str]:
+    def get_cbr_today_rate(self, char_code: str) -> Optional[Quote]:
         """
         Возвращает курс на сегодня, если есть; иначе — fallback на last_cbr_rate.
         """
@@ -132,7 +223,7 @@ class ParserService:
         else:
             return None
 
-    def get_cbr_tomorrow_rate(self, char_code: str) -> Optional[str]:
+    def get_cbr_tomorrow_rate(self, char_code: str) -> Optional[Quote]:
         """
         Возвращает курс на завтра, если есть. Иначе None.
         """
@@ -141,30 +232,21 @@ class ParserService:
             return None
         return currency_data["tomorrow_rate"]
 
-    def _get_cbr_data_dict(self, char_code: str) -> Optional[Dict[str, Optional[str]]]:
+    def _get_cbr_data_dict(self, char_code: str) -> Optional[Dict[str, Optional[Quote]]]:
         """
         Вспомогательный метод, возвращающий ссылку на словарь CBR-данных
-        для выбранного CharCode ('USD', 'EUR', 'CNY').
-        """
-        if char_code.upper() == "USD":
-            return self.usd_cbr_data
-        elif char_code.upper() == "EUR":
-            return self.eur_cbr_data
-        elif char_code.upper() == "CNY":
-            return self.cny_cbr_data
-        else:
+        для выбранного CharCode ('USD', 'EUR', 'HKD', ...).
+        """
+        if not char_code:
             return None
+        return self.cbr_data.setdefault(
+            char_code.upper(), {"today_rate": None, "tomorrow_rate": None, "last_cbr_rate": None}
+        )
 
-    def _get_cbr_xml_rate(
-            self,
-            char_code: str,
-            date: Optional[datetime.date] = None
-    ) -> Tuple[Optional[datetime.date], Optional[str]]:
+    @instrument_source("cbr")
+    def _fetch_cbr_xml(self, date: Optional[datetime.date] = None) -> Optional[bytes]:
         """
-        Запрашивает XML ЦБ (https://www.cbr.ru/scripts/XML_daily.asp).
-        Если date=None, берём сегодняшний.
-        Возвращает (xml_date, rate_str), где rate_str, например, '75,32'.
-        Если не найден — (None, None).
+        Загружает XML ЦБ (https://www.cbr.ru/scripts/XML_daily.asp) за дату; при ошибке — None.
         """
         try:
             if date:
@@ -173,208 +255,212 @@ class ParserService:
             else:
                 url = "https://www.cbr.ru/scripts/XML_daily.asp"
 
-            resp = requests.get(url)
+            resp = self._http_get(url)
             resp.raise_for_status()
-            root = ET.fromstring(resp.content)
-
-            xml_date_str = root.attrib.get("Date", None)
-            xml_date = None
-            if xml_date_str:
-                try:
-                    xml_date = datetime.datetime.strptime(xml_date_str, "%d.%m.%Y").date()
-                except:
-                    pass
-
-            val_str = None
-            for valute in root.findall("Valute"):
-                if valute.find("CharCode").text == char_code.upper():
-                    val_str = valute.find("Value").text
-                    break
-
-            return (xml_date, val_str)
+            note_bytes(len(resp.content))
+            return resp.content
         except Exception as e:
-            print(f"Ошибка при запросе CBR ({char_code}): {e}")
+            logger.warning(f"Ошибка при запросе CBR ({date}): {e}", extra={"source": "cbr"})
+            return None
+
+    def _get_cbr_xml_rate(
+            self,
+            char_code: str,
+            date: Optional[datetime.date] = None
+    ) -> Tuple[Optional[datetime.date], Optional[Quote]]:
+        """
+        Курс валюты из XML ЦБ за дату (None — сегодня) через индекс документов:
+        курсы всех валют за уже загруженную дату берутся из памяти, без запроса.
+        Возвращает (xml_date, quote) или (None, None), если ЦБ не ответил или валюты нет.
+        """
+        xml_date, rate = self.cbr_index.rate(char_code, date)
+        if rate is None:
             return (None, None)
+        return (xml_date, rate.value)
 
     # ------------------------------------------------------
     # 3. MOEX
     # ------------------------------------------------------
-    async def get_moex_rate(self, url: str, selector: str) -> Optional[str]:
+    @browser_job
+    @instrument_source("moex")
+    async def get_moex_rate(self, url: str, selector: str, pair: str = "USD/RUB") -> Optional[Quote]:
         """
         Простой метод для получения курса с MOEX, используя новый контекст.
         """
         try:
-            await self.init_browser()
-            context = await self.browser.new_context()
-            page = await context.new_page()
+            context, page = await self._new_page(use_proxy=False)
 
-            await page.goto(url, wait_until="domcontentloaded")
-            await page.wait_for_selector(selector, timeout=15000)
+            await self._goto(page, url, wait_until="domcontentloaded")
+            await self._wait_for_selector(page, selector, timeout=15000)
             moex_rate = await page.locator(selector).text_content()
 
             await context.close()
-            return moex_rate
+            return Quote.parse(moex_rate, pair, "moex")
         except Exception as e:
-            print(f"[get_moex_rate] Error: {e}")
+            logger.warning(f"[get_moex_rate] Error: {e}", extra={"source": "moex"})
             return None
 
     # ------------------------------------------------------
     # 4. PROFINANCE (с прокси)
     # ------------------------------------------------------
-    async def get_profinance_rate(self, url: str, selector: str) -> Optional[str]:
+    @browser_job
+    @instrument_source("profinance")
+    async def get_profinance_rate(self, url: str, selector: str, pair: str = "USD/RUB") -> Optional[Quote]:
         """
         Получение курса с ProFinance, используя случайный прокси в отдельном контексте.
         """
         try:
-            await self.init_browser()
-            chosen_proxy = random.choice(self.proxies)
-            context = await self.browser.new_context(proxy=chosen_proxy)
-            page = await context.new_page()
+            context, page = await self._new_page()
 
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_timeout(5000)  # Ждем для подгрузки динамического контента
-            await page.wait_for_selector(selector, state="visible", timeout=15000)
+            await self._goto(page, url, wait_until="domcontentloaded", timeout=60000)
+            await self._pause(page, 5000)  # Ждем для подгрузки динамического контента
+            await self._wait_for_selector(page, selector, state="visible", timeout=15000)
 
             rate_text = await page.locator(selector).text_content()
 
             await context.close()
-            return rate_text
+            return Quote.parse(rate_text, pair, "profinance")
         except Exception as e:
-            print(f"[get_profinance_rate] Error: {e}")
+            logger.warning(f"[get_profinance_rate] Error: {e}", extra={"source": "profinance"})
             return None
 
     # ------------------------------------------------------
     # 5. ABCEX (используется только для USD) — requests
     # ------------------------------------------------------
-    def get_abcex_rate(self, url: str) -> Optional[str]:
+    @instrument_source("abcex")
+    def get_abcex_rate(self, url: str, pair: str = "USDT/RUB") -> Optional[Quote]:
         """
         Получаем курс (первый bid price) с ABCEX в формате JSON.
         Пример URL:
           "https://abcex.io/api/v1/exchange/public/market-data/order-book/depth?marketId=USDTRUB&lang=ru"
         """
         try:
-            resp = requests.get(url)
+            resp = self._http_get(url)
             resp.raise_for_status()
+            note_bytes(len(resp.content))
             data = resp.json()
             if "bid" in data and data["bid"]:
-                return str(data["bid"][0]["price"])
+                return Quote.parse(data["bid"][0]["price"], pair, "abcex")
             return None
         except Exception as e:
-            print(f"[get_abcex_rate] Ошибка: {e}")
+            logger.warning(f"[get_abcex_rate] Ошибка: {e}", extra={"source": "abcex"})
             return None
 
     # ------------------------------------------------------
     # 6. GARANTEX (requests), просто оставляем
     # ------------------------------------------------------
-    def get_garantex_rate(self, market: str) -> Optional[str]:
+    @instrument_source("garantex")
+    def get_garantex_rate(self, market: str, pair: str = "USDT/RUB") -> Optional[Quote]:
         try:
             url = f"https://garantex.org/api/v2/depth?market={market}"
-            resp = requests.get(url)
+            resp = self._http_get(url)
             resp.raise_for_status()
+            note_bytes(len(resp.content))
             data = resp.json()
 
             if "bids" in data and data["bids"]:
-                return str(data["bids"][0]["price"])
+                return Quote.parse(data["bids"][0]["price"], pair, "garantex")
             return None
         except Exception as e:
-            print(f"[get_garantex_rate] Error: {e}")
+            logger.warning(f"[get_garantex_rate] Error: {e}", extra={"source": "garantex"})
             return None
 
     # ------------------------------------------------------
     # 7. TRADING-VIEW
     # ------------------------------------------------------
-    async def get_tradingview_usd(self, url: str, selector: str) -> Optional[str]:
+    @browser_job
+    @instrument_source("tradingview")
+    async def get_tradingview_usd(self, url: str, selector: str, pair: str = "XAU/USD") -> Optional[Quote]:
         """
         Парсим TradingView, используя новый контекст и случайный прокси.
         """
         try:
-            await self.init_browser()
-            chosen_proxy = random.choice(self.proxies)
-            context = await self.browser.new_context(proxy=chosen_proxy)
-            page = await context.new_page()
+            context, page = await self._new_page()
 
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_selector(selector, state="visible", timeout=15000)
+            await self._goto(page, url, wait_until="domcontentloaded", timeout=60000)
+            await self._wait_for_selector(page, selector, state="visible", timeout=15000)
 
             rate_text = await page.locator(selector).text_content()
 
             await context.close()
-            return rate_text
+            return Quote.parse(rate_text, pair, "tradingview")
         except Exception as e:
-            print(f"[get_tradingview_usd] Error: {e}")
+            logger.warning(f"[get_tradingview_usd] Error: {e}", extra={"source": "tradingview"})
             return None
 
     # ------------------------------------------------------
     # 8. Парсеры XE (EUR, CNY) — используем общий браузер с отдельным контекстом
     # ------------------------------------------------------
-    async def get_xe_rate_euro_dollar(self) -> Optional[str]:
+    @browser_job
+    @instrument_source("xe")
+    async def get_xe_rate_euro_dollar(self) -> Optional[Quote]:
         """
         "1 EUR = X USD"
         """
         url = 'https://www.xe.com/currencyconverter/convert/?Amount=1&From=EUR&To=USD'
         xpath_selector = '//*[@id="__next"]/div/div[5]/div[2]/div[1]/div[1]/div/div[2]/div[3]/div/div[1]/div[1]/p[2]'
-        return await self.fetch_rate(url, xpath_selector, is_xpath=True)
+        return await self.fetch_rate(url, xpath_selector, is_xpath=True, pair="EUR/USD")
 
-    async def get_xe_rate_dollar_euro(self) -> Optional[str]:
+    @browser_job
+    @instrument_source("xe")
+    async def get_xe_rate_dollar_euro(self) -> Optional[Quote]:
         """
         "1 USD = X EUR"
         """
         url = 'https://www.xe.com/currencyconverter/convert/?Amount=1&From=USD&To=EUR'
         xpath_selector = '//*[@id="__next"]/div/div[5]/div[2]/div[1]/div[1]/div/div[2]/div[3]/div/div[1]/div[1]/p[2]'
-        return await self.fetch_rate(url, xpath_selector, is_xpath=True)
+        return await self.fetch_rate(url, xpath_selector, is_xpath=True, pair="USD/EUR")
 
-    async def get_xe_rate_yuan_usd(self) -> Optional[str]:
+    @browser_job
+    @instrument_source("xe")
+    async def get_xe_rate_yuan_usd(self) -> Optional[Quote]:
         """
         "1 CNY = X USD"
         """
         url = 'https://www.xe.com/currencyconverter/convert/?Amount=1&From=CNY&To=USD'
         xpath_selector = '//*[@id="__next"]/div/div[5]/div[2]/div[1]/div[1]/div/div[2]/div[3]/div/div[1]/div[1]/p[2]'
-        return await self.fetch_rate(url, xpath_selector, is_xpath=True)
+        return await self.fetch_rate(url, xpath_selector, is_xpath=True, pair="CNY/USD")
 
-    async def get_xe_rate_usd_yuan(self) -> Optional[str]:
+    @browser_job
+    @instrument_source("xe")
+    async def get_xe_rate_usd_yuan(self) -> Optional[Quote]:
         """
         "1 USD = X CNY"
         """
         url = 'https://www.xe.com/currencyconverter/convert/?Amount=1&From=USD&To=CNY'
         xpath_selector = '//*[@id="__next"]/div/div[5]/div[2]/div[1]/div[1]/div/div[2]/div[3]/div/div[1]/div[1]/p[2]'
-        return await self.fetch_rate(url, xpath_selector, is_xpath=True)
+        return await self.fetch_rate(url, xpath_selector, is_xpath=True, pair="USD/CNY")
 
     # ------------------------------------------------------
     # 9. Grinex (USD USDT/RUB)
     # ------------------------------------------------------
-    async def get_grinex_usd_rate(self) -> Optional[str]:
+    @browser_job
+    @instrument_source("grinex")
+    async def get_grinex_usd_rate(self) -> Optional[Quote]:
         """
         Получает курс с сайта Grinex для USD (USDT/RUB).
         Перед получением курса производится клик по ссылке "#usdta7a5_tab" для переключения вкладки.
-        Если появляется модальное окно (с id "privacy-agree-modal"), пытаемся его закрыть:
-          - Если есть кнопка закрытия, кликаем по ней;
-          - Иначе нажимаем Escape.
+        Модальное окно согласия ("privacy-agree-modal") закрывается один раз и запоминается в сохранённом
+        состоянии сайта; если оно всё же видно, закрываем кнопкой, иначе — Escape.
         Затем ждём появления нужного элемента (до 30 секунд) и извлекаем текст.
         """
         selector = "#order_book_holder > div:nth-child(2) > div.bid_orders_panel > table > tbody > tr:nth-child(1) > td.price.col-xs-8.overflow-aut > div"
         try:
-            await self.init_browser()
-            chosen_proxy = random.choice(self.proxies)
-            context = await self.browser.new_context(proxy=chosen_proxy)
-            page = await context.new_page()
+            context, page, restored = await self._new_site_page("grinex")
             url = "https://grinex.io/trading/usdta7a5"
 
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_timeout(5000)  # Доп. ожидание загрузки контента
-
-            close_btn = page.locator("#privacy-agree-modal button[data-action='click->dialog#closeOutside']")
+            await self._goto(page, url, wait_until="domcontentloaded", timeout=60000)
+            await self._pause(page, 5000)  # Доп. ожидание загрузки контента
 
-            if await close_btn.count() > 0:
-                await close_btn.first.click(timeout=5000)
-            else:
+            await self._accept_consent("grinex", context, page, restored)
+            if await page.locator("#privacy-agree-modal").is_visible():
                 await page.keyboard.press("Escape")
+                await self._wait_for_selector(page, "#privacy-agree-modal", state="hidden", timeout=5000)
 
-            await page.wait_for_selector("#privacy-agree-modal", state="hidden", timeout=5000)
-
-            await page.wait_for_timeout(2000)
+            await self._pause(page, 2000)
 
             await page.click("#usdta7a5_tab", timeout=30000)
-            await page.wait_for_timeout(1000)
+            await self._pause(page, 1000)
 
             # Второй элемент
             element = page.locator(selector).nth(0)
@@ -382,10 +468,9 @@ class ParserService:
             text = await element.text_content()
             await context.close()
 
-            value = re.sub(r'[^0-9.,]', '', text).replace(',', '.')
-            return value
+            return Quote.parse(text, "USDT/RUB", "grinex")
         except Exception as e:
-            print(f"[get_grinex_usd_rate] Error: {e}")
+            logger.warning(f"[get_grinex_usd_rate] Error: {e}", extra={"source": "grinex"})
             return None
 
     # ------------------------------------------------------
@@ -403,40 +488,37 @@ class ParserService:
     # ------------------------------------------------------
     # 11. Универсальная fetch_rate (для XE и т.п.)
     # ------------------------------------------------------
-    async def fetch_rate(self, url, selector, is_xpath=False) -> Optional[str]:
+    async def fetch_rate(self, url, selector, is_xpath=False, pair: str = "") -> Optional[Quote]:
         """
         Переход на страницу url, ожидание по селектору (CSS или XPath) и извлечение inner_text().
         Берём случайный прокси для каждого запроса. Три попытки (повторяем при ошибках).
         """
         for attempt in range(3):
             try:
-                await self.init_browser()
-                chosen_proxy = random.choice(self.proxies)
-                context = await self.browser.new_context(proxy=chosen_proxy)
-                page = await context.new_page()
+                context, page, restored = await self._new_site_page("xe")
 
-                await page.goto(url)
-                await page.wait_for_timeout(5000)
+                await self._goto(page, url)
+                await self._accept_consent("xe", context, page, restored)
+                await self._pause(page, 5000)
 
                 if is_xpath:
-                    await page.wait_for_selector(f"xpath={selector}", timeout=10000)
+                    await self._wait_for_selector(page, f"xpath={selector}", timeout=10000)
                     rate_element = await page.query_selector(f"xpath={selector}")
                 else:
-                    await page.wait_for_selector(selector, timeout=10000)
+                    await self._wait_for_selector(page, selector, timeout=10000)
                     rate_element = await page.query_selector(selector)
 
                 if rate_element:
                     rate_text = await rate_element.inner_text()
-                    rate_clean = re.sub(r'[^0-9.,]', '', rate_text).replace(',', '.')
                     await context.close()
-                    return rate_clean
+                    return Quote.parse(rate_text, pair, "xe")
                 else:
-                    print(f"Курс не найден по селектору: {selector}")
+                    logger.warning(f"Курс не найден по селектору: {selector}", extra={"source": "xe"})
                     await context.close()
                     return None
 
             except Exception as e:
-                print(f"Ошибка при получении курса (попытка {attempt + 1}/3): {str(e)}")
+                logger.warning(f"Ошибка при получении курса: {e}", extra={"source": "xe", "attempt": f"{attempt + 1}/3"})
                 await asyncio.sleep(2)
 
         return None
@@ -0,0 +1,92 @@
+import re
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional
+
+# Всё, кроме цифр, разделителей и минуса (пробелы, неразрывные пробелы, валюта, «%» и т.п.)
+_NOT_RATE_CHARS = re.compile(r"[^0-9.,\-]")
+
+
+def parse_rate(raw: Any) -> Optional[Decimal]:
+    """
+    Разбор курса из текста источника в Decimal:
+      "75,32" -> 75.32, " 81.7250 " -> 81.7250, "1 234,5" -> 1234.5,
+      "1,234.56" / "1.234,56" -> 1234.56, "1.0843 US Dollars" -> 1.0843, "−0,5" -> -0.5.
+    Если оба разделителя есть — десятичный тот, что правее. Не число — None.
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, Decimal):
+        return raw
+    if isinstance(raw, (int, float)):
+        value = Decimal(str(raw))
+        return value if value.is_finite() else None
+
+    # Типографский минус (U+2212) — тот же знак, иначе он вырезается вместе с прочими символами
+    text = _NOT_RATE_CHARS.sub("", str(raw).replace("\u2212", "-"))
+    if not text:
+        return None
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif text.count(",") == 1:
+        text = text.replace(",", ".")
+    elif text.count(",") > 1 or text.count(".") > 1:
+        # Только разделители тысяч: "1,234,567" / "1.234.567"
+        text = text.replace(",", "").replace(".", "")
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+class Quote:
+    """
+    Котировка одного источника: значение (Decimal), пара ("USD/RUB"), источник,
+    момент получения (unix time) и длительность запроса к источнику в секундах.
+    Текст источника разбирается один раз при получении (Quote.parse),
+    дальше кеш, сравнение, уведомления и расчёты работают с числом.
+    """
+    __slots__ = ("value", "pair", "source", "fetched_at", "latency")
+
+    def __init__(
+        self,
+        value: Decimal,
+        pair: str,
+        source: str,
+        fetched_at: Optional[float] = None,
+        latency: Optional[float] = None
+    ) -> None:
+        self.value = value
+        self.pair = pair
+        self.source = source
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.latency = latency
+
+    @classmethod
+    def parse(cls, raw: Any, pair: str, source: str, latency: Optional[float] = None) -> Optional["Quote"]:
+        value = parse_rate(raw)
+        if value is None:
+            return None
+        return cls(value, pair, source, latency=latency)
+
+    def __float__(self) -> float:
+        return float(self.value)
+
+    def __str__(self) -> str:
+        # Как в источнике, без экспоненты: 81.5432, 2345.10
+        return format(self.value, "f")
+
+    def __repr__(self) -> str:
+        return f"Quote({self.source} {self.pair} {self.value})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Quote):
+            return NotImplemented
+        return (self.value, self.pair, self.source) == (other.value, other.pair, other.source)
+
+    def __hash__(self) -> int:
+        return hash((self.value, self.pair, self.source))
@@ -0,0 +1,186 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from services.quote import Quote
+
+logger = logging.getLogger(__name__)
+
+# Файл фиксированного размера, отображённый в память (mmap):
+#   заголовок | слот 0 | слот 1 | ...
+# Слот — последние DEPTH котировок одной пары (источник, пара) в кольцевом буфере.
+# Пишет один процесс (бот), читают любые локальные процессы без блокировок:
+# каждый слот защищён счётчиком версии (seqlock) — нечётный, пока идёт запись;
+# читатель повторяет чтение, если счётчик нечётный или изменился за время чтения.
+MAGIC = b"QBRD"
+VERSION = 1
+DEFAULT_SLOTS = 128
+DEFAULT_DEPTH = 16
+
+# magic, версия, число слотов, глубина кольца, занято слотов
+_HEADER = struct.Struct("<4sIIII")
+HEADER_SIZE = 64
+# версия (seqlock), источник, пара, всего записей в слоте
+_SLOT_HEAD = struct.Struct("<Q16s16sQ")
+# значение, время получения (unix time), длительность запроса (NaN — неизвестна)
+_ENTRY = struct.Struct("<ddd")
+_USED_OFFSET = 16
+_READ_RETRIES = 100
+
+BoardKey = Tuple[str, str]
+
+
+def _slot_size(depth: int) -> int:
+    return _SLOT_HEAD.size + depth * _ENTRY.size
+
+
+def _to_quote(source: str, pair: str, value: float, fetched_at: float, latency: float) -> Quote:
+    # repr float — кратчайшая запись: 81.5432, а не 81.543199999...
+    return Quote(Decimal(repr(value)), pair, source, fetched_at, None if math.isnan(latency) else latency)
+
+
+class QuoteBoardWriter:
+    """
+    Единственный писатель доски котировок. Подписывается на общий снимок курсов (on_quote).
+    При открытии файл создаётся заново и атомарно подменяет прежний (os.replace):
+    читатели прошлого запуска дочитывают старый файл без ошибок и видят новый после переоткрытия.
+    """
+
+    def __init__(self, path: str, slots: int = DEFAULT_SLOTS, depth: int = DEFAULT_DEPTH) -> None:
+        self.path = path
+        self.slots = slots
+        self.depth = depth
+        self._slot_size = _slot_size(depth)
+        self._index: Dict[BoardKey, int] = {}
+        self._full_warned = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = HEADER_SIZE + slots * self._slot_size
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, slots, depth, 0))
+            f.truncate(size)
+        os.replace(tmp_path, path)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def _slot_for(self, source: str, pair: str) -> Optional[int]:
+        key = (source, pair)
+        index = self._index.get(key)
+        if index is not None:
+            return index
+        if len(self._index) >= self.slots:
+            if not self._full_warned:
+                logger.warning(f"Доска котировок заполнена ({self.slots} слотов), {source} {pair} не записан")
+                self._full_warned = True
+            return None
+        index = len(self._index)
+        _SLOT_HEAD.pack_into(self._mm, HEADER_SIZE + index * self._slot_size,
+                             0, source.encode()[:16], pair.encode()[:16], 0)
+        self._index[key] = index
+        # Слот становится виден читателям только после записи ключа
+        struct.pack_into("<I", self._mm, _USED_OFFSET, len(self._index))
+        return index
+
+    def write(self, source: str, quote: Quote) -> None:
+        index = self._slot_for(source, quote.pair)
+        if index is None:
+            return
+        offset = HEADER_SIZE + index * self._slot_size
+        seq, _, _, count = _SLOT_HEAD.unpack_from(self._mm, offset)
+        struct.pack_into("<Q", self._mm, offset, seq + 1)
+        _ENTRY.pack_into(
+            self._mm, offset + _SLOT_HEAD.size + (count % self.depth) * _ENTRY.size,
+            float(quote.value), quote.fetched_at, math.nan if quote.latency is None else quote.latency
+        )
+        struct.pack_into("<Q", self._mm, offset + _SLOT_HEAD.size - 8, count + 1)
+        struct.pack_into("<Q", self._mm, offset, seq + 2)
+
+    def on_quote(self, currency: str, source: str, values: Dict[str, Optional[Quote]]) -> None:
+        """
+        Подписчик RatesSnapshot. Ключ — (источник, пара); у ЦБ два поля одной пары,
+        поэтому для них источником служит имя поля (cbr_today / cbr_tomorrow).
+        """
+        for field, quote in values.items():
+            if quote is not None:
+                self.write(field if field.startswith(quote.source) else quote.source, quote)
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+class QuoteBoardReader:
+    """
+    Читатель доски котировок (любой процесс). Ничего не блокирует и не копирует файл целиком:
+    чтение одной котировки — несколько struct.unpack_from по отображённой памяти.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, self.depth, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: не файл доски котировок")
+        self._slot_size = _slot_size(self.depth)
+        # Ключ слота пишется один раз до публикации слота, поэтому его можно запомнить
+        self._keys: List[BoardKey] = []
+
+    def keys(self) -> List[BoardKey]:
+        used = min(self.slots, _HEADER.unpack_from(self._mm, 0)[4])
+        for index in range(len(self._keys), used):
+            _, source, pair, _ = _SLOT_HEAD.unpack_from(self._mm, HEADER_SIZE + index * self._slot_size)
+            self._keys.append((source.rstrip(b"\0").decode(), pair.rstrip(b"\0").decode()))
+        return self._keys
+
+    def _read_slot(self, index: int, last: int) -> List[Quote]:
+        source, pair = self._keys[index]
+        offset = HEADER_SIZE + index * self._slot_size
+        for _ in range(_READ_RETRIES):
+            seq, _, _, count = _SLOT_HEAD.unpack_from(self._mm, offset)
+            if seq & 1:
+                # Писатель посреди записи — уступаем ему процессор
+                time.sleep(0)
+                continue
+            entries = [
+                _ENTRY.unpack_from(self._mm, offset + _SLOT_HEAD.size + (n % self.depth) * _ENTRY.size)
+                for n in range(max(0, count - min(last, self.depth)), count)
+            ]
+            if _SLOT_HEAD.unpack_from(self._mm, offset)[0] == seq:
+                return [_to_quote(source, pair, *entry) for entry in entries]
+            time.sleep(0)
+        raise RuntimeError("Доска котировок: слот постоянно перезаписывается")
+
+    def latest(self) -> List[Quote]:
+        """
+        Последняя котировка каждой пары (источник, пара) в порядке первого появления.
+        """
+        quotes = []
+        for index in range(len(self.keys())):
+            quotes.extend(self._read_slot(index, 1))
+        return quotes
+
+    def history(self, source: str, pair: str, last: Optional[int] = None) -> List[Quote]:
+        """
+        До last (по умолчанию depth) последних котировок пары, от старых к новым.
+        """
+        key = (source, pair)
+        if key not in self._keys and key not in self.keys():
+            return []
+        return self._read_slot(self._keys.index(key), last or self.depth)
+
+    def get(self, source: str, pair: str) -> Optional[Quote]:
+        entries = self.history(source, pair, 1)
+        return entries[0] if entries else None
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
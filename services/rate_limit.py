@@ -0,0 +1,86 @@
+import math
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Корзина токенов: пополняется со скоростью rate токенов в секунду до capacity.
+    Запрос стоимостью cost проходит, если в корзине есть cost токенов.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def retry_after(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Через сколько секунд наберётся cost токенов; math.inf — корзина не пополняется (rate=0).
+        """
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+
+class UserRateLimiter:
+    """
+    Корзина токенов на каждого пользователя: не больше burst дорогих команд подряд,
+    дальше — per_minute в минуту. Полные корзины (пользователь давно ничего не запрашивал)
+    периодически удаляются, чтобы словарь не рос бесконечно.
+    """
+
+    def __init__(self, per_minute: float, burst: float, max_users: int = 10000) -> None:
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: Dict[int, TokenBucket] = {}
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                self._evict_idle()
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for user_id, bucket in list(self._buckets.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[user_id]
+
+    def try_acquire(self, user_id: int, cost: float = 1.0) -> bool:
+        if self.rate <= 0 and self.burst <= 0:
+            return True  # ограничение выключено
+        return self._bucket(user_id).try_take(cost)
+
+    def retry_after(self, user_id: int, cost: float = 1.0) -> float:
+        bucket = self._buckets.get(user_id)
+        return bucket.retry_after(cost) if bucket is not None else 0.0
+
+
+def retry_after_text(seconds: float) -> str:
+    """
+    Подсказка пользователю сверх лимита: когда можно повторить запрос.
+    """
+    if math.isinf(seconds):
+        return "Лимит запросов исчерпан."
+    return f"Повторить можно через {seconds:.0f} с."
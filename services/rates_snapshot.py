@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.quote import Quote
+
+logger = logging.getLogger(__name__)
+
+# Подписчик на новые значения: (валюта, источник, {поле: значение})
+QuoteListener = Callable[[str, str, Dict[str, Optional[Quote]]], None]
+
+# Сколько секунд значение источника считается свежим.
+# Источник здесь — это один запрос (например, CBR отдаёт сразу cbr_today и cbr_tomorrow).
+DEFAULT_SOURCE_TTL: Dict[str, int] = {
+    "cbr": 60 * 60,
+    "profinance": 60,
+    "profinance_calc": 60,  # ProFinance для /calculate (другой элемент страницы)
+    "garantex": 60,
+    "moex": 5 * 60,
+    "abcex": 60,
+    "grinex": 2 * 60,
+    "tradingview": 2 * 60,
+    "xe_direct": 5 * 60,
+    "xe_inverse": 5 * 60,
+}
+
+
+class RatesSnapshot:
+    """
+    Общий (на весь бот) снимок последних полученных курсов.
+    Для каждой валюты (USD/EUR/CNY) и каждого источника хранит:
+      - значения полей build_currency_table (profinance, moex, cbr_today, ...)
+      - момент получения (time.monotonic()), по которому считается TTL
+    Позволяет мгновенно перерисовать таблицу из кеша и обновить в фоне только устаревшие источники.
+    """
+
+    def __init__(self, ttl: Optional[Dict[str, int]] = None) -> None:
+        self.ttl: Dict[str, int] = dict(DEFAULT_SOURCE_TTL)
+        if ttl:
+            self.ttl.update(ttl)
+
+        # currency -> source -> (fetched_at, {field: value})
+        self._data: Dict[str, Dict[str, Tuple[float, Dict[str, Optional[Quote]]]]] = {}
+        # currency -> фоновая задача обновления (чтобы не запускать несколько параллельно)
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        # (currency, source) -> идущий запрос источника (общий для всех ожидающих)
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._listeners: List[QuoteListener] = []
+
+    def add_listener(self, listener: QuoteListener) -> None:
+        """
+        listener вызывается синхронно на каждое сохранённое значение источника
+        (история котировок, монитор спредов). Он должен быть быстрым и не бросать исключений.
+        """
+        self._listeners.append(listener)
+
+    def update(self, currency: str, source: str, values: Dict[str, Optional[Quote]]) -> None:
+        """
+        Сохраняет результат источника. Если все значения пустые (ошибка парсинга),
+        прежние данные не затираем — источник останется устаревшим и будет запрошен снова.
+        """
+        if not any(v is not None for v in values.values()):
+            return
+        self._data.setdefault(currency.upper(), {})[source] = (time.monotonic(), dict(values))
+        for listener in self._listeners:
+            try:
+                listener(currency.upper(), source, values)
+            except Exception:
+                logger.exception(f"Ошибка подписчика котировок ({currency} {source})")
+
+    def values(self, currency: str) -> Dict[str, Optional[Quote]]:
+        """
+        Возвращает все сохранённые поля по валюте одним словарём.
+        """
+        merged: Dict[str, Optional[Quote]] = {}
+        for _, source_values in self._data.get(currency.upper(), {}).values():
+            merged.update(source_values)
+        return merged
+
+    def get(self, currency: str, source: str) -> Optional[Tuple[float, Dict[str, Optional[Quote]]]]:
+        """
+        Последний результат источника: (возраст в секундах, {поле: значение}) или None.
+        """
+        entry = self._data.get(currency.upper(), {}).get(source)
+        if entry is None:
+            return None
+        fetched_at, source_values = entry
+        return time.monotonic() - fetched_at, source_values
+
+    def is_stale(self, currency: str, source: str) -> bool:
+        entry = self._data.get(currency.upper(), {}).get(source)
+        if entry is None:
+            return True
+        fetched_at, _ = entry
+        return time.monotonic() - fetched_at > self.ttl.get(source, 0)
+
+    def stale_sources(self, currency: str, sources: List[str]) -> List[str]:
+        return [source for source in sources if self.is_stale(currency, source)]
+
+    async def fetch_shared(
+        self,
+        currency: str,
+        source: str,
+        fetch: Callable[[], Awaitable[Dict[str, Optional[Quote]]]]
+    ) -> Dict[str, Optional[Quote]]:
+        """
+        Запрашивает источник и сохраняет результат в снимок.
+        Если запрос этого источника уже идёт, новый не запускается — ждём результат текущего.
+        """
+        key = (currency.upper(), source)
+        task = self._inflight.get(key)
+        if task is None:
+            async def run() -> Dict[str, Optional[Quote]]:
+                try:
+                    values = await fetch()
+                    self.update(currency, source, values)
+                    return values
+                finally:
+                    self._inflight.pop(key, None)
+
+            task = asyncio.create_task(run())
+            self._inflight[key] = task
+        # shield: отмена одного ожидающего не должна отменять запрос для остальных
+        return await asyncio.shield(task)
+
+    def is_refreshing(self, currency: str) -> bool:
+        task = self._refresh_tasks.get(currency.upper())
+        return task is not None and not task.done()
+
+    def start_refresh(self, currency: str, refresh: Callable[[], Awaitable[None]]) -> bool:
+        """
+        Запускает фоновое обновление для валюты, если оно ещё не идёт.
+        Возвращает True, если была создана новая задача.
+        """
+        currency = currency.upper()
+        if self.is_refreshing(currency):
+            return False
+        self._refresh_tasks[currency] = asyncio.create_task(refresh())
+        return True
@@ -1,94 +1,158 @@
+import asyncio
 import io
 import sqlite3
 from datetime import datetime, date
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from db.requests_database import (
-    init_requests_db,
-    log_request,
+    REQUESTS_DB_PATH,
     get_requests_count_today,
-    get_all_requests,
+    get_latest_requests_today,
     get_total_requests_count,
-    get_unique_users_count
+    get_unique_users_count,
+    get_last_request_id,
+    get_daily_stats,
+    get_command_totals,
+    iter_requests_desc
 )
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from tabulate import tabulate
-
 from aiogram.types import BufferedInputFile
 
-def generate_stats_table_today() -> str:
+# ReportLab и tabulate импортируются при первом использовании (внутри функций):
+# они нужны только админским командам и заметно удлиняют старт бота.
+
+# Сколько последних запросов за сегодня показывать в /stats_today (сообщение Telegram — до 4096 символов)
+STATS_TODAY_ROWS = 30
+
+async def generate_stats_table_today() -> Tuple[int, str]:
     """
-    Формирует текстовую таблицу (tabulate) для запросов за сегодня.
+    Число запросов за сегодня (из агрегата) и текстовая таблица (tabulate) последних STATS_TODAY_ROWS из них.
+    Время ответа не зависит от того, сколько запросов было за день.
     """
-    rows = _get_requests_rows_today()
+    from tabulate import tabulate
+
+    total = await get_requests_count_today()
+    rows = [(user_id, (text or "")[:40], day) for user_id, text, day in await get_latest_requests_today(STATS_TODAY_ROWS)]
     headers = ["User ID", "Text", "Date"]
     table_str = tabulate(rows, headers, tablefmt="pretty")
-    return table_str
+    return total, table_str
+
+# Сколько последних запросов выводить построчно в конце отчёта
+PDF_RECENT_REQUESTS = 1000
+# Строк в одной таблице ReportLab (много маленьких таблиц вёрстаются намного быстрее одной огромной)
+PDF_TABLE_CHUNK = 200
 
-def _get_requests_rows_today() -> List[Tuple[str, str, str]]:
-    # Вспомогательная функция
-    today_str = date.today().isoformat()
-    all_rows = get_all_requests()
-    # Фильтруем
-    today_rows = [row for row in all_rows if row[2] == today_str]
-    return today_rows
+def _table_style() -> list:
+    from reportlab.lib import colors
 
-def generate_full_stats_pdf() -> BufferedInputFile:
+    return [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+
+# ((дата, id последней строки лога), байты PDF): в PDF есть «запросы сегодня» — после полуночи он устаревает
+_pdf_cache: Optional[Tuple[Tuple[str, int], bytes]] = None
+_pdf_lock = asyncio.Lock()
+
+def _styled_table(data: List[list], style: list):
+    from reportlab.platypus import Table, TableStyle
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle(style))
+    return table
+
+def _build_stats_pdf(
+    summary: Dict[str, int],
+    daily: List[Tuple[str, int, int]],
+    commands: List[Tuple[str, int]],
+    last_id: int
+) -> bytes:
     """
-    Генерирует PDF со всей статистикой:
-    - Кол-во уникальных пользователей
-    - Кол-во запросов за сегодня
-    - Кол-во запросов за всё время
-    - Полная таблица запросов (user_id, text, date)
-    Возвращает файл в формате BufferedInputFile для отправки через aiogram.
+    Синхронная сборка PDF (выполняется в рабочем потоке):
+      1. сводка;
+      2. агрегаты по дням и по командам (из таблиц-агрегатов, а не из всего лога);
+      3. последние PDF_RECENT_REQUESTS запросов, прочитанные постранично своим соединением.
     """
-    rows = get_all_requests()
-    unique_users = get_unique_users_count()
-    requests_today = get_requests_count_today()
-    requests_total = get_total_requests_count()
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
 
     styles = getSampleStyleSheet()
+    table_style = _table_style()
     elements = []
 
     # Добавим обобщающую информацию
     summary_text = (
-        f"Unique users: {unique_users}\n"
-        f"Requests today: {requests_today}\n"
-        f"Requests total: {requests_total}\n"
+        f"Unique users: {summary['unique_users']}<br/>"
+        f"Requests today: {summary['requests_today']}<br/>"
+        f"Requests total: {summary['requests_total']}<br/>"
+        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
     )
     elements.append(Paragraph(summary_text, styles["Normal"]))
     elements.append(Spacer(1, 20))
 
-    # Таблица со всеми запросами
-    data = [["User ID", "Text", "Date"]]
-    if rows:
-        data += [list(row) for row in rows]
-    else:
-        data.append(["—", "Нет запросов", "—"])
+    # По дням
+    elements.append(Paragraph("Requests by day", styles["Heading2"]))
+    day_rows = [list(row) for row in daily] or [["—", 0, 0]]
+    for start in range(0, len(day_rows), PDF_TABLE_CHUNK):
+        elements.append(_styled_table([["Date", "Requests", "Users"]] + day_rows[start:start + PDF_TABLE_CHUNK], table_style))
+    elements.append(Spacer(1, 20))
 
-    table = Table(data)
-    style = TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-    ])
-    table.setStyle(style)
-    elements.append(table)
+    # По командам
+    elements.append(Paragraph("Requests by command", styles["Heading2"]))
+    command_rows = [[f"/{command}" if command else "(text)", count] for command, count in commands] or [["—", 0]]
+    elements.append(_styled_table([["Command", "Requests"]] + command_rows, table_style))
+    elements.append(Spacer(1, 20))
+
+    # Последние запросы — читаем страницами, в памяти только текущая страница
+    elements.append(Paragraph(f"Last {PDF_RECENT_REQUESTS} requests", styles["Heading2"]))
+    conn = sqlite3.connect(f"file:{REQUESTS_DB_PATH}?mode=ro", uri=True)
+    try:
+        has_rows = False
+        for page in iter_requests_desc(conn, last_id, PDF_RECENT_REQUESTS, page_size=PDF_TABLE_CHUNK):
+            has_rows = True
+            data = [["User ID", "Text", "Date"]] + [[user_id, (text or "")[:60], day] for _, user_id, text, day in page]
+            elements.append(_styled_table(data, table_style))
+        if not has_rows:
+            elements.append(_styled_table([["User ID", "Text", "Date"], ["—", "Нет запросов", "—"]], table_style))
+    finally:
+        conn.close()
 
     doc.build(elements)
-    buffer.seek(0)
+    return buffer.getvalue()
+
+async def generate_full_stats_pdf() -> BufferedInputFile:
+    """
+    Генерирует PDF со статистикой:
+    - Кол-во уникальных пользователей
+    - Кол-во запросов за сегодня / за всё время
+    - Агрегаты по дням и по командам
+    - Последние запросы (user_id, text, date)
+    Сборка идёт в рабочем потоке; готовый PDF кешируется до появления новой строки в логе или смены дня.
+    Возвращает файл в формате BufferedInputFile для отправки через aiogram.
+    """
+    global _pdf_cache
+
+    async with _pdf_lock:
+        last_id = await get_last_request_id()
+        cache_key = (date.today().isoformat(), last_id)
+        if _pdf_cache is None or _pdf_cache[0] != cache_key:
+            summary = {
+                "unique_users": await get_unique_users_count(),
+                "requests_today": await get_requests_count_today(),
+                "requests_total": await get_total_requests_count(),
+            }
+            daily = await get_daily_stats()
+            commands = await get_command_totals()
+            pdf_bytes = await asyncio.to_thread(_build_stats_pdf, summary, daily, commands, last_id)
+            _pdf_cache = (cache_key, pdf_bytes)
 
-    pdf_file = BufferedInputFile(file=buffer.getvalue(), filename="full_stats.pdf")
-    return pdf_file
+    return BufferedInputFile(file=_pdf_cache[1], filename="full_stats.pdf")
@@ -0,0 +1,163 @@
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from services.quote import Quote
+
+logger = logging.getLogger(__name__)
+
+# Поля снимка курсов, которые можно сравнивать между собой (все — рубли за единицу валюты).
+# Для EUR/CNY в полях abcex/grinex лежат кросс-курсы XE, поэтому их там нет;
+# TradingView (золото) не сравнивается ни с чем.
+COMPARABLE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "USD": ("investing", "cbr_today", "profinance", "moex", "abcex", "grinex", "garantex"),
+    "EUR": ("investing", "cbr_today", "profinance", "moex"),
+    "CNY": ("investing", "cbr_today", "profinance", "moex"),
+}
+
+FIELD_LABELS: Dict[str, str] = {
+    "investing": "Investing",
+    "cbr_today": "CBR",
+    "profinance": "ProFinance",
+    "moex": "MOEX",
+    "abcex": "ABCEX",
+    "grinex": "Grinex",
+    "garantex": "Garantex",
+}
+
+
+class SpreadAlert(NamedTuple):
+    currency: str
+    high: str  # поле с большим курсом
+    low: str
+    spread_pct: float  # (high - low) / low * 100
+    high_value: float
+    low_value: float
+
+
+SpreadHook = Callable[[SpreadAlert], None]
+
+
+class _Hook(NamedTuple):
+    threshold_pct: float
+    callback: SpreadHook
+
+
+class SpreadMonitor:
+    """
+    Живая матрица попарных спредов между источниками по каждой валюте.
+    Подписывается на общий снимок курсов: при новом значении одного поля пересчитываются
+    только его строка и столбец (O(число источников)), а не вся матрица.
+    Значения старше max_age секунд в спредах не участвуют.
+
+    Хуки порогов срабатывают по фронту: один раз, когда |спред| пары превысил порог,
+    и снова — только после того, как спред опустился ниже порога.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, Sequence[str]]] = None, max_age: float = 15 * 60) -> None:
+        self.fields = {currency: tuple(names) for currency, names in (fields or COMPARABLE_FIELDS).items()}
+        self.max_age = max_age
+        # currency -> field -> (значение, time.time() получения)
+        self._quotes: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        # currency -> field -> other -> спред field к other, %
+        self._matrix: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._hooks: List[_Hook] = []
+        # (индекс хука, валюта, пара полей по алфавиту) — пары, по которым хук уже сработал
+        self._active: Set[Tuple[int, str, Tuple[str, str]]] = set()
+
+    def add_hook(self, threshold_pct: float, callback: SpreadHook) -> None:
+        self._hooks.append(_Hook(threshold_pct, callback))
+
+    def on_quote(self, currency: str, source: str, values: Dict[str, Optional[Quote]]) -> None:
+        """
+        Подписчик RatesSnapshot.
+        """
+        comparable = self.fields.get(currency.upper(), ())
+        for field, quote in values.items():
+            if field in comparable and quote is not None and quote.value > 0:
+                self.update(currency.upper(), field, float(quote.value), now=quote.fetched_at)
+
+    def update(self, currency: str, field: str, value: float, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        quotes = self._quotes.setdefault(currency, {})
+        matrix = self._matrix.setdefault(currency, {})
+        quotes[field] = (value, now)
+        row = matrix.setdefault(field, {})
+        for other, (other_value, fetched_at) in quotes.items():
+            if other == field:
+                continue
+            if now - fetched_at > self.max_age:
+                # Устаревшее значение — убираем пару из матрицы до его обновления
+                row.pop(other, None)
+                matrix.setdefault(other, {}).pop(field, None)
+                continue
+            row[other] = (value - other_value) / other_value * 100
+            matrix.setdefault(other, {})[field] = (other_value - value) / value * 100
+            self._check_hooks(currency, field, value, other, other_value)
+
+    def _check_hooks(self, currency: str, field: str, value: float, other: str, other_value: float) -> None:
+        if not self._hooks:
+            return
+        high, low = (field, other) if value >= other_value else (other, field)
+        high_value, low_value = max(value, other_value), min(value, other_value)
+        spread = (high_value - low_value) / low_value * 100
+        pair = tuple(sorted((field, other)))
+        for index, hook in enumerate(self._hooks):
+            key = (index, currency, pair)
+            if spread >= hook.threshold_pct:
+                if key in self._active:
+                    continue
+                self._active.add(key)
+                try:
+                    hook.callback(SpreadAlert(currency, high, low, spread, high_value, low_value))
+                except Exception:
+                    logger.exception("Ошибка хука спредов")
+            else:
+                self._active.discard(key)
+
+    def fresh_quotes(self, currency: str, now: Optional[float] = None) -> Dict[str, Tuple[float, float]]:
+        """
+        Актуальные значения: {поле: (значение, возраст в секундах)} в порядке COMPARABLE_FIELDS.
+        """
+        now = time.time() if now is None else now
+        quotes = self._quotes.get(currency.upper(), {})
+        return {
+            field: (quotes[field][0], now - quotes[field][1])
+            for field in self.fields.get(currency.upper(), ())
+            if field in quotes and now - quotes[field][1] <= self.max_age
+        }
+
+    def matrix(self, currency: str) -> Tuple[List[str], List[List[Optional[float]]]]:
+        """
+        (поля, строки матрицы); matrix[i][j] — спред поля i к полю j в %, None — нет пары.
+        """
+        fields = list(self.fresh_quotes(currency))
+        rows = self._matrix.get(currency.upper(), {})
+        return fields, [
+            [None if a == b else rows.get(a, {}).get(b) for b in fields]
+            for a in fields
+        ]
+
+    def top_spreads(self, currency: str, count: int = 5) -> List[SpreadAlert]:
+        """
+        Наибольшие спреды среди актуальных значений.
+        """
+        fresh = self.fresh_quotes(currency)
+        names = list(fresh)
+        pairs = []
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                (high, high_value), (low, low_value) = sorted(
+                    ((a, fresh[a][0]), (b, fresh[b][0])), key=lambda item: item[1], reverse=True
+                )
+                pairs.append(SpreadAlert(currency.upper(), high, low,
+                                         (high_value - low_value) / low_value * 100, high_value, low_value))
+        pairs.sort(key=lambda alert: alert.spread_pct, reverse=True)
+        return pairs[:count]
+
+
+def format_spread_alert(alert: SpreadAlert) -> str:
+    return (
+        f"{alert.currency}: {FIELD_LABELS.get(alert.high, alert.high)} {alert.high_value:g} выше "
+        f"{FIELD_LABELS.get(alert.low, alert.low)} {alert.low_value:g} на {alert.spread_pct:.2f}%"
+    )
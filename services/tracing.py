@@ -0,0 +1,163 @@
+import contextlib
+import contextvars
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from typing import Deque, Iterator, List, Optional
+
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    Один этап обработки команды (например, "source.profinance" или "page.goto").
+    """
+    __slots__ = ("name", "start", "end", "children")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Trace:
+    """
+    Дерево этапов одного вызова команды.
+    """
+    __slots__ = ("trace_id", "user_id", "root", "started_at")
+
+    def __init__(self, name: str, user_id: Optional[int] = None) -> None:
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.user_id = user_id
+        self.root = Span(name)
+        self.started_at = time.time()
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Лёгкая трассировка команд: вложенные span'ы в пределах одного вызова (через contextvars).
+    Трассируется только доля вызовов sample_rate; медленные (>= slow_threshold секунд)
+    сохраняются в кольцевой буфер для админской команды /traces.
+    Если вызов не попал в выборку, span() ничего не делает, кроме одного обращения к ContextVar.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, slow_threshold: float = 5.0, keep: int = 50) -> None:
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.slow_traces: Deque[Trace] = deque(maxlen=keep)
+
+    @contextlib.contextmanager
+    def trace(self, name: str, user_id: Optional[int] = None) -> Iterator[Optional[Trace]]:
+        if _current_trace.get() is not None or random.random() >= self.sample_rate:
+            yield None
+            return
+
+        trace = Trace(name, user_id)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        finally:
+            trace.root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if trace.root.duration >= self.slow_threshold:
+                self.slow_traces.append(trace)
+                logger.info(f"Медленный запрос {name}: {trace.root.duration * 1000:.0f} мс (trace_id={trace.trace_id})")
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(name)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def last_slow(self, count: int) -> List[Trace]:
+        return list(self.slow_traces)[-count:][::-1]
+
+
+tracer = Tracer(
+    sample_rate=config.TRACE_SAMPLE_RATE,
+    slow_threshold=config.TRACE_SLOW_SECONDS,
+    keep=config.TRACE_KEEP,
+)
+
+
+def trace(name: str, user_id: Optional[int] = None):
+    return tracer.trace(name, user_id)
+
+
+def span(name: str):
+    return tracer.span(name)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_trace.get()
+    return current.trace_id if current is not None else None
+
+
+def format_trace(trace_obj: Trace) -> str:
+    """
+    Текстовое дерево этапов с длительностью в миллисекундах.
+    Последовательные одноимённые этапы (например, несколько page.sleep) схлопываются в строку «×N».
+    """
+    lines = [
+        f"{trace_obj.root.name} {trace_obj.root.duration * 1000:.0f} мс "
+        f"(trace_id={trace_obj.trace_id}, user={trace_obj.user_id}, "
+        f"{time.strftime('%d.%m %H:%M:%S', time.localtime(trace_obj.started_at))})"
+    ]
+
+    def walk(span_obj: Span, depth: int) -> None:
+        children = span_obj.children
+        i = 0
+        while i < len(children):
+            j = i
+            while j + 1 < len(children) and children[j + 1].name == children[i].name and not children[j + 1].children:
+                j += 1
+            group = children[i:j + 1]
+            total = sum(child.duration for child in group)
+            suffix = f" ×{len(group)}" if len(group) > 1 else ""
+            lines.append(f"{'  ' * depth}{group[0].name}{suffix} {total * 1000:.0f} мс")
+            if len(group) == 1:
+                walk(group[0], depth + 1)
+            i = j + 1
+
+    walk(trace_obj.root, 1)
+    return "\n".join(lines)
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Добавляет в каждую запись лога поле trace_id ("-" вне трассируемой команды)
+    и user_id пользователя трассируемой команды, если он не передан явно через extra.
+    Должен стоять на стороне, где пишется запись (до очереди логов): контекст — в этой корутине.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_trace.get()
+        record.trace_id = current.trace_id if current is not None else "-"
+        if getattr(record, "user_id", None) is None and current is not None and current.user_id is not None:
+            record.user_id = current.user_id
+        return True
@@ -1,5 +1,34 @@
 # services/updater_instance.py
+from services.browser_state import BrowserStateStore
 from services.investing_updater import InvestingUpdater
+from services.parser_service import ParserService
+from services.rate_limit import UserRateLimiter
+from services.rates_snapshot import RatesSnapshot
+from services.spread_monitor import SpreadMonitor
+from services.user_locks import UserLeaseRegistry
+from utils.config import config
+
+# Сохранённое состояние браузера по сайтам — общее для парсера и Investing
+browser_state = BrowserStateStore(config.BROWSER_STATE_DIR, ttl=config.BROWSER_STATE_TTL)
 
 # Здесь мы создаём единственный экземпляр:
-investing_updater = InvestingUpdater()
+investing_updater = InvestingUpdater(browser_state=browser_state)
+
+# Общий парсер источников: один кеш CBR и один браузер Chromium на весь бот
+parser_service = ParserService(browser_state=browser_state)
+
+# Общий снимок курсов (для кнопок «Обновить» / переключения валюты)
+rates_snapshot = RatesSnapshot()
+
+# Курсы Investing приходят из фоновой задачи — тоже кладём их в общий снимок
+investing_updater.on_rate = lambda currency, value: rates_snapshot.update(currency, "investing", {"investing": value})
+
+# Живая матрица спредов между источниками, обновляется на каждое новое значение в снимке
+spread_monitor = SpreadMonitor(max_age=config.SPREAD_MAX_QUOTE_AGE)
+rates_snapshot.add_listener(spread_monitor.on_quote)
+
+# «Пользователь занят» — в памяти, с автоматическим истечением
+user_leases = UserLeaseRegistry(default_ttl=config.USER_LEASE_TTL)
+
+# Лимит дорогих команд на пользователя (корзина токенов), см. middlewares/rate_limit.py
+user_rate_limiter = UserRateLimiter(per_minute=config.RATE_LIMIT_PER_MINUTE, burst=config.RATE_LIMIT_BURST)
@@ -0,0 +1,45 @@
+import itertools
+import time
+from typing import Dict, Optional, Tuple
+
+
+class UserLeaseRegistry:
+    """
+    Флаг «у пользователя уже обрабатывается запрос» в памяти процесса вместо колонки in_process в SQLite.
+    Захват атомарный (проверка и установка в одном синхронном шаге, без await между ними),
+    а у аренды есть срок жизни: если обработчик упал и не освободил её, через ttl секунд
+    пользователь снова сможет отправлять команды без /clear_state и перезапуска.
+    """
+
+    def __init__(self, default_ttl: float = 300.0) -> None:
+        self.default_ttl = default_ttl
+        # user_id -> (токен аренды, момент истечения по time.monotonic())
+        self._leases: Dict[int, Tuple[int, float]] = {}
+        self._tokens = itertools.count(1)
+
+    def try_acquire(self, user_id: int, ttl: Optional[float] = None) -> Optional[int]:
+        """
+        Пытается занять пользователя. Возвращает токен аренды или None, если пользователь занят.
+        """
+        now = time.monotonic()
+        current = self._leases.get(user_id)
+        if current is not None and current[1] > now:
+            return None
+        token = next(self._tokens)
+        self._leases[user_id] = (token, now + (ttl if ttl is not None else self.default_ttl))
+        return token
+
+    def release(self, user_id: int, token: Optional[int] = None) -> None:
+        """
+        Освобождает пользователя. Если передан token, освобождаем только свою аренду
+        (чтобы истёкший обработчик не снял чужую, более новую).
+        """
+        current = self._leases.get(user_id)
+        if current is None:
+            return
+        if token is None or current[0] == token:
+            del self._leases[user_id]
+
+    def is_busy(self, user_id: int) -> bool:
+        current = self._leases.get(user_id)
+        return current is not None and current[1] > time.monotonic()
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    """
+    GET /health — проверка, что процесс жив и принимает запросы.
+    """
+    limiter = request.app.get("concurrency_limiter")
+    data = {"status": "ok", "mode": "webhook"}
+    if limiter is not None:
+        data.update({
+            "workers": limiter.limit,
+            "in_flight": limiter.in_flight,
+            "waiting": limiter.waiting,
+        })
+    return web.json_response(data)
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher, concurrency_limiter=None) -> web.Application:
+    """
+    aiohttp-приложение: POST {WEBHOOK_PATH} принимает апдейты, GET /health — статус.
+    Апдейты обрабатываются в фоне, чтобы Telegram сразу получал ответ 200.
+    """
+    app = web.Application()
+    app["concurrency_limiter"] = concurrency_limiter
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET or None,
+        handle_in_background=True,
+    ).register(app, path=config.WEBHOOK_PATH)
+    app.router.add_get("/health", health_handler)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, concurrency_limiter=None) -> None:
+    """
+    Поднимает встроенный HTTP-сервер и регистрирует webhook в Telegram.
+    Работает, пока задачу не отменят.
+    """
+    app = build_webhook_app(bot, dp, concurrency_limiter)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    if config.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+            drop_pending_updates=True,
+        )
+    else:
+        logger.warning("WEBHOOK_URL не задан — setWebhook не вызывается (локальный режим)")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
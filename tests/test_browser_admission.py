@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from services.browser_admission import BACKGROUND, INTERACTIVE, BrowserAdmission, BrowserBusy, background_jobs
+
+
+async def _job(admission, name, order, started, priority=None, hold=0.01):
+    async with admission.slot(priority):
+        order.append(name)
+        started.set()
+        await asyncio.sleep(hold)
+
+
+def test_interactive_jobs_go_first():
+    async def scenario():
+        admission = BrowserAdmission(limit=1, timeout=5)
+        order = []
+        first_started = asyncio.Event()
+        tasks = [asyncio.create_task(_job(admission, "first", order, first_started, hold=0.05))]
+        await first_started.wait()
+        for name in ("bg1", "bg2"):
+            tasks.append(asyncio.create_task(_job(admission, name, order, asyncio.Event(), BACKGROUND)))
+            await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(_job(admission, "int", order, asyncio.Event(), INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        assert admission.active == 0
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "int", "bg1", "bg2"]
+
+
+def test_background_jobs_context_sets_priority():
+    async def scenario():
+        admission = BrowserAdmission(limit=1, timeout=5)
+        order = []
+        first_started = asyncio.Event()
+        tasks = [asyncio.create_task(_job(admission, "first", order, first_started, hold=0.05))]
+        await first_started.wait()
+        with background_jobs():
+            tasks.append(asyncio.create_task(_job(admission, "bg", order, asyncio.Event())))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(_job(admission, "int", order, asyncio.Event())))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "int", "bg"]
+
+
+def test_queue_full():
+    async def scenario():
+        admission = BrowserAdmission(limit=1, max_waiting=1, timeout=5)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.waiting == 1
+        assert admission.saturated
+        with pytest.raises(BrowserBusy):
+            await admission.acquire()
+        admission.release()
+        await waiter
+        admission.release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_wait_timeout_frees_queue():
+    async def scenario():
+        admission = BrowserAdmission(limit=1, timeout=5)
+        await admission.acquire()
+        with pytest.raises(BrowserBusy):
+            await admission.acquire(timeout=0.05)
+        assert admission.waiting == 0
+        admission.release()
+        assert admission.active == 0
+        # Слот свободен, очередь пуста — следующая задача проходит сразу
+        await asyncio.wait_for(admission.acquire(timeout=0.05), 1)
+        assert admission.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_hold_slot():
+    async def scenario():
+        admission = BrowserAdmission(limit=1, timeout=5)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        admission.release()
+        assert admission.active == 0
+        assert admission.waiting == 0
+
+    asyncio.run(scenario())
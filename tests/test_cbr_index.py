@@ -0,0 +1,39 @@
+import datetime
+from decimal import Decimal
+
+from services.cbr_index import CbrIndex
+
+XML = """<?xml version="1.0" encoding="windows-1251"?>
+<ValCurs Date="17.10.2026" name="Foreign Currency Market">
+<Valute ID="R01235"><NumCode>840</NumCode><CharCode>USD</CharCode><Nominal>1</Nominal>
+<Name>Доллар США</Name><Value>81,2345</Value></Valute>
+<Valute ID="R01200"><NumCode>344</NumCode><CharCode>HKD</CharCode><Nominal>10</Nominal>
+<Name>Гонконгских долларов</Name><Value>104,5000</Value></Valute>
+</ValCurs>""".encode("windows-1251")
+
+DATE = datetime.date(2026, 10, 17)
+
+
+def test_rate_from_one_document():
+    calls = []
+    index = CbrIndex(lambda date: calls.append(date) or XML)
+    xml_date, usd = index.rate("usd", DATE)
+    assert xml_date == DATE
+    assert usd.value.value == Decimal("81.2345")
+    _, hkd = index.rate("HKD", DATE)
+    assert hkd.unit_value == Decimal("10.45")
+    assert calls == [DATE]
+    assert not index._fetch_locks
+
+
+def test_no_reply():
+    index = CbrIndex(lambda date: None)
+    assert index.rate("USD", DATE) == (None, None)
+    assert not index._fetch_locks
+
+
+def test_malformed_reply():
+    index = CbrIndex(lambda date: XML[:120])
+    assert index.document(DATE) is None
+    assert index.rate("USD", DATE) == (None, None)
+    assert not index._fetch_locks
@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from services.deal_scenarios import MAX_SCENARIO_ROWS, t_range
+
+
+def test_t_range_includes_stop():
+    assert t_range(0, 1, 0.25) == [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def test_t_range_does_not_accumulate_error():
+    values = t_range(0, 1, 0.1)
+    assert len(values) == 11
+    assert values[-1] == 1.0
+    assert values[3] == 0.3
+
+
+def test_t_range_single_value():
+    assert t_range(2.5, 2.5, 1) == [2.5]
+
+
+@pytest.mark.parametrize("start, stop, step", [
+    (0, 1, 0),
+    (0, 1, -0.1),
+    (1, 0, 0.1),
+])
+def test_t_range_rejects_bad_range(start, stop, step):
+    with pytest.raises(ValueError):
+        t_range(start, stop, step)
+
+
+@pytest.mark.parametrize("start, stop, step", [
+    (math.inf, 1, 0.1),
+    (0, math.inf, 0.1),
+    (0, 1, math.inf),
+    (math.nan, 1, 0.1),
+    (0, math.nan, 0.1),
+    (0, 1, math.nan),
+])
+def test_t_range_rejects_non_finite(start, stop, step):
+    with pytest.raises(ValueError):
+        t_range(start, stop, step)
+
+
+@pytest.mark.parametrize("start, stop, step", [
+    (0, MAX_SCENARIO_ROWS, 1),
+    (0, 1e308, 1e-308),
+    (-1e308, 1e308, 1),
+])
+def test_t_range_limits_rows(start, stop, step):
+    with pytest.raises(ValueError):
+        t_range(start, stop, step)
+
+
+def test_t_range_max_rows():
+    assert len(t_range(0, MAX_SCENARIO_ROWS - 1, 1)) == MAX_SCENARIO_ROWS
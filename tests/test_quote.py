@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+import pytest
+
+from services.quote import parse_rate
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("75,32", Decimal("75.32")),
+    (" 81.7250 ", Decimal("81.7250")),
+    ("1 234,5", Decimal("1234.5")),
+    ("1\xa0234,56 ₽", Decimal("1234.56")),
+    ("1,234.56", Decimal("1234.56")),
+    ("1.234,56", Decimal("1234.56")),
+    ("1,234,567", Decimal("1234567")),
+    ("1.234.567", Decimal("1234567")),
+    ("1.0843 US Dollars", Decimal("1.0843")),
+    ("-0,5", Decimal("-0.5")),
+    ("−0,5", Decimal("-0.5")),
+    (92, Decimal("92")),
+    (92.15, Decimal("92.15")),
+    (Decimal("1.5"), Decimal("1.5")),
+])
+def test_parse_rate(raw, expected):
+    assert parse_rate(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [None, "", "—", "-", "н/д", "1-2", "NaN", "Infinity",
+                                 float("nan"), float("inf"), float("-inf")])
+def test_parse_rate_not_a_number(raw):
+    assert parse_rate(raw) is None
@@ -0,0 +1,63 @@
+import math
+
+import pytest
+
+from services.rate_limit import TokenBucket, UserRateLimiter, retry_after_text
+
+
+def test_token_bucket_burst_then_empty():
+    bucket = TokenBucket(rate=1, capacity=3)
+    now = bucket.updated
+    assert [bucket.try_take(now=now) for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated
+    for _ in range(3):
+        bucket.try_take(now=now)
+    assert bucket.retry_after(now=now) == pytest.approx(0.5)
+    assert not bucket.try_take(now=now + 0.4)
+    assert bucket.try_take(now=now + 0.5)
+
+
+def test_token_bucket_refill_capped_by_capacity():
+    bucket = TokenBucket(rate=10, capacity=3)
+    now = bucket.updated
+    bucket.try_take(cost=3, now=now)
+    bucket.try_take(cost=0, now=now + 3600)
+    assert bucket.tokens == 3
+
+
+def test_token_bucket_zero_rate_never_refills():
+    bucket = TokenBucket(rate=0, capacity=1)
+    now = bucket.updated
+    assert bucket.retry_after(now=now) == 0.0
+    assert bucket.try_take(now=now)
+    assert not bucket.try_take(now=now + 3600)
+    assert bucket.retry_after(now=now + 3600) == math.inf
+
+
+def test_user_rate_limiter():
+    limiter = UserRateLimiter(per_minute=6, burst=3)
+    assert [limiter.try_acquire(1) for _ in range(5)] == [True, True, True, False, False]
+    assert limiter.retry_after(1) == pytest.approx(10.0, abs=0.1)
+    # У другого пользователя своя корзина
+    assert limiter.try_acquire(2)
+    assert limiter.retry_after(3) == 0.0
+
+
+def test_user_rate_limiter_burst_only():
+    limiter = UserRateLimiter(per_minute=0, burst=2)
+    assert [limiter.try_acquire(1) for _ in range(3)] == [True, True, False]
+    assert limiter.retry_after(1) == math.inf
+    assert retry_after_text(limiter.retry_after(1)) == "Лимит запросов исчерпан."
+
+
+def test_retry_after_text():
+    assert retry_after_text(9.6) == "Повторить можно через 10 с."
+
+
+def test_user_rate_limiter_disabled():
+    limiter = UserRateLimiter(per_minute=0, burst=0)
+    assert all(limiter.try_acquire(1) for _ in range(100))
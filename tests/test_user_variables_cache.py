@@ -0,0 +1,46 @@
+from db.database import UserVariablesCache
+
+
+def test_lru_eviction():
+    cache = UserVariablesCache(maxsize=2)
+    cache.put(1, {"a": 1})
+    cache.put(2, {"a": 2})
+    cache.get(1)
+    cache.put(3, {"a": 3})
+    assert cache.get(2) is None
+    assert cache.get(1).total == 1
+    assert cache.get(3).total == 3
+
+
+def test_read_started_before_write_does_not_overwrite():
+    cache = UserVariablesCache()
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.put(1, {"a": 2})
+    stale = cache.put_if_unchanged(1, {"a": 1}, version)
+    assert stale.total == 1
+    assert cache.get(1).total == 2
+
+
+def test_versions_bounded():
+    cache = UserVariablesCache(maxsize=10)
+    for user_id in range(1000):
+        cache.invalidate(user_id)
+        cache.put(user_id, {"a": user_id})
+    for user_id in range(1000, 2000):
+        cache.invalidate(user_id)  # запись без кеширования (пользователя нет в таблице)
+    assert len(cache._items) == 10
+    assert len(cache._versions) <= 10
+
+
+def test_forgotten_version_still_blocks_stale_read():
+    cache = UserVariablesCache(maxsize=1)
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.put(1, {"a": 2})
+    # Запись пользователя 1 вытеснена вместе с его номером
+    cache.invalidate(2)
+    cache.put(2, {"a": 5})
+    assert 1 not in cache._versions
+    cache.put_if_unchanged(1, {"a": 1}, version)
+    assert cache.get(1) is None
@@ -0,0 +1,26 @@
+"""
+Выгрузка лога запросов (и других таблиц из services.export_service.EXPORT_TABLES) в .csv.gz / .jsonl.gz.
+
+    python -m tools.export requests --format jsonl --from 2026-01-01 --to 2026-03-31 -o requests.jsonl.gz
+"""
+import argparse
+
+from services.export_service import EXPORT_FORMATS, EXPORT_TABLES, export_to_gzip_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка таблиц в gzip")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD (включительно)")
+    parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD (включительно)")
+    parser.add_argument("-o", "--output", help="путь к файлу (по умолчанию <table>.<format>.gz)")
+    args = parser.parse_args()
+
+    output = args.output or f"{args.table}.{args.format}.gz"
+    count = export_to_gzip_file(args.table, output, args.format, args.date_from, args.date_to)
+    print(f"{count} строк -> {output}")
+
+
+if __name__ == "__main__":
+    main()
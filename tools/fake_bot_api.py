@@ -0,0 +1,263 @@
+"""
+Локальный фейковый Telegram Bot API для офлайн-тестов и замеров пропускной способности.
+
+Запуск сервера:
+    python -m tools.fake_bot_api --port 8081
+
+Бот подключается к нему через TELEGRAM_API_URL=http://127.0.0.1:8081.
+Замер «апдейт -> ответ бота» (сервер поднимается внутри замера, бот должен смотреть на него):
+    python -m tools.fake_bot_api --bench http://127.0.0.1:8080/webhook --updates 1000 --concurrency 50
+    python -m tools.fake_bot_api --bench polling --updates 1000
+Для webhook бот запускается заранее (BOT_MODE=webhook, TELEGRAM_API_URL на --host/--port замера),
+для polling — после старта замера.
+Время апдейта — от отправки (webhook) или выдачи в очередь getUpdates (polling) до прихода первого
+sendMessage/sendPhoto/... в его чат; у каждого апдейта свой чат, поэтому ответы сопоставляются однозначно.
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web, ClientSession
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+class FakeBotAPI:
+    """
+    Минимальная реализация методов Bot API, которые использует бот.
+    Все вызовы считаются в self.calls; отправленные сообщения складываются в self.sent.
+    Апдейты для long polling можно подложить через push_update().
+    latency — искусственная задержка ответа на каждый вызов (имитация сети до Telegram), в секундах.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: collections.Counter = collections.Counter()
+        self.sent: List[Dict[str, Any]] = []
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates: asyncio.Queue = asyncio.Queue()
+        # chat_id -> future, ждущий первого сообщения бота в этот чат (для замеров)
+        self._reply_waiters: Dict[int, asyncio.Future] = {}
+        # Выставляется при первом вызове — бот подключился
+        self.connected = asyncio.Event()
+
+    # ------------------------------------------------------
+    # Генерация апдейтов
+    # ------------------------------------------------------
+    def make_message_update(self, user_id: int, text: str) -> Dict[str, Any]:
+        user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": user,
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                if text.startswith("/") else [],
+            },
+        }
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        self._updates.put_nowait(update)
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        """
+        Future, который завершится моментом (perf_counter) первого сообщения бота в чат chat_id.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id] = future
+        return future
+
+    # ------------------------------------------------------
+    # Ответы на методы
+    # ------------------------------------------------------
+    def _message_result(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        result = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            result["text"] = params["text"]
+        return result
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def handle_method(self, method: str, params: Dict[str, Any]) -> Any:
+        method = method.lower()
+        self.calls[method] += 1
+        self.connected.set()
+
+        if method == "getme":
+            return BOT_USER
+        if method == "getupdates":
+            return await self._get_updates(params)
+        if method in ("setwebhook", "deletewebhook", "answercallbackquery", "setmycommands", "deletemessage"):
+            return True
+        if method in ("sendmessage", "sendphoto", "senddocument", "editmessagetext", "editmessagereplymarkup"):
+            self.sent.append({"method": method, **{k: v for k, v in params.items() if k in ("chat_id", "text")}})
+            waiter = self._reply_waiters.pop(int(params.get("chat_id") or 0), None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(time.perf_counter())
+            return self._message_result(params)
+        return True
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params: Dict[str, Any] = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.can_read_body:
+            post = await request.post()
+            params.update({k: v for k, v in post.items() if isinstance(v, str)})
+        result = await self.handle_method(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls), "sent": len(self.sent)})
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.router.add_get("/bot{token}/{method}", self._handle)
+        app.router.add_get("/_stats", self._stats)
+        return app
+
+
+def _percentile_ms(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+async def bench_updates(
+    target: str,
+    updates: int,
+    concurrency: int,
+    secret: Optional[str] = None,
+    commands: Optional[List[str]] = None,
+    host: str = "127.0.0.1",
+    port: int = 8081,
+    reply_timeout: float = 30.0,
+    connect_timeout: float = 120.0
+) -> Dict[str, Any]:
+    """
+    Сквозной замер: апдейт -> первый ответ бота в Bot API.
+    target — URL webhook бота (апдейты отправляются POST-ом) или "polling" (апдейты выдаются через getUpdates).
+    Фейковый Bot API поднимается здесь же на host:port — бот запускается с TELEGRAM_API_URL на него.
+    В режиме polling апдейты идут, когда бот сделал первый вызов (ждём до connect_timeout секунд);
+    в режиме webhook бот при старте к API не обращается — его нужно запустить до замера.
+    Для webhook отдельно видно время ответа HTTP 200 (приём апдейта), но главное — reply_*: обработка целиком.
+    """
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    if target == "polling":
+        print(f"Фейковый Bot API на http://{host}:{port}, ждём подключения бота...", flush=True)
+        try:
+            await asyncio.wait_for(api.connected.wait(), connect_timeout)
+        except asyncio.TimeoutError:
+            await runner.cleanup()
+            raise RuntimeError("Бот не подключился к фейковому Bot API") from None
+        await asyncio.sleep(1.0)  # даём боту закончить старт (deleteWebhook, первый getUpdates)
+
+    commands = commands or ["/start"]
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    accept_latencies: List[float] = []
+    reply_latencies: List[float] = []
+    unanswered = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    try:
+        async with ClientSession() as session:
+            async def send(i: int) -> None:
+                nonlocal unanswered
+                # Свой чат на каждый апдейт: ответ однозначно относится к нему
+                user_id = 100000 + i
+                update = api.make_message_update(user_id=user_id, text=commands[i % len(commands)])
+                async with semaphore:
+                    reply = api.expect_reply(user_id)
+                    started = time.perf_counter()
+                    if target == "polling":
+                        api.push_update(update)
+                    else:
+                        async with session.post(target, json=update, headers=headers) as resp:
+                            await resp.read()
+                        accept_latencies.append(time.perf_counter() - started)
+                    try:
+                        replied_at = await asyncio.wait_for(reply, reply_timeout)
+                    except asyncio.TimeoutError:
+                        unanswered += 1
+                        return
+                    reply_latencies.append(replied_at - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(i) for i in range(updates)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    result: Dict[str, Any] = {
+        "mode": "polling" if target == "polling" else "webhook",
+        "updates": updates,
+        "answered": len(reply_latencies),
+        "unanswered": unanswered,
+        "seconds": round(elapsed, 3),
+        "replies_per_second": round(len(reply_latencies) / elapsed, 1) if elapsed else 0.0,
+        "reply_p50_ms": _percentile_ms(reply_latencies, 0.5),
+        "reply_p99_ms": _percentile_ms(reply_latencies, 0.99),
+    }
+    if accept_latencies:
+        result["accept_p50_ms"] = _percentile_ms(accept_latencies, 0.5)
+        result["accept_p99_ms"] = _percentile_ms(accept_latencies, 0.99)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа на каждый вызов, сек")
+    parser.add_argument("--bench", metavar="WEBHOOK_URL|polling",
+                        help="замерить время до ответа бота: апдейты в webhook по URL или через getUpdates")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--command", action="append", dest="commands")
+    parser.add_argument("--reply-timeout", type=float, default=30.0, help="сколько ждать ответа на апдейт, сек")
+    args = parser.parse_args()
+
+    if args.bench:
+        result = asyncio.run(bench_updates(
+            args.bench, args.updates, args.concurrency, args.secret, args.commands,
+            host=args.host, port=args.port, reply_timeout=args.reply_timeout
+        ))
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        web.run_app(FakeBotAPI(latency=args.latency).make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
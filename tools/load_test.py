@@ -0,0 +1,339 @@
+"""
+Нагрузочный тест: N синтетических пользователей одновременно гоняют /usd, /calculate и /stats
+через настоящие Dispatcher, middleware и роутеры бота. Telegram заменён фейковым Bot API
+(tools/fake_bot_api.py), источники курсов — заглушками на уровне ParserService с настраиваемыми задержками.
+
+    python -m tools.load_test --users 50 --rounds 3
+    python -m tools.load_test --users 200 --mix usd=1 --scale 0.1 --latency grinex=const:2
+    python -m tools.load_test --users 100 --telegram-latency 0.05 --output load.json
+
+Распределения задержек: const:S, uniform:A,B, normal:MU,SIGMA, lognormal:MEDIAN,SIGMA, exp:MEAN (секунды).
+Синхронные источники (CBR, ABCEX, Garantex) бот вызывает в потоках (asyncio.to_thread), поэтому заглушки
+для них блокируют поток (time.sleep), как и настоящие запросы, — event loop при этом не должен задерживаться.
+
+Отчёт: p50/p95/p99 задержки по командам, задержка event loop, вызовы Bot API, пиковый RSS.
+База данных пишется во временный каталог, рабочие db/*.db не затрагиваются.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from services.browser_admission import browser_job
+from services.metrics import instrument_source
+from services.parser_service import ParserService
+from services.quote import Quote
+from tools.fake_bot_api import FakeBotAPI
+
+Distribution = Callable[[], float]
+
+# Порядок величин — как у реальных источников (с учётом фиксированных пауз в ParserService)
+DEFAULT_LATENCIES: Dict[str, str] = {
+    "cbr": "uniform:0.05,0.3",
+    "abcex": "uniform:0.1,0.4",
+    "garantex": "uniform:0.1,0.4",
+    "moex": "lognormal:2,0.4",
+    "profinance": "lognormal:7,0.3",
+    "tradingview": "lognormal:4,0.4",
+    "xe": "lognormal:7,0.3",
+    "grinex": "lognormal:11,0.3",
+}
+
+FAKE_RATES: Dict[str, str] = {
+    "cbr": "81,5432",
+    "abcex": "82.05",
+    "garantex": "82.12",
+    "moex": "81.6100",
+    "profinance": "81.7250",
+    "tradingview": "2345.10",
+    "xe": "1.0843",
+    "grinex": "82.30",
+}
+
+# Шаги сценариев: (текст сообщения, метка для отчёта)
+SCENARIOS: Dict[str, List[Tuple[str, str]]] = {
+    "usd": [("/usd", "/usd")],
+    "calculate": [("/calculate", "/calculate"), ("1.5", "calculate.t")],
+    "stats": [("/stats", "/stats"), ("{password}", "stats.password"), ("/stats_counts", "/stats_counts")],
+}
+
+# Минимальный PNG 1x1 — «скриншот Investing» для отправки фото
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e5270de40000000049454e44ae426082"
+)
+
+
+def parse_distribution(spec: str) -> Distribution:
+    kind, _, params = spec.partition(":")
+    args = [float(x) for x in params.split(",")] if params else []
+    if kind == "const":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: args[0] * math.exp(random.gauss(0.0, args[1]))
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / args[0])
+    raise ValueError(f"Неизвестное распределение: {spec}")
+
+
+def install_fake_sources(latencies: Dict[str, Distribution], scale: float, failure_rate: float) -> None:
+    """
+    Подменяет сетевые методы ParserService заглушками. Вызывать до импорта хендлеров:
+    CURRENCY_SOURCES запоминает связанные методы при импорте.
+    """
+    def delay(source: str) -> float:
+        return latencies[source]() * scale
+
+    def value(source: str, pair: str) -> Optional[Quote]:
+        return None if random.random() < failure_rate else Quote.parse(FAKE_RATES[source], pair, source)
+
+    def fake_sync(source: str) -> Callable:
+        @instrument_source(source)
+        def fetch(self, *args, pair: str = "USD/RUB", **kwargs) -> Optional[Quote]:
+            time.sleep(delay(source))
+            return value(source, pair)
+        return fetch
+
+    def fake_async(source: str) -> Callable:
+        # Как у настоящих методов: очередь допуска к браузеру снаружи замера источника
+        @browser_job
+        @instrument_source(source)
+        async def fetch(self, *args, pair: str = "USD/RUB", **kwargs) -> Optional[Quote]:
+            await asyncio.sleep(delay(source))
+            return value(source, pair)
+        return fetch
+
+    @instrument_source("cbr", is_failure=lambda result: result[1] is None)
+    def fake_cbr(self, char_code: str, date: Optional[datetime.date] = None):
+        time.sleep(delay("cbr"))
+        return date or datetime.date.today(), value("cbr", f"{char_code.upper()}/RUB")
+
+    async def fake_fetch_rate(self, url, selector, is_xpath=False, pair: str = "") -> Optional[Quote]:
+        # Используется только XE-методами, которые уже инструментированы как "xe"
+        await asyncio.sleep(delay("xe"))
+        return value("xe", pair)
+
+    ParserService._get_cbr_xml_rate = fake_cbr
+    ParserService.get_abcex_rate = fake_sync("abcex")
+    ParserService.get_garantex_rate = fake_sync("garantex")
+    ParserService.get_moex_rate = fake_async("moex")
+    ParserService.get_profinance_rate = fake_async("profinance")
+    ParserService.get_tradingview_usd = fake_async("tradingview")
+    ParserService.get_grinex_usd_rate = fake_async("grinex")
+    ParserService.fetch_rate = fake_fetch_rate
+
+
+class LoopLagMonitor:
+    """
+    Раз в interval секунд засыпает и меряет, насколько позже запланированного проснулся.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(q * len(sorted_values))) - 1)]
+
+
+def summarize_ms(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+    }
+
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, object]:
+    latencies = {source: parse_distribution(spec) for source, spec in DEFAULT_LATENCIES.items()}
+    for override in args.latency or []:
+        source, _, spec = override.partition("=")
+        latencies[source] = parse_distribution(spec)
+    install_fake_sources(latencies, args.scale, args.failure_rate)
+
+    # Импорт после подмены источников
+    from aiogram import Bot
+    from aiogram.client.bot import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+
+    from db.database import init_db, users_db
+    from db.requests_database import init_requests_db, requests_db, request_logger
+    from handlers.stats_handlers import STATS_PASSWORD
+    from main import build_dispatcher
+    from services.updater_instance import investing_updater
+
+    tmp = tempfile.mkdtemp(prefix="load_test_")
+    users_db.path = os.path.join(tmp, "users.db")
+    requests_db.path = os.path.join(tmp, "requests.db")
+    init_db()
+    init_requests_db()
+    request_logger.start()
+
+    # Investing обновляется фоновой задачей — в тесте просто кладём готовые значения
+    screenshot = os.path.join(tmp, "investing.png")
+    with open(screenshot, "wb") as f:
+        f.write(PNG_1X1)
+    for currency in ("usd", "eur", "cny"):
+        setattr(investing_updater, f"cached_{currency}_rate", Quote.parse("81.90", f"{currency.upper()}/RUB", "investing"))
+        setattr(investing_updater, f"cached_{currency}_screenshot", screenshot)
+
+    api = FakeBotAPI(latency=args.telegram_latency)
+    runner = web.AppRunner(api.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))
+    bot = Bot(token="123456:LOAD-TEST", session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    dp, _ = build_dispatcher(workers=args.workers)
+
+    command_latencies: Dict[str, List[float]] = collections.defaultdict(list)
+    errors: collections.Counter = collections.Counter()
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+
+    async def send(user_id: int, text: str, label: str) -> None:
+        update = Update.model_validate(api.make_message_update(user_id, text), context={"bot": bot})
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[label] += 1
+            if errors[label] == 1:
+                print(f"Ошибка {label}: {e!r}")
+        command_latencies[label].append(time.perf_counter() - started)
+
+    async def run_user(index: int) -> None:
+        user_id = 10_000_000 + index
+        if args.ramp:
+            await asyncio.sleep(args.ramp * index / args.users)
+        await send(user_id, "/start", "/start")
+        for _ in range(args.rounds):
+            scenario = random.choices(names, weights)[0]
+            for text, label in SCENARIOS[scenario]:
+                await send(user_id, text.format(password=STATS_PASSWORD), label)
+            if args.think:
+                await asyncio.sleep(random.uniform(0, args.think))
+
+    monitor = LoopLagMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+    start_rss = rss_mb()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_user(i) for i in range(args.users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        monitor_task.cancel()
+        await bot.session.close()
+        await runner.cleanup()
+        await request_logger.stop()
+        users_db.close()
+        requests_db.close()
+
+    total_commands = sum(len(v) for v in command_latencies.values())
+    return {
+        "users": args.users,
+        "rounds": args.rounds,
+        "mix": mix,
+        "workers": args.workers,
+        "duration_s": round(elapsed, 2),
+        "commands_per_s": round(total_commands / elapsed, 2) if elapsed else 0.0,
+        "commands": {
+            label: {"count": len(values), "errors": errors[label], **summarize_ms(values)}
+            for label, values in sorted(command_latencies.items())
+        },
+        "event_loop_lag": summarize_ms(monitor.samples),
+        "telegram_calls_total": sum(api.calls.values()),
+        "telegram_calls": dict(api.calls),
+        "rss_mb": {
+            "start": start_rss,
+            # ru_maxrss в Linux — в килобайтах
+            "peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с фейковым Telegram")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="сценариев на пользователя")
+    parser.add_argument("--mix", default="usd=1,calculate=1,stats=1", help="веса сценариев")
+    parser.add_argument("--ramp", type=float, default=0.0, help="растянуть старт пользователей на N секунд")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза между сценариями до N секунд")
+    parser.add_argument("--latency", action="append", metavar="SOURCE=DIST",
+                        help=f"задержка источника, по умолчанию: {DEFAULT_LATENCIES}")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель всех задержек источников")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="доля вызовов источников, вернувших None")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--workers", type=int, default=None, help="UPDATE_WORKERS (по умолчанию из конфига)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if args.workers is None:
+        from utils.config import config
+        args.workers = config.UPDATE_WORKERS
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.exit(1 if any(c["errors"] for c in report["commands"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Текущие котировки с доски работающего бота (services/quote_board.py) — без Telegram, сети и БД.
+
+    python -m tools.quotes
+    python -m tools.quotes --pair USD/RUB --watch 2
+    python -m tools.quotes --history profinance USD/RUB
+"""
+import argparse
+import time
+
+from services.quote_board import QuoteBoardReader
+from utils.config import config
+
+
+def _print_quotes(quotes, now: float) -> None:
+    for quote in quotes:
+        latency = f"{quote.latency * 1000:.0f} мс" if quote.latency is not None else "-"
+        print(f"{quote.source:14} {quote.pair:9} {str(quote):>12}  {now - quote.fetched_at:7.0f} с назад  {latency}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Последние котировки из общей памяти бота")
+    parser.add_argument("--path", default=config.QUOTE_BOARD_PATH or "db/quote_board.bin")
+    parser.add_argument("--pair", help="только эта пара, например USD/RUB")
+    parser.add_argument("--source", help="только этот источник")
+    parser.add_argument("--history", nargs=2, metavar=("SOURCE", "PAIR"), help="последние значения одной пары")
+    parser.add_argument("--watch", type=float, default=0, help="обновлять каждые N секунд")
+    args = parser.parse_args()
+
+    reader = QuoteBoardReader(args.path)
+    try:
+        while True:
+            started = time.perf_counter()
+            if args.history:
+                quotes = reader.history(*args.history)
+            else:
+                quotes = [
+                    quote for quote in reader.latest()
+                    if (not args.pair or quote.pair == args.pair) and (not args.source or quote.source == args.source)
+                ]
+            elapsed = time.perf_counter() - started
+            _print_quotes(quotes, time.time())
+            print(f"{len(quotes)} котировок, чтение {elapsed * 1e6:.0f} мкс")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+            print()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,78 @@ class Config:
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "False").lower() == "true"
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
     LOG_FILE: str = "logs/bot.log"
+    # Ротация лога: по размеру (LOG_MAX_BYTES, по умолчанию) или по времени (LOG_ROTATE_WHEN: "midnight", "H", ...)
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_ROTATE_WHEN: str = os.getenv("LOG_ROTATE_WHEN", "")
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # Формат файла лога: "text" или "json" (одна запись — одна строка JSON)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()
+
+    # Через сколько секунд «зависший» запрос пользователя считается завершённым
+    USER_LEASE_TTL: int = int(os.getenv("USER_LEASE_TTL", "300"))
+
+    # Режим получения обновлений: "polling" или "webhook"
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()
+    # Базовый URL Bot API (например, локальный фейковый сервер для тестов); пусто — api.telegram.org
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")
+    # Сколько апдейтов обрабатывается одновременно (в обоих режимах)
+    UPDATE_WORKERS: int = int(os.getenv("UPDATE_WORKERS", "32"))
+
+    # Дорогие команды (сбор курсов, расчёты): не больше RATE_LIMIT_BURST подряд от пользователя,
+    # дальше RATE_LIMIT_PER_MINUTE в минуту; сверх этого — ответ из кеша. 0 и 0 — без ограничений
+    RATE_LIMIT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "6"))
+    RATE_LIMIT_BURST: float = float(os.getenv("RATE_LIMIT_BURST", "3"))
+
+    # Таймаут HTTP-запросов к источникам без браузера (CBR, ABCEX, Garantex), секунд
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "15"))
+
+    # Браузер: одновременных задач, сколько может ждать в очереди и сколько секунд ждать слот
+    BROWSER_MAX_JOBS: int = int(os.getenv("BROWSER_MAX_JOBS", "3"))
+    BROWSER_MAX_WAITING: int = int(os.getenv("BROWSER_MAX_WAITING", "20"))
+    BROWSER_QUEUE_TIMEOUT: float = float(os.getenv("BROWSER_QUEUE_TIMEOUT", "20"))
+    # Сохранённые cookies/localStorage сайтов (баннеры согласия уже приняты) и сколько секунд им доверять; пусто — выключено
+    BROWSER_STATE_DIR: str = os.getenv("BROWSER_STATE_DIR", "db/browser_state")
+    BROWSER_STATE_TTL: float = float(os.getenv("BROWSER_STATE_TTL", str(7 * 24 * 3600)))
+    # Локальный кеш статики сайтов (JS, CSS, шрифты), размер в МБ и срок свежести без заголовков кеширования; пусто — выключен
+    ASSET_CACHE_DIR: str = os.getenv("ASSET_CACHE_DIR", "db/asset_cache")
+    ASSET_CACHE_MAX_MB: int = int(os.getenv("ASSET_CACHE_MAX_MB", "200"))
+    ASSET_CACHE_DEFAULT_TTL: float = float(os.getenv("ASSET_CACHE_DEFAULT_TTL", "3600"))
+
+    # Webhook (используется при BOT_MODE=webhook)
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+    # /calculate берёт котировки Garantex и ProFinance из общего снимка, если они не старше этого (секунд)
+    CALC_MAX_QUOTE_AGE: float = float(os.getenv("CALC_MAX_QUOTE_AGE", "60"))
+
+    # Раз в сколько секунд в фоне обновлять котировки /calculate для истории (/backtest); 0 — выключено.
+    # Каждый проход — загрузка ProFinance в браузере через прокси (слот допуска к браузеру) и запрос к Garantex,
+    # поэтому включается явно (например, 300). Без него история копится только из запросов пользователей
+    QUOTES_SAMPLE_INTERVAL: float = float(os.getenv("QUOTES_SAMPLE_INTERVAL", "0"))
+
+    # Монитор спредов: значения старше этого (секунд) не сравниваются; порог уведомления в %, 0 — без уведомлений
+    SPREAD_MAX_QUOTE_AGE: float = float(os.getenv("SPREAD_MAX_QUOTE_AGE", "900"))
+    SPREAD_ALERT_PCT: float = float(os.getenv("SPREAD_ALERT_PCT", "1.0"))
+
+    # Индекс документов ЦБ: сколько секунд считать свежими курсы на сегодня/завтра и сколько дат держать в памяти
+    CBR_INDEX_TTL: float = float(os.getenv("CBR_INDEX_TTL", "600"))
+    CBR_INDEX_MAX_DOCUMENTS: int = int(os.getenv("CBR_INDEX_MAX_DOCUMENTS", "256"))
+
+    # Доска последних котировок в файле, отображённом в память (services/quote_board.py); пусто — выключена
+    QUOTE_BOARD_PATH: str = os.getenv("QUOTE_BOARD_PATH", "db/quote_board.bin")
+    QUOTE_BOARD_SLOTS: int = int(os.getenv("QUOTE_BOARD_SLOTS", "128"))
+
+    # Трассировка этапов команд: доля трассируемых вызовов (0..1), порог «медленного» запроса и сколько хранить
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    TRACE_SLOW_SECONDS: float = float(os.getenv("TRACE_SLOW_SECONDS", "5"))
+    TRACE_KEEP: int = int(os.getenv("TRACE_KEEP", "50"))
+
+    # Локальный HTTP-эндпоинт /metrics (формат Prometheus); 0 — выключен
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
 
     # Прокси (пример, если нужно несколько)
     PROXY_HOST_1: str = os.getenv("PROXY_HOST_1", "")
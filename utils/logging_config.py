@@ -1,24 +1,122 @@
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
 import os
+import queue
+from typing import List, Optional
+
 from .config import config
+from services.tracing import TraceIdFilter
+
+# Структурированные поля записи (передаются через extra=...): в тексте — "key=value" после сообщения
+STRUCTURED_FIELDS = ("source", "user_id", "latency_ms", "currency", "outcome", "attempt")
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] [%(trace_id)s] %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredTextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = " ".join(
+            f"{name}={getattr(record, name)}" for name in STRUCTURED_FIELDS if getattr(record, name, None) is not None
+        )
+        if not fields:
+            return text
+        # Трейсбек (если есть) оставляем после полей
+        head, sep, tail = text.partition("\n")
+        return f"{head} | {fields}{sep}{tail}"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _file_handler() -> logging.Handler:
+    if config.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            config.LOG_FILE, when=config.LOG_ROTATE_WHEN, backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    return logging.handlers.RotatingFileHandler(
+        config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare склеивает сообщение с трейсбеком, а JSON-форматтеру он нужен отдельно.
+        # Трейсбек превращаем в текст (exc_text) здесь: исключение и кадры стека не должны жить в очереди.
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 def setup_logging() -> logging.Logger:
     """
-    Настраивает логирование (в консоль и файл).
+    Настраивает логирование (в консоль и файл с ротацией).
+    Записи из любого потока/корутины только кладутся в очередь (без ожидания);
+    форматирование и запись в консоль/файл — в отдельном потоке QueueListener.
     """
+    global _listener
     log_level = logging.DEBUG if config.DEBUG_MODE else logging.INFO
 
     # Создаём папку logs, если не существует
     os.makedirs("logs", exist_ok=True)
 
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(config.LOG_FILE, encoding="utf-8")
-        ],
-    )
+    console = logging.StreamHandler()
+    console.setFormatter(StructuredTextFormatter(TEXT_FORMAT))
+    file_handler = _file_handler()
+    file_handler.setFormatter(JsonFormatter() if config.LOG_FORMAT == "json" else StructuredTextFormatter(TEXT_FORMAT))
+    handlers: List[logging.Handler] = [console, file_handler]
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    # trace_id/user_id берутся из contextvars — до очереди, в контексте автора записи
+    queue_handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(log_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
     logger = logging.getLogger(__name__)
     logger.info("Logging configured successfully.")
     return logger
+
+
+def stop_logging() -> None:
+    """
+    Дописывает всё, что осталось в очереди, и останавливает поток записи.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None